@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+from tkinter import messagebox, filedialog, Toplevel, Frame
+
+import customtkinter as ctk
+
+from modules.access_key import parse_access_keys
+
+class KeyLookupWindow:
+    """Janela para colar ou carregar uma lista de chaves de acesso e enviar os XMLs"""
+    
+    def __init__(self, parent, on_send, email=''):
+        """
+        Inicializa a janela de busca por chaves de acesso.
+        
+        Args:
+            parent (CTk): Janela pai
+            on_send (function): Chamada como on_send(chaves, email) para localizar e enviar
+            email (str): Email de destino sugerido
+        """
+        self.parent = parent
+        self.on_send = on_send
+        
+        self.logger = logging.getLogger("XMLSender.KeyLookupWindow")
+        
+        # Criar janela
+        self.window = Toplevel(parent)
+        self.window.title("Buscar por Chaves de Acesso")
+        self.window.geometry("600x500")
+        self.window.transient(parent)
+        
+        # Centralizar a janela em relação à janela pai
+        x = parent.winfo_x() + (parent.winfo_width() / 2) - (600 / 2)
+        y = parent.winfo_y() + (parent.winfo_height() / 2) - (500 / 2)
+        self.window.geometry("+%d+%d" % (x, y))
+        
+        self.email_var = ctk.StringVar(value=email)
+        
+        self._build_interface()
+    
+    def _build_interface(self):
+        """Constrói a interface da janela"""
+        main_container = Frame(self.window)
+        main_container.pack(fill="both", expand=True)
+        
+        main_frame = ctk.CTkFrame(main_container)
+        main_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        info_label = ctk.CTkLabel(
+            main_frame,
+            text="Cole as chaves de acesso (44 dígitos), uma por linha ou separadas por vírgula,\n"
+                 "ou carregue um arquivo texto/CSV com as chaves.",
+            justify="left"
+        )
+        info_label.pack(anchor="w", padx=10, pady=(10, 5))
+        
+        self.keys_text = ctk.CTkTextbox(main_frame)
+        self.keys_text.pack(fill="both", expand=True, padx=10, pady=5)
+        self.keys_text.bind("<KeyRelease>", lambda e: self._update_count())
+        
+        self.count_label = ctk.CTkLabel(main_frame, text="0 chave(s)", anchor="w")
+        self.count_label.pack(anchor="w", padx=10)
+        
+        email_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        email_frame.pack(fill="x", padx=10, pady=5)
+        
+        email_label = ctk.CTkLabel(email_frame, text="Email:")
+        email_label.pack(side="left", padx=(0, 5))
+        email_entry = ctk.CTkEntry(email_frame, textvariable=self.email_var, width=400)
+        email_entry.pack(side="left")
+        
+        # Botões de ação
+        buttons_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        buttons_frame.pack(fill="x", padx=10, pady=10)
+        
+        load_button = ctk.CTkButton(
+            buttons_frame,
+            text="Carregar Arquivo...",
+            command=self._load_file,
+            width=140
+        )
+        load_button.pack(side="left", padx=(0, 10))
+        
+        send_button = ctk.CTkButton(
+            buttons_frame,
+            text="Buscar e Enviar",
+            command=self._send,
+            width=140
+        )
+        send_button.pack(side="left", padx=10)
+        
+        close_button = ctk.CTkButton(
+            buttons_frame,
+            text="Fechar",
+            command=self.window.destroy,
+            width=100
+        )
+        close_button.pack(side="right")
+    
+    def _get_keys(self):
+        """
+        Returns:
+            list: Chaves de acesso distintas presentes no texto
+        """
+        return parse_access_keys(self.keys_text.get("0.0", "end"))
+    
+    def _update_count(self):
+        """Atualiza a quantidade de chaves reconhecidas"""
+        self.count_label.configure(text=f"{len(self._get_keys())} chave(s)")
+    
+    def _load_file(self):
+        """Carrega as chaves de um arquivo texto ou CSV"""
+        path = filedialog.askopenfilename(
+            parent=self.window,
+            title="Selecione o arquivo com as chaves de acesso",
+            filetypes=[("Texto/CSV", "*.txt *.csv"), ("Todos os arquivos", "*.*")]
+        )
+        if not path:
+            return
+        
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                content = f.read()
+        except OSError as e:
+            self.logger.error(f"Erro ao ler arquivo de chaves: {e}")
+            messagebox.showerror("Erro", f"Erro ao ler arquivo de chaves: {e}", parent=self.window)
+            return
+        
+        self.keys_text.delete("0.0", "end")
+        self.keys_text.insert("0.0", "\n".join(parse_access_keys(content)))
+        self._update_count()
+    
+    def _send(self):
+        """Envia a lista de chaves para localização e envio"""
+        keys = self._get_keys()
+        email = self.email_var.get().strip()
+        if not keys:
+            messagebox.showerror("Erro", "Nenhuma chave de acesso de 44 dígitos encontrada.", parent=self.window)
+            return
+        if not email:
+            messagebox.showerror("Erro", "Informe o email de destino.", parent=self.window)
+            return
+        
+        self.on_send(keys, email)
+        self.window.destroy()
@@ -3,6 +3,7 @@
 
 import os
 import re
+import time
 import threading
 import logging
 from datetime import datetime, timedelta
@@ -12,11 +13,27 @@ import customtkinter as ctk
 from PIL import Image, ImageTk
 
 from modules.xml_finder import XMLFinder
-from modules.zip_service import ZipService
-from modules.email_service import EmailService
+from modules.xml_watcher import XMLWatcher
+from modules.zip_service import ZipService, encoded_size
+from modules.metadata_pipeline import MetadataPipeline
+from modules.invoice_store import InvoiceStore
+from modules.summary_writer import SummaryWriter, SUMMARY_FORMATS
+from modules.search_index import SearchIndex
+from modules.event_index import EXPORT_MODES, DEFAULT_EXPORT_MODE
+from modules.access_key import parse_event_filename
+from modules.document_layout import DOCUMENT_LAYOUTS, DEFAULT_STATUSES
+from modules.email_service import EmailService, StreamedAttachment
 from gui.settings_window import SettingsWindow
+from gui.search_window import SearchWindow
+from gui.key_lookup_window import KeyLookupWindow
 from gui.period_selector import PeriodSelector
 
+# Espaço reservado no limite de anexo do provedor para cabeçalhos e corpo do email
+MESSAGE_OVERHEAD = 256 * 1024
+
+# Folga sobre o tamanho estimado de um ZIP em fluxo (a estimativa é extrapolada de uma amostra)
+STREAM_ESTIMATE_MARGIN = 1.2
+
 class MainWindow:
     """Janela principal da aplicação"""
     
@@ -46,11 +63,21 @@ class MainWindow:
         self.company_var = ctk.StringVar(value=config.get('company_name', ''))
         self.email_var = ctk.StringVar(value=config.get('email', ''))
         
+        # Localizador mantido entre execuções para reaproveitar o cache de diretórios
+        self.xml_finder = None
+        self.xml_watcher = None
+        self.metadata_pipeline = None
+        self.search_index = None
+        
         # Definir tamanho mínimo da janela para garantir que todos os elementos sejam visíveis
         self.root.minsize(600, 950)
         
         # Construir interface
         self._build_interface()
+        
+        # Monitoramento opcional do diretório base para manter o índice atualizado
+        if self.config.get('watch_enabled', False):
+            self._start_watcher()
     
     def _build_interface(self):
         """Constrói a interface da janela principal"""
@@ -114,6 +141,20 @@ class MainWindow:
         self.period_selector = PeriodSelector(period_container)
         self.period_selector.pack(fill="x", expand=True)
         
+        # Modo de exportação (documentos cancelados e eventos)
+        export_label = ctk.CTkLabel(form_inner, text="Exportar:", anchor="e", width=120)
+        export_label.grid(row=4, column=0, sticky="e", padx=(10, 5), pady=10)
+        export_mode = self.config.get('export_mode', DEFAULT_EXPORT_MODE)
+        self.export_mode_var = ctk.StringVar(value=EXPORT_MODES.get(export_mode, EXPORT_MODES[DEFAULT_EXPORT_MODE]))
+        export_menu = ctk.CTkOptionMenu(
+            form_inner,
+            values=list(EXPORT_MODES.values()),
+            variable=self.export_mode_var,
+            command=lambda _: self._save_settings(False),
+            width=300
+        )
+        export_menu.grid(row=4, column=1, sticky="w", padx=5, pady=10)
+        
         # Auto-salvar configurações ao preencher campos
         doc_id_entry.bind("<FocusOut>", lambda e: self._save_settings(False))
         company_entry.bind("<FocusOut>", lambda e: self._save_settings(False))
@@ -162,6 +203,13 @@ class MainWindow:
         )
         version_label.pack(side="left", padx=10)
         
+        self.watch_label = ctk.CTkLabel(
+            footer_frame,
+            text="",
+            font=ctk.CTkFont(size=10)
+        )
+        self.watch_label.pack(side="left", padx=10)
+        
         developer_label = ctk.CTkLabel(
             footer_frame,
             text=f"Desenvolvido por: {self.developer} © {datetime.now().year}",
@@ -181,6 +229,13 @@ class MainWindow:
         file_menu.add_command(label="Sair", command=self.on_exit_callback)
         menubar.add_cascade(label="Arquivo", menu=file_menu)
         
+        # Menu Ferramentas
+        tools_menu = Menu(menubar, tearoff=0)
+        tools_menu.add_command(label="Verificar Todas as Empresas", command=self._scan_all_companies)
+        tools_menu.add_command(label="Pesquisar Documentos", command=self._show_search)
+        tools_menu.add_command(label="Buscar por Chaves de Acesso", command=self._show_key_lookup)
+        menubar.add_cascade(label="Ferramentas", menu=tools_menu)
+        
         # Menu Configurações
         menubar.add_command(label="Configurações", command=self._show_settings)
         
@@ -240,7 +295,34 @@ class MainWindow:
     
     def _show_settings(self):
         """Exibe a janela de configurações"""
-        settings_window = SettingsWindow(self.root, self.config, self.config_manager)
+        settings_window = SettingsWindow(self.root, self.config, self.config_manager, on_save=self._apply_watch_settings)
+    
+    def _apply_watch_settings(self):
+        """Inicia, reinicia ou interrompe o monitoramento conforme as configurações salvas"""
+        self.stop_watcher()
+        if self.config.get('watch_enabled', False):
+            self._start_watcher()
+        else:
+            self.watch_label.configure(text="")
+    
+    def _show_search(self):
+        """Exibe a janela de busca de documentos"""
+        try:
+            search_index = self._get_search_index()
+        except Exception as e:
+            self.logger.error(f"Erro ao abrir o índice de busca: {e}")
+            messagebox.showerror("Erro", f"Erro ao abrir o índice de busca: {e}")
+            return
+        
+        search_window = SearchWindow(
+            self.root,
+            search_index,
+            self._get_xml_finder(),
+            self._get_metadata_pipeline(required=True),
+            self._send_search_results,
+            email=self.email_var.get().strip(),
+            document_id=''.join(filter(str.isdigit, self.document_id_var.get()))
+        )
     
     def _show_help(self):
         """Exibe a ajuda da aplicação"""
@@ -272,6 +354,7 @@ class MainWindow:
         self.config['document_id_clean'] = doc_id_clean
         self.config['company_name'] = self.company_var.get().strip()
         self.config['email'] = self.email_var.get().strip()
+        self.config['export_mode'] = self._get_export_mode()
         
         try:
             self.config_manager.save_config(self.config)
@@ -316,6 +399,652 @@ class MainWindow:
         thread.daemon = True
         thread.start()
     
+    def _scan_all_companies(self):
+        """Verifica os arquivos do primeiro período selecionado em todas as empresas do diretório base"""
+        periods = self.period_selector.get_periods()
+        if not periods:
+            messagebox.showerror("Erro", "Selecione pelo menos um período.")
+            return
+        
+        self.status_text.delete("0.0", "end")
+        period_formatted = periods[0].replace('-', '')
+        self._add_status(f"Verificando todas as empresas para o período {period_formatted}...")
+        
+        thread = threading.Thread(target=self._process_all_companies, args=(period_formatted,))
+        thread.daemon = True
+        thread.start()
+    
+    def _process_all_companies(self, period):
+        """
+        Busca os arquivos de todas as empresas em uma thread separada.
+        
+        Args:
+            period (str): Período no formato AAAAMM
+        """
+        try:
+            results = self._get_xml_finder().scan_all_companies(period, statuses=self._get_statuses())
+        except Exception as e:
+            self._add_status(f"❌ ERRO ao verificar empresas: {str(e)}")
+            self.logger.error(f"Erro ao verificar empresas: {e}")
+            return
+        
+        if not results:
+            self._add_status("Nenhuma empresa encontrada no diretório base.")
+            return
+        
+        total_files = 0
+        for document_id, result in results.items():
+            if result['error']:
+                self._add_status(f"❌ {document_id}: {result['error']} ({result['elapsed']:.2f}s)")
+                continue
+            counts = {doc_type: len(files) for doc_type, files in result['files'].items()}
+            total_files += sum(counts.values())
+            self._add_status(f"{document_id}: {self._format_counts(counts)} ({result['elapsed']:.2f}s)")
+        
+        self._add_status(f"🎉 {len(results)} empresa(s) verificada(s), {total_files} arquivo(s) no total.")
+    
+    def _get_xml_finder(self):
+        """
+        Obtém o localizador de XML, recriando-o se o diretório base mudou.
+        
+        Returns:
+            XMLFinder: Localizador de arquivos XML
+        """
+        base_path = self.config.get('base_path')
+        if self.xml_finder is None or self.xml_finder.base_path != base_path:
+            index_path = os.path.join(self.config.get('cache_dir', 'cache'), 'xml_index.db')
+            self.xml_finder = XMLFinder(base_path, index_path)
+            
+            # O monitor acompanha o localizador do diretório base atual
+            if self.xml_watcher:
+                self.stop_watcher()
+                self._start_watcher()
+        return self.xml_finder
+    
+    def _start_watcher(self):
+        """Inicia o monitoramento do diretório base em segundo plano"""
+        self.xml_watcher = XMLWatcher(
+            self._get_xml_finder(),
+            on_change=self._on_watch_change,
+            poll_interval=self.config.get('watch_interval', 60)
+        )
+        self.xml_watcher.start()
+        self.watch_label.configure(text=f"Monitorando XMLs ({self.xml_watcher.mode})")
+    
+    def stop_watcher(self):
+        """Interrompe o monitoramento do diretório base, se ativo"""
+        if self.xml_watcher:
+            self.xml_watcher.stop()
+            self.xml_watcher = None
+    
+    def _on_watch_change(self, document_id, document_type, period, count):
+        """
+        Atualiza o rodapé quando o monitor aplica uma alteração no índice.
+        
+        Chamado na thread do monitor; a atualização da interface é agendada
+        na thread principal.
+        
+        Args:
+            document_id (str): CPF/CNPJ (apenas números)
+            document_type (str): Tipo de documento ('nfce', 'nfe', 'cte', 'mdfe')
+            period (str): Período no formato AAAAMM
+            count (int): Quantidade de XMLs no diretório
+        """
+        label = DOCUMENT_LAYOUTS[document_type]['label']
+        text = f"{document_id} {period}: {count} {label}"
+        self.root.after(0, lambda: self.watch_label.configure(text=text))
+    
+    def _get_export_mode(self):
+        """
+        Obtém o modo de exportação selecionado.
+        
+        Returns:
+            str: 'include_events', 'exclude_cancelled' ou 'cancelled_only'
+        """
+        selected = self.export_mode_var.get()
+        for mode, description in EXPORT_MODES.items():
+            if description == selected:
+                return mode
+        return DEFAULT_EXPORT_MODE
+    
+    def _get_statuses(self):
+        """
+        Obtém as situações de documento a buscar, conforme as configurações.
+        
+        Returns:
+            tuple: Situações (Autorizados, Cancelados, Denegados, Inutilizados)
+        """
+        return tuple(self.config.get('statuses') or DEFAULT_STATUSES)
+    
+    @staticmethod
+    def _format_counts(counts):
+        """
+        Formata a quantidade de arquivos por tipo, omitindo CT-e e MDF-e sem arquivos.
+        
+        Args:
+            counts (dict): {tipo: quantidade}
+        
+        Returns:
+            str: Texto como "3 NFC-e, 1 NF-e, 2 CT-e"
+        """
+        parts = [
+            f"{counts.get(doc_type, 0)} {layout['label']}"
+            for doc_type, layout in DOCUMENT_LAYOUTS.items()
+            if doc_type in ('nfce', 'nfe') or counts.get(doc_type)
+        ]
+        return ", ".join(parts)
+    
+    def _create_zip_service(self):
+        """
+        Cria o serviço de compactação conforme as configurações.
+        
+        No modo de compressão 'auto', a meta é o menor ZIP em até
+        'compression_time_limit' segundos, se configurado, ou o ZIP mais
+        rápido que cabe no limite de anexo do provedor.
+        
+        Returns:
+            ZipService: Serviço de compactação (com minificação dos XMLs, se habilitada,
+                e compressão paralela com 'zip_workers' threads; 0 usa uma por núcleo)
+        """
+        # O anexo vai em base64, que ocupa 4/3 do tamanho do ZIP
+        limit_mb = self.config.get('attachment_limit_mb', 25)
+        return ZipService(
+            minify=self.config.get('minify_xml', False),
+            workers=self.config.get('zip_workers', 0),
+            compression=self.config.get('compression', 'deflated'),
+            size_limit=int(limit_mb * 1024 * 1024 * 3 / 4) if limit_mb else None,
+            time_limit=self.config.get('compression_time_limit') or None,
+            archive_format=self.config.get('archive_format', 'zip')
+        )
+    
+    def _create_zip_attachments(self, zip_service, xml_files, zip_path, extra_attachments=()):
+        """
+        Compacta os arquivos para anexar ao email.
+        
+        Com 'stream_email' habilitado o ZIP não é gravado em disco: ele é
+        gerado durante o envio, direto na conexão SMTP. Como o tamanho final
+        só é conhecido no fim do envio, ele é estimado por uma amostra; se a
+        estimativa passar do limite de anexo, o ZIP é gerado em disco. Com um
+        limite de anexo configurado, o ZIP em disco é dividido em partes que
+        cabem nele (cada uma vai em um email).
+        
+        Args:
+            zip_service (ZipService): Serviço de compactação
+            xml_files (dict): {tipo: [arquivos]}
+            zip_path (str): Caminho do ZIP temporário (o nome do anexo vem dele)
+            extra_attachments (iterable, optional): Arquivos que vão junto com a
+                primeira parte; seu tamanho é descontado do limite
+        
+        Returns:
+            list: Anexos para EmailService.send_email (caminhos ou um StreamedAttachment),
+                um por email
+        """
+        limit_mb = self.config.get('attachment_limit_mb', 25)
+        max_encoded_size = int(limit_mb * 1024 * 1024) - MESSAGE_OVERHEAD - sum(
+            encoded_size(os.path.getsize(path)) for path in extra_attachments
+        ) if limit_mb else None
+        
+        if self.config.get('stream_email', False):
+            compression, estimate = zip_service.estimate_size(xml_files) if max_encoded_size else (None, None)
+            if estimate is None or encoded_size(int(estimate * STREAM_ESTIMATE_MARGIN)) <= max_encoded_size:
+                return [StreamedAttachment(
+                    os.path.basename(zip_path),
+                    lambda sink: zip_service.stream_files(xml_files, sink, organize_by_type=True, compression=compression)
+                )]
+            self._add_status(
+                f"⚠️ ZIP estimado em {estimate / 1024 / 1024:.1f} MB passa do limite de anexo de {limit_mb} MB: "
+                f"gerando em disco, sem envio em fluxo."
+            )
+        
+        os.makedirs("temp", exist_ok=True)
+        if not max_encoded_size:
+            return [zip_service.compress_files(xml_files, zip_path, organize_by_type=True)]
+        
+        parts = zip_service.compress_parts(xml_files, zip_path, max_encoded_size, organize_by_type=True)
+        if not parts[0].endswith(zip_service.extension):
+            self._add_status(
+                f"⚠️ O {zip_service.archive_format} passa do limite de anexo de {limit_mb} MB e não pode ser "
+                f"dividido: gerado em ZIP."
+            )
+        if len(parts) > 1:
+            self._add_status(f"📦 Arquivo dividido em {len(parts)} partes de até {limit_mb} MB (um email por parte).")
+        return parts
+    
+    def _send_parts(self, email_service, email, subject, body, parts, extra_attachments=(), **kwargs):
+        """
+        Envia um email por parte do arquivo; os anexos extras vão com a primeira.
+        
+        Args:
+            email_service (EmailService): Serviço de email
+            email (str): Email de destino
+            subject (str): Assunto (recebe '(parte i de n)' quando há mais de uma parte)
+            body (str): Corpo do email
+            parts (list): Anexos de _create_zip_attachments
+            extra_attachments (iterable, optional): Outros arquivos a anexar
+            **kwargs: Repassados para EmailService.send_email (company_info, files_info)
+        
+        Returns:
+            bool: True se todos os emails foram enviados
+        """
+        if len(parts) == 1:
+            return email_service.send_email(email, subject, body, [*parts, *extra_attachments], **kwargs)
+        
+        for index, part in enumerate(parts, 1):
+            part_name = part if isinstance(part, str) else part.filename
+            self._add_status(f"Enviando parte {index} de {len(parts)} ({os.path.basename(part_name)})...")
+            part_body = (
+                f"\n                Parte {index} de {len(parts)}: cada parte é um arquivo completo, "
+                f"que pode ser aberto separadamente.\n{body}"
+            )
+            attachments = [part, *extra_attachments] if index == 1 else [part]
+            if not email_service.send_email(email, f"{subject} (parte {index} de {len(parts)})", part_body,
+                                             attachments, **kwargs):
+                return False
+        return True
+    
+    def _get_metadata_pipeline(self, required=False):
+        """
+        Obtém a etapa de extração de metadados, se habilitada nas configurações.
+        
+        Args:
+            required (bool): Cria a etapa mesmo com a extração desabilitada
+                (usado pelo índice de busca)
+        
+        Returns:
+            MetadataPipeline: Etapa de extração ou None se desabilitada
+        """
+        if not required and not self.config.get('extract_metadata', True):
+            return None
+        if self.metadata_pipeline is None:
+            cache_path = os.path.join(self.config.get('cache_dir', 'cache'), 'xml_metadata.db')
+            self.metadata_pipeline = MetadataPipeline(cache_path)
+        return self.metadata_pipeline
+    
+    def _get_search_index(self):
+        """
+        Obtém o índice de busca, gravado junto com o índice de arquivos.
+        
+        Returns:
+            SearchIndex: Índice de busca
+        """
+        if self.search_index is None:
+            db_path = os.path.join(self.config.get('cache_dir', 'cache'), 'xml_search.db')
+            self.search_index = SearchIndex(db_path)
+        return self.search_index
+    
+    def _send_search_results(self, results, email):
+        """
+        Compacta e envia os documentos encontrados na busca, em uma thread separada.
+        
+        Args:
+            results (list): Resultados de SearchIndex.search
+            email (str): Email de destino
+        """
+        self.status_text.delete("0.0", "end")
+        self._add_status(f"Exportando {len(results)} documento(s) da busca para {email}")
+        
+        thread = threading.Thread(target=self._process_search_sending, args=(results, email))
+        thread.daemon = True
+        thread.start()
+    
+    def _process_search_sending(self, results, email):
+        """
+        Compacta os documentos da busca (uma pasta por tipo) e envia por email.
+        
+        Args:
+            results (list): Resultados de SearchIndex.search
+            email (str): Email de destino
+        """
+        try:
+            periods = sorted({row['period'] for row in results})
+            period_display = periods[0] if len(periods) == 1 else f"{periods[0]} a {periods[-1]}"
+            result = self._send_selected_files(
+                SearchIndex.group_by_type(results),
+                email,
+                'pesquisa',
+                period_display,
+                f"Seguem os {len(results)} arquivo(s) XML selecionados na pesquisa, referentes a {period_display}."
+            )
+            
+            if result:
+                self._add_status("✅ Documentos da pesquisa enviados com sucesso!")
+            else:
+                self._add_status("❌ ERRO: Falha no envio dos documentos da pesquisa.")
+        except Exception as e:
+            self._add_status(f"❌ ERRO ao exportar documentos da pesquisa: {str(e)}")
+            self.logger.error(f"Erro ao exportar documentos da pesquisa: {e}")
+    
+    def _show_key_lookup(self):
+        """Exibe a janela de busca por chaves de acesso"""
+        key_lookup_window = KeyLookupWindow(self.root, self._send_access_keys, email=self.email_var.get().strip())
+    
+    def _send_access_keys(self, keys, email):
+        """
+        Localiza, compacta e envia os XMLs de uma lista de chaves, em uma thread separada.
+        
+        Args:
+            keys (list): Chaves de acesso de 44 dígitos
+            email (str): Email de destino
+        """
+        self.status_text.delete("0.0", "end")
+        self._add_status(f"Buscando {len(keys)} chave(s) de acesso para {email}")
+        
+        thread = threading.Thread(target=self._process_key_sending, args=(keys, email))
+        thread.daemon = True
+        thread.start()
+    
+    def _process_key_sending(self, keys, email):
+        """
+        Localiza os XMLs pelas chaves de acesso e envia os encontrados por email.
+        
+        As chaves não encontradas são informadas no status e vão em um arquivo
+        texto anexado, para que o cliente saiba o que ficou de fora.
+        
+        Args:
+            keys (list): Chaves de acesso de 44 dígitos
+            email (str): Email de destino
+        """
+        missing_path = f"temp/chaves_nao_encontradas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        try:
+            start = time.perf_counter()
+            xml_finder = self._get_xml_finder()
+            xml_files, missing, invalid = xml_finder.find_by_access_keys(keys, statuses=self._get_statuses())
+            xml_files, duplicates = xml_finder.deduplicate(xml_files)
+            found = len(keys) - len(missing) - len(invalid)
+            self._add_status(
+                f"{found} chave(s) encontrada(s), {len(missing)} não encontrada(s), "
+                f"{len(invalid)} inválida(s) ({time.perf_counter() - start:.2f}s)"
+            )
+            for label, problem_keys in (("Não encontrada", missing), ("Dígito verificador inválido", invalid)):
+                for key in problem_keys[:5]:
+                    self._add_status(f"   {label}: {key}")
+                if len(problem_keys) > 5:
+                    self._add_status(f"   ... e mais {len(problem_keys) - 5}")
+            
+            if not found:
+                self._add_status("Nenhum arquivo encontrado para as chaves informadas.")
+                return
+            
+            extra_attachments = []
+            if missing or invalid:
+                os.makedirs("temp", exist_ok=True)
+                with open(missing_path, 'w', encoding='utf-8') as f:
+                    f.writelines(f"{key};não encontrada\n" for key in missing)
+                    f.writelines(f"{key};dígito verificador inválido\n" for key in invalid)
+                extra_attachments.append(missing_path)
+            
+            periods = sorted({f"20{key[2:6]}" for key in keys if key not in invalid})
+            period_display = periods[0] if len(periods) == 1 else f"{periods[0]} a {periods[-1]}"
+            description = f"Seguem os arquivos XML de {found} das {len(keys)} chave(s) de acesso solicitadas."
+            if extra_attachments:
+                description += " As chaves não localizadas estão listadas no arquivo texto anexo."
+            
+            result = self._send_selected_files(xml_files, email, 'chaves', period_display, description, extra_attachments)
+            if result:
+                self._add_status("✅ Documentos das chaves enviados com sucesso!")
+            else:
+                self._add_status("❌ ERRO: Falha no envio dos documentos das chaves.")
+        except Exception as e:
+            self._add_status(f"❌ ERRO ao exportar documentos por chave: {str(e)}")
+            self.logger.error(f"Erro ao exportar documentos por chave: {e}")
+        finally:
+            if os.path.exists(missing_path):
+                os.remove(missing_path)
+    
+    def _send_selected_files(self, xml_files, email, origin, period_display, description, extra_attachments=()):
+        """
+        Compacta (uma pasta por tipo) e envia por email arquivos escolhidos fora da busca por período.
+        
+        Args:
+            xml_files (dict): {tipo: [arquivos]}
+            email (str): Email de destino
+            origin (str): Origem da seleção ('pesquisa', 'chaves'), usada no nome do ZIP e no assunto
+            period_display (str): Períodos dos documentos, para o email
+            description (str): Frase do corpo do email que descreve os arquivos
+            extra_attachments (iterable, optional): Outros arquivos a anexar
+        
+        Returns:
+            bool: True se o email foi enviado
+        """
+        zip_service = self._create_zip_service()
+        zip_path = f"temp/{origin}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_xmls{zip_service.extension}"
+        xml_files, rejected = self._validate_files(self._get_xml_finder(), xml_files)
+        counts = {doc_type: len(xml_files.get(doc_type, [])) for doc_type in DOCUMENT_LAYOUTS}
+        zip_parts = []
+        try:
+            self._add_status(f"Compactando {self._format_counts(counts)}...")
+            zip_parts = self._create_zip_attachments(zip_service, xml_files, zip_path, extra_attachments)
+            
+            company_info = {
+                'name': self.company_var.get(),
+                'document_id': self.document_id_var.get(),
+                'period': period_display
+            }
+            files_info = {f'{doc_type}_count': count for doc_type, count in counts.items()}
+            files_info['counts'] = counts
+            files_info['rejected'] = rejected
+            
+            subject = f"Arquivos XML ({origin}) {period_display} - {self.company_var.get()}"
+            body = f"""
+            Olá,
+            
+            {description}
+            
+            Este é um email automático, por favor não responda.
+            """
+            
+            self._add_status(f"Enviando email para {email}...")
+            return self._send_parts(
+                EmailService(self.config.get('smtp', {})),
+                email,
+                subject,
+                body,
+                zip_parts,
+                extra_attachments,
+                company_info=company_info,
+                files_info=files_info
+            )
+        finally:
+            removed = False
+            for path in {zip_path, *(part for part in zip_parts if isinstance(part, str))}:
+                if os.path.exists(path):
+                    os.remove(path)
+                    removed = True
+            if removed:
+                self._add_status("🧹 Arquivos temporários removidos.")
+    
+    def _validate_files(self, xml_finder, xml_files):
+        """
+        Verifica os arquivos antes da compactação, se habilitado nas configurações.
+        
+        Args:
+            xml_finder (XMLFinder): Localizador de arquivos XML
+            xml_files (dict): {tipo: [arquivos]}
+        
+        Returns:
+            tuple: ({tipo: [arquivos]} íntegros, [{'filename', 'path', 'reason'}] rejeitados)
+        """
+        if not self.config.get('validate_xml', True):
+            return xml_files, []
+        
+        start = time.perf_counter()
+        xml_files, rejected = xml_finder.validate_files(xml_files)
+        total = sum(len(files) for files in xml_files.values()) + len(rejected)
+        self._add_status(f"Verificação de {total} arquivo(s) em {time.perf_counter() - start:.2f}s")
+        
+        if rejected:
+            self._add_status(f"⚠️ {len(rejected)} arquivo(s) com problema deixado(s) fora do ZIP:")
+            for _, file_info, reason in rejected[:5]:
+                self._add_status(f"   {file_info['path']} ({reason})")
+            if len(rejected) > 5:
+                self._add_status(f"   ... e mais {len(rejected) - 5}")
+        
+        return xml_files, [
+            {'filename': file_info['filename'], 'path': file_info['path'], 'reason': reason}
+            for _, file_info, reason in rejected
+        ]
+    
+    def _check_access_keys(self, doc_id, batch, period):
+        """
+        Confere as chaves de acesso contidas nos nomes dos arquivos de um período.
+        
+        Args:
+            doc_id (str): CPF/CNPJ limpo (apenas números)
+            batch (AccessKeyBatch): Campos das chaves de acesso dos arquivos
+            period (str): Período no formato AAAAMM
+        """
+        checks = [
+            ("sem chave de acesso no nome", batch.without_key()),
+            ("com dígito verificador inválido", batch.invalid()),
+            ("com chave de outro período", batch.outside_period(period)),
+        ]
+        if len(doc_id) == 14:
+            checks.append(("com chave de outro emitente", batch.other_issuer(doc_id)))
+        
+        for description, positions in checks:
+            if positions:
+                names = ", ".join(batch.filenames[i] for i in positions[:3])
+                more = f" ... e mais {len(positions) - 3}" if len(positions) > 3 else ""
+                self._add_status(f"⚠️ {len(positions)} arquivo(s) {description}: {names}{more}")
+    
+    def _report_gaps(self, batch):
+        """
+        Informa os números faltantes em cada modelo e série.
+        
+        Args:
+            batch (AccessKeyBatch): Campos das chaves de acesso dos arquivos
+        
+        Returns:
+            list: [{'label', 'series', 'ranges', 'missing'}] para o email
+        """
+        labels = {layout['model']: layout['label'] for layout in DOCUMENT_LAYOUTS.values()}
+        gaps = []
+        for (model, series), ranges in batch.sequence_gaps().items():
+            missing = sum(last - first + 1 for first, last in ranges)
+            label = labels.get(model, f"Modelo {model}")
+            gaps.append({'label': label, 'series': series, 'ranges': ranges, 'missing': missing})
+            
+            text = ", ".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges[:10])
+            more = f" ... e mais {len(ranges) - 10} intervalo(s)" if len(ranges) > 10 else ""
+            self._add_status(f"⚠️ {label} série {series}: {missing} número(s) faltante(s): {text}{more}")
+        
+        if not gaps and len(batch):
+            self._add_status("Numeração sem lacunas em todas as séries.")
+        return gaps
+    
+    def _extract_metadata(self, doc_id, xml_files, period, summary_writer=None, event_index=None):
+        """
+        Extrai os metadados dos XMLs de um período e verifica a data de emissão.
+        
+        Os metadados são consumidos à medida que são extraídos: vão para o
+        armazenamento em colunas e, se informado, para o arquivo de resumo,
+        sem manter a lista completa em memória. XMLs de evento (cancelamento,
+        carta de correção) não são documentos e ficam de fora.
+        
+        Args:
+            doc_id (str): CPF/CNPJ limpo (apenas números)
+            xml_files (dict): {tipo: [arquivos]} encontrados pelo XMLFinder
+            period (str): Período no formato AAAAMM
+            summary_writer (SummaryWriter, optional): Gravador do resumo por documento
+            event_index (EventIndex, optional): Eventos da listagem; documentos
+                cancelados ficam fora dos totais
+        
+        Returns:
+            InvoiceStore: Metadados do período ou None se a extração estiver desabilitada
+        """
+        pipeline = self._get_metadata_pipeline()
+        if pipeline is None:
+            return None
+        
+        self._add_status("Extraindo metadados dos XMLs...")
+        start = time.perf_counter()
+        store = InvoiceStore(doc_id, period)
+        unreadable = 0
+        out_of_period = []
+        out_of_period_count = 0
+        
+        documents = (
+            f for files in xml_files.values() for f in files if parse_event_filename(f['filename']) is None
+        )
+        for file_info, metadata in pipeline.process(documents):
+            if metadata is None:
+                unreadable += 1
+                continue
+            store.add(metadata, event_index is not None and event_index.is_document_cancelled(file_info))
+            if summary_writer:
+                summary_writer.write(file_info, metadata)
+            if metadata['period'] and metadata['period'] != period:
+                out_of_period_count += 1
+                if len(out_of_period) < 5:
+                    out_of_period.append((file_info['filename'], metadata['issued_at']))
+        
+        self._add_status(
+            f"Metadados de {len(store) + unreadable} arquivo(s) em {time.perf_counter() - start:.2f}s "
+            f"({pipeline.stats['parsed']} lido(s), {pipeline.stats['cached']} do cache)"
+        )
+        
+        if unreadable:
+            self._add_status(f"⚠️ {unreadable} arquivo(s) sem metadados legíveis")
+        
+        if out_of_period_count:
+            self._add_status(f"⚠️ {out_of_period_count} documento(s) emitido(s) fora do período {period}:")
+            for filename, issued_at in out_of_period:
+                self._add_status(f"   {filename} ({issued_at})")
+            if out_of_period_count > 5:
+                self._add_status(f"   ... e mais {out_of_period_count - 5}")
+        
+        return store
+    
+    def _report_summary(self, store):
+        """
+        Calcula e informa os totais do período.
+        
+        Args:
+            store (InvoiceStore): Metadados do período
+        
+        Returns:
+            dict: Totais do período (ver InvoiceStore.summary)
+        """
+        summary = store.summary()
+        
+        self._add_status(
+            f"Totais: {summary['count']} documento(s), valor {InvoiceStore.format_currency(summary['total'])}, "
+            f"ICMS {InvoiceStore.format_currency(summary['icms'])}"
+        )
+        if summary['cancelled']:
+            self._add_status(
+                f"   Cancelados (fora dos totais): {summary['cancelled']} documento(s), "
+                f"valor {InvoiceStore.format_currency(summary['cancelled_total'])}"
+            )
+        if summary['cfop']:
+            cfops = ", ".join(f"{cfop}: {count}" for cfop, count in list(summary['cfop'].items())[:10])
+            self._add_status(f"   CFOP: {cfops}")
+        if summary['payments']:
+            payments = ", ".join(
+                f"{InvoiceStore.payment_label(payment)}: {count}" for payment, count in summary['payments'].items()
+            )
+            self._add_status(f"   Pagamento: {payments}")
+        return summary
+    
+    def _create_summary_writer(self, doc_id, period):
+        """
+        Cria o gravador do resumo por documento, se habilitado nas configurações.
+        
+        Args:
+            doc_id (str): CPF/CNPJ limpo (apenas números)
+            period (str): Período no formato AAAAMM
+        
+        Returns:
+            SummaryWriter: Gravador do resumo ou None se desabilitado
+        """
+        summary_format = self.config.get('summary_format', '')
+        if summary_format not in SUMMARY_FORMATS or self._get_metadata_pipeline() is None:
+            return None
+        
+        os.makedirs("temp", exist_ok=True)
+        output_path = f"temp/{doc_id}_{period}_resumo{SUMMARY_FORMATS[summary_format]}"
+        return SummaryWriter(output_path, summary_format)
+    
     def _process_xml_sending(self, doc_id, email, periods):
         """
         Processa o envio de arquivos XML em uma thread separada.
@@ -325,10 +1054,23 @@ class MainWindow:
             email (str): Email de destino
             periods (list): Lista de períodos a processar
         """
-        xml_finder = XMLFinder(self.config.get('base_path'))
-        zip_service = ZipService()
+        xml_finder = self._get_xml_finder()
+        zip_service = self._create_zip_service()
         email_service = EmailService(self.config.get('smtp', {}))
         
+        # Buscar todos os períodos de uma vez (leituras de diretório em paralelo)
+        periods_formatted = [period.replace('-', '') for period in periods]
+        self._add_status(f"Buscando arquivos para os períodos: {', '.join(periods_formatted)}")
+        try:
+            files_by_period = xml_finder.find_xml_files_for_periods(
+                doc_id, periods_formatted, statuses=self._get_statuses()
+            )
+        except Exception as e:
+            self._add_status(f"❌ ERRO durante a busca dos arquivos: {str(e)}")
+            self.logger.error(f"Erro na busca dos arquivos: {e}")
+            self._add_status("🎉 Processamento concluído!")
+            return
+        
         for period in periods:
             try:
                 # Formatar período para o formato esperado (AAAAMM)
@@ -345,44 +1087,82 @@ class MainWindow:
                 month_name = month_names.get(month, month)
                 period_display = f"{month_name} de {year}"
                 
-                self._add_status(f"Buscando arquivos para o período: {period_formatted}")
+                self._add_status(f"Processando o período: {period_formatted}")
+                
+                xml_files = files_by_period[period_formatted]
                 
-                # Buscar arquivos XML
-                xml_files = xml_finder.find_xml_files(doc_id, period_formatted)
+                # Chaves de acesso decodificadas uma vez pelos nomes; o mesmo lote serve
+                # para os repetidos e para a conferência da numeração, que usa a listagem
+                # completa (só sem repetidos): documentos deixados de fora pela verificação
+                # ou pelo modo de exportação existem e não são lacunas
+                key_batch = xml_finder.decode_access_keys(f for files in xml_files.values() for f in files)
                 
-                nfce_files = xml_files['nfce']
-                nfe_files = xml_files['nfe']
+                # Descartar arquivos repetidos (mesma chave de acesso) antes de compactar
+                xml_files, duplicates, key_batch = xml_finder.deduplicate_batch(xml_files, key_batch)
+                if duplicates:
+                    self._add_status(f"⚠️ {len(duplicates)} arquivo(s) repetido(s) descartado(s):")
+                    for _, dropped, kept in duplicates[:5]:
+                        self._add_status(f"   {dropped['path']} (mantido: {kept['filename']})")
+                    if len(duplicates) > 5:
+                        self._add_status(f"   ... e mais {len(duplicates) - 5}")
                 
-                self._add_status(f"Encontrados {len(nfce_files)} arquivos NFC-e e {len(nfe_files)} arquivos NF-e")
+                # Deixar de fora arquivos vazios, truncados ou malformados
+                xml_files, rejected = self._validate_files(xml_finder, xml_files)
+                
+                # Separar eventos e aplicar o modo de exportação (cancelados)
+                export_mode = self._get_export_mode()
+                xml_files, event_index = xml_finder.apply_export_mode(xml_files, export_mode)
+                event_count = sum(len(events) for events in event_index.events.values()) + len(event_index.unknown)
+                if event_count or event_index.cancelled:
+                    self._add_status(
+                        f"{event_count} evento(s), {len(event_index.cancelled)} cancelamento(s) - "
+                        f"{EXPORT_MODES[export_mode]}"
+                    )
+                
+                counts = {doc_type: len(files) for doc_type, files in xml_files.items()}
+                folder_lines = [
+                    f"Pasta {DOCUMENT_LAYOUTS[doc_type]['zip_folder']}/: {count} arquivo(s)"
+                    for doc_type, count in counts.items()
+                    if doc_type in ('nfce', 'nfe') or count
+                ]
+                
+                self._add_status(f"Encontrados {self._format_counts(counts)}")
                 
                 # Verificar se encontrou arquivos
-                total_files = len(nfce_files) + len(nfe_files)
+                total_files = sum(counts.values())
                 if total_files == 0:
                     self._add_status(f"Nenhum arquivo encontrado para o período {period}")
                     continue
                 
-                # CORREÇÃO PRINCIPAL: Passar o dicionário organizado para manter separação por tipo
-                self._add_status(f"Compactando {total_files} arquivos organizados por tipo (NFCe e NFe em pastas separadas)...")
+                # Conferir as chaves de acesso pelos nomes dos arquivos
+                self._check_access_keys(doc_id, key_batch, period_formatted)
+                gaps = self._report_gaps(key_batch)
                 
-                zip_path = f"temp/{doc_id}_{period_formatted}_xmls.zip"
-                os.makedirs("temp", exist_ok=True)
+                # Resumo por documento (CSV/SQLite) anexado junto com o ZIP, se configurado
+                summary_writer = self._create_summary_writer(doc_id, period_formatted)
                 
-                # IMPORTANTE: Usar dicionário organizado em vez de lista simples
-                files_organized = {
-                    'nfce': nfce_files,  # Lista de arquivos NFCe
-                    'nfe': nfe_files     # Lista de arquivos NFe
-                }
+                # Extrair metadados dos XMLs (chave, emissão, valor), com cache por arquivo
+                if summary_writer:
+                    with summary_writer:
+                        store = self._extract_metadata(doc_id, xml_files, period_formatted, summary_writer, event_index)
+                    self._add_status(f"Resumo com {summary_writer.rows} documento(s) gerado.")
+                else:
+                    store = self._extract_metadata(doc_id, xml_files, period_formatted, event_index=event_index)
                 
-                # Usar organize_by_type=True para criar estrutura de pastas
-                compressed_path = zip_service.compress_files(
-                    files_organized,      # Dicionário organizado
-                    zip_path,            # Caminho do ZIP
-                    organize_by_type=True # CRUCIAL: Garante organização em pastas
-                )
+                # Passar o dicionário organizado para manter separação por tipo
+                self._add_status(f"Compactando {total_files} arquivos organizados por tipo (uma pasta por tipo de documento)...")
+                
+                zip_path = f"temp/{doc_id}_{period_formatted}_xmls{zip_service.extension}"
+                
+                # ZIP com uma pasta por tipo, em disco (dividido em partes, se preciso) ou gerado durante o envio
+                extra_attachments = [summary_writer.output_path] if summary_writer else []
+                zip_parts = self._create_zip_attachments(zip_service, xml_files, zip_path, extra_attachments)
                 
                 self._add_status(f"ZIP criado com estrutura organizada:")
-                self._add_status(f"  - Pasta NFCe/: {len(nfce_files)} arquivo(s)")
-                self._add_status(f"  - Pasta NFe/: {len(nfe_files)} arquivo(s)")
+                for line in folder_lines:
+                    self._add_status(f"  - {line}")
+                
+                attachments = [*zip_parts, *extra_attachments]
                 
                 # Preparar informações para o email
                 company_info = {
@@ -391,35 +1171,47 @@ class MainWindow:
                     'period': period_display
                 }
                 
-                files_info = {
-                    'nfce_count': len(nfce_files),
-                    'nfe_count': len(nfe_files)
-                }
+                files_info = {f'{doc_type}_count': count for doc_type, count in counts.items()}
+                files_info['counts'] = counts
+                files_info['gaps'] = gaps
+                files_info['rejected'] = rejected
+                if store is not None:
+                    files_info['summary'] = self._report_summary(store)
                 
                 # Enviar email
                 self._add_status(f"Enviando email para {email}...")
                 
+                document_labels = " e ".join(
+                    DOCUMENT_LAYOUTS[doc_type]['label'] for doc_type, count in counts.items() if count
+                )
+                folders_text = "\n".join(f"                - {line}" for line in folder_lines)
+                archive_names = [os.path.basename(part if isinstance(part, str) else part.filename) for part in zip_parts]
+                if len(archive_names) == 1:
+                    archives_text = f"do arquivo {archive_names[0]}"
+                else:
+                    archives_text = f"dos arquivos {', '.join(archive_names)} (um por email)"
                 subject = f"Arquivos XML {period_display} - {self.company_var.get()}"
                 body = f"""
                 Olá,
                 
-                Seguem os arquivos XML de NF-e e NFC-e referentes ao período {period_display}.
+                Seguem os arquivos XML de {document_labels} referentes ao período {period_display}.
                 
                 Empresa: {self.company_var.get()}
                 CNPJ: {self.document_id_var.get()}
                 
-                Os arquivos estão organizados em pastas separadas dentro do arquivo ZIP:
-                - Pasta NFCe/: {len(nfce_files)} arquivo(s)
-                - Pasta NFe/: {len(nfe_files)} arquivo(s)
+                Os arquivos estão organizados em pastas separadas dentro {archives_text}:
+{folders_text}
                 
                 Este é um email automático, por favor não responda.
                 """
                 
-                result = email_service.send_email(
-                    email, 
-                    subject, 
-                    body, 
-                    [compressed_path],
+                result = self._send_parts(
+                    email_service,
+                    email,
+                    subject,
+                    body,
+                    zip_parts,
+                    extra_attachments,
                     company_info=company_info,
                     files_info=files_info
                 )
@@ -427,15 +1219,17 @@ class MainWindow:
                 if result:
                     self._add_status(f"✅ Envio concluído com sucesso para o período {period}!")
                     self._add_status(f"📦 Arquivo enviado com estrutura organizada:")
-                    self._add_status(f"   📁 NFCe/ ({len(nfce_files)} arquivos)")
-                    self._add_status(f"   📁 NFe/ ({len(nfe_files)} arquivos)")
+                    for doc_type, count in counts.items():
+                        if doc_type in ('nfce', 'nfe') or count:
+                            self._add_status(f"   📁 {DOCUMENT_LAYOUTS[doc_type]['zip_folder']}/ ({count} arquivos)")
                 else:
                     self._add_status(f"❌ ERRO: Falha no envio dos arquivos para o período {period}.")
                 
                 # Limpar arquivos temporários
-                if os.path.exists(compressed_path):
-                    os.remove(compressed_path)
-                    self._add_status("🧹 Arquivos temporários removidos.")
+                for attachment in attachments:
+                    if isinstance(attachment, str) and os.path.exists(attachment):
+                        os.remove(attachment)
+                self._add_status("🧹 Arquivos temporários removidos.")
                 
             except Exception as e:
                 self._add_status(f"❌ ERRO durante o processamento do período {period}: {str(e)}")
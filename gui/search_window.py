@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+from tkinter import messagebox, Toplevel, Frame
+
+import customtkinter as ctk
+
+from modules.invoice_store import InvoiceStore
+from modules.document_layout import DOCUMENT_LAYOUTS
+
+# Resultados exibidos na caixa de texto (a exportação usa todos)
+MAX_DISPLAYED = 500
+
+class SearchWindow:
+    """Janela de busca de documentos por destinatário, produto ou valor"""
+    
+    def __init__(self, parent, search_index, xml_finder, pipeline, on_send, email='', document_id=''):
+        """
+        Inicializa a janela de busca.
+        
+        Args:
+            parent (CTk): Janela pai
+            search_index (SearchIndex): Índice de busca
+            xml_finder (XMLFinder): Localizador de arquivos XML (atualização do índice)
+            pipeline (MetadataPipeline): Etapa de extração de metadados
+            on_send (function): Chamada como on_send(resultados, email) para compactar e enviar
+            email (str): Email de destino sugerido
+            document_id (str): CPF/CNPJ do emitente sugerido (apenas números)
+        """
+        self.parent = parent
+        self.search_index = search_index
+        self.xml_finder = xml_finder
+        self.pipeline = pipeline
+        self.on_send = on_send
+        self.results = []
+        
+        self.logger = logging.getLogger("XMLSender.SearchWindow")
+        
+        # Criar janela
+        self.window = Toplevel(parent)
+        self.window.title("Pesquisar Documentos")
+        self.window.geometry("700x650")
+        self.window.transient(parent)
+        
+        # Centralizar a janela em relação à janela pai
+        x = parent.winfo_x() + (parent.winfo_width() / 2) - (700 / 2)
+        y = parent.winfo_y() + (parent.winfo_height() / 2) - (650 / 2)
+        self.window.geometry("+%d+%d" % (x, y))
+        
+        self.field_vars = {
+            'document_id': ctk.StringVar(value=document_id),
+            'recipient': ctk.StringVar(),
+            'product': ctk.StringVar(),
+            'ncm': ctk.StringVar(),
+            'cfop': ctk.StringVar(),
+            'min_total': ctk.StringVar(),
+            'max_total': ctk.StringVar(),
+            'period_from': ctk.StringVar(),
+            'period_to': ctk.StringVar()
+        }
+        self.email_var = ctk.StringVar(value=email)
+        
+        self._build_interface()
+        self._show_message(f"{self.search_index.count_documents()} documento(s) no índice de busca.")
+    
+    def _build_interface(self):
+        """Constrói a interface da janela de busca"""
+        main_container = Frame(self.window)
+        main_container.pack(fill="both", expand=True)
+        
+        main_frame = ctk.CTkFrame(main_container)
+        main_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        # Filtros: (rótulo, campo, linha, coluna)
+        filters_frame = ctk.CTkFrame(main_frame)
+        filters_frame.pack(fill="x", padx=10, pady=10)
+        
+        fields = (
+            ("Emitente (CPF/CNPJ):", 'document_id', 0, 0),
+            ("Destinatário (CPF/CNPJ):", 'recipient', 0, 2),
+            ("Produto (código/descrição):", 'product', 1, 0),
+            ("NCM:", 'ncm', 1, 2),
+            ("CFOP:", 'cfop', 2, 0),
+            ("Valor mínimo:", 'min_total', 3, 0),
+            ("Valor máximo:", 'max_total', 3, 2),
+            ("Período inicial (AAAAMM):", 'period_from', 4, 0),
+            ("Período final (AAAAMM):", 'period_to', 4, 2)
+        )
+        for label_text, field, row, column in fields:
+            label = ctk.CTkLabel(filters_frame, text=label_text, anchor="e")
+            label.grid(row=row, column=column, sticky="e", padx=(10, 5), pady=5)
+            entry = ctk.CTkEntry(filters_frame, textvariable=self.field_vars[field], width=160)
+            entry.grid(row=row, column=column + 1, sticky="w", padx=5, pady=5)
+            entry.bind("<Return>", lambda e: self._search())
+        
+        email_label = ctk.CTkLabel(filters_frame, text="Email:", anchor="e")
+        email_label.grid(row=5, column=0, sticky="e", padx=(10, 5), pady=5)
+        email_entry = ctk.CTkEntry(filters_frame, textvariable=self.email_var, width=400)
+        email_entry.grid(row=5, column=1, columnspan=3, sticky="w", padx=5, pady=5)
+        
+        # Botões de ação
+        buttons_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        buttons_frame.pack(fill="x", padx=10, pady=5)
+        
+        self.update_button = ctk.CTkButton(
+            buttons_frame,
+            text="Atualizar Índice",
+            command=self._update_index,
+            width=140
+        )
+        self.update_button.pack(side="left", padx=10, pady=5)
+        
+        search_button = ctk.CTkButton(
+            buttons_frame,
+            text="Buscar",
+            command=self._search,
+            width=140
+        )
+        search_button.pack(side="left", padx=10, pady=5)
+        
+        send_button = ctk.CTkButton(
+            buttons_frame,
+            text="Exportar e Enviar",
+            command=self._send_results,
+            width=140
+        )
+        send_button.pack(side="left", padx=10, pady=5)
+        
+        close_button = ctk.CTkButton(
+            buttons_frame,
+            text="Fechar",
+            command=self.window.destroy,
+            width=100
+        )
+        close_button.pack(side="right", padx=10, pady=5)
+        
+        # Resultados
+        self.results_text = ctk.CTkTextbox(main_frame)
+        self.results_text.pack(fill="both", expand=True, padx=10, pady=10)
+    
+    def _show_message(self, message, clear=False):
+        """
+        Adiciona uma mensagem à área de resultados.
+        
+        Args:
+            message (str): Mensagem a ser adicionada
+            clear (bool): Se deve limpar a área antes
+        """
+        if clear:
+            self.results_text.delete("0.0", "end")
+        self.results_text.insert("end", f"{message}\n")
+        self.results_text.see("end")
+    
+    def _update_index(self):
+        """Atualiza o índice de busca em uma thread separada"""
+        document_id = ''.join(filter(str.isdigit, self.field_vars['document_id'].get()))
+        self.update_button.configure(state="disabled")
+        self._show_message("Atualizando índice de busca...", clear=True)
+        
+        thread = threading.Thread(target=self._run_update, args=(document_id or None,))
+        thread.daemon = True
+        thread.start()
+    
+    def _run_update(self, document_id):
+        """
+        Atualiza o índice de busca (executado fora da thread da interface).
+        
+        Args:
+            document_id (str): CPF/CNPJ a atualizar ou None para todos
+        """
+        def progress(done, total):
+            self.window.after(0, lambda: self._show_message(f"   {done}/{total} documento(s) indexado(s)"))
+        
+        try:
+            added, removed = self.search_index.update(self.xml_finder, self.pipeline, document_id, progress)
+            message = f"✅ Índice atualizado: {added} documento(s) indexado(s), {removed} removido(s)."
+        except Exception as e:
+            self.logger.error(f"Erro ao atualizar índice de busca: {e}")
+            message = f"❌ ERRO ao atualizar índice de busca: {str(e)}"
+        
+        def finish():
+            self._show_message(message)
+            self.update_button.configure(state="normal")
+        self.window.after(0, finish)
+    
+    def _get_filters(self):
+        """
+        Lê os filtros preenchidos.
+        
+        Returns:
+            dict: Argumentos para SearchIndex.search
+        """
+        filters = {field: var.get().strip() or None for field, var in self.field_vars.items()}
+        if filters['document_id']:
+            filters['document_id'] = ''.join(filter(str.isdigit, filters['document_id']))
+        for field in ('min_total', 'max_total'):
+            if filters[field]:
+                try:
+                    filters[field] = float(filters[field].replace('.', '').replace(',', '.'))
+                except ValueError:
+                    raise ValueError(f"Valor inválido: {filters[field]}")
+        return filters
+    
+    def _search(self):
+        """Executa a busca e exibe os resultados"""
+        try:
+            filters = self._get_filters()
+        except ValueError as e:
+            messagebox.showerror("Erro", str(e), parent=self.window)
+            return
+        
+        if not any(value is not None for value in filters.values()):
+            messagebox.showerror("Erro", "Preencha pelo menos um filtro.", parent=self.window)
+            return
+        
+        try:
+            self.results = self.search_index.search(**filters)
+        except Exception as e:
+            self.logger.error(f"Erro na busca: {e}")
+            messagebox.showerror("Erro", f"Erro na busca: {e}", parent=self.window)
+            return
+        
+        total = sum(row['total'] or 0.0 for row in self.results)
+        self._show_message(
+            f"{len(self.results)} documento(s) encontrado(s) - {InvoiceStore.format_currency(total)}",
+            clear=True
+        )
+        for row in self.results[:MAX_DISPLAYED]:
+            label = DOCUMENT_LAYOUTS[row['document_type']]['label']
+            value = InvoiceStore.format_currency(row['total']) if row['total'] is not None else "-"
+            recipient = row['recipient_name'] or row['recipient_id'] or ""
+            self._show_message(f"{row['period']}  {label:<6} {value:>16}  {recipient}  {row['filename']}")
+        if len(self.results) > MAX_DISPLAYED:
+            self._show_message(f"... e mais {len(self.results) - MAX_DISPLAYED}")
+    
+    def _send_results(self):
+        """Compacta e envia por email os documentos encontrados"""
+        email = self.email_var.get().strip()
+        if not self.results:
+            messagebox.showerror("Erro", "Nenhum documento para exportar. Faça uma busca primeiro.", parent=self.window)
+            return
+        if not email:
+            messagebox.showerror("Erro", "Informe o email de destino.", parent=self.window)
+            return
+        
+        self.on_send(list(self.results), email)
+        self._show_message(f"Enviando {len(self.results)} documento(s) para {email} (acompanhe na janela principal).")
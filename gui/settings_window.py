@@ -7,11 +7,18 @@ from tkinter import messagebox, Toplevel, Frame
 import customtkinter as ctk
 
 from modules.email_service import EmailService
+from modules.document_layout import STATUS_FOLDERS, DEFAULT_STATUSES
+from modules.compression_tuner import COMPRESSION_METHODS, DEFAULT_COMPRESSION, AUTO_COMPRESSION
+from modules.zip_service import ARCHIVE_FORMATS, DEFAULT_ARCHIVE_FORMAT
+from modules.summary_writer import SUMMARY_FORMATS
+
+# Opção do menu de resumo por documento que desativa o resumo (summary_format vazio)
+NO_SUMMARY = "nenhum"
 
 class SettingsWindow:
     """Janela de configurações da aplicação"""
     
-    def __init__(self, parent, config, config_manager):
+    def __init__(self, parent, config, config_manager, on_save=None):
         """
         Inicializa a janela de configurações.
         
@@ -19,10 +26,13 @@ class SettingsWindow:
             parent (CTk): Janela pai
             config (dict): Configurações da aplicação
             config_manager (ConfigManager): Gerenciador de configurações
+            on_save (callable, optional): Chamado após salvar, para aplicar as
+                configurações que não são lidas a cada operação (monitoramento)
         """
         self.parent = parent
         self.config = config
         self.config_manager = config_manager
+        self.on_save = on_save
         
         self.logger = logging.getLogger("XMLSender.SettingsWindow")
         
@@ -73,7 +83,7 @@ class SettingsWindow:
         self.tab_var = ctk.StringVar(value="smtp")
         self.tab_buttons = ctk.CTkSegmentedButton(
             tabs_frame,
-            values=["SMTP", "Diretórios"],
+            values=["SMTP", "Diretórios", "Processamento"],
             command=self._on_tab_change,
             variable=self.tab_var
         )
@@ -86,10 +96,12 @@ class SettingsWindow:
         # Frames para cada aba (inicialmente invisíveis)
         self.smtp_frame = ctk.CTkFrame(self.tabs_container)
         self.directories_frame = ctk.CTkFrame(self.tabs_container)
+        self.processing_frame = ctk.CTkFrame(self.tabs_container)
         
         # Construir o conteúdo das abas
         self._build_smtp_tab(self.smtp_frame)
         self._build_directories_tab(self.directories_frame)
+        self._build_processing_tab(self.processing_frame)
         
         # Container para botões de ação (sempre visível, fora das abas)
         # Como um frame separado no final da janela
@@ -132,17 +144,20 @@ class SettingsWindow:
             self._show_tab("smtp")
         elif value == "Diretórios":
             self._show_tab("directories")
+        elif value == "Processamento":
+            self._show_tab("processing")
     
     def _show_tab(self, tab_name):
         """
         Exibe a aba selecionada e oculta as outras.
         
         Args:
-            tab_name (str): Nome da aba a ser exibida ('smtp' ou 'directories')
+            tab_name (str): Nome da aba a ser exibida ('smtp', 'directories' ou 'processing')
         """
         # Ocultar todas as abas
         self.smtp_frame.pack_forget()
         self.directories_frame.pack_forget()
+        self.processing_frame.pack_forget()
         
         # Mostrar a aba selecionada
         if tab_name == "smtp":
@@ -151,6 +166,9 @@ class SettingsWindow:
         elif tab_name == "directories":
             self.directories_frame.pack(fill="both", expand=True)
             self.tab_var.set("Diretórios")
+        elif tab_name == "processing":
+            self.processing_frame.pack(fill="both", expand=True)
+            self.tab_var.set("Processamento")
     
     def _build_smtp_tab(self, parent):
         """
@@ -196,6 +214,22 @@ class SettingsWindow:
         )
         ssl_checkbox.grid(row=4, column=1, sticky="w", padx=10, pady=10)
         
+        # Envio do ZIP em fluxo, sem arquivo temporário
+        self.stream_email_var = ctk.BooleanVar(value=False)
+        stream_checkbox = ctk.CTkCheckBox(
+            smtp_frame,
+            text="Gerar o ZIP durante o envio (sem arquivo temporário)",
+            variable=self.stream_email_var
+        )
+        stream_checkbox.grid(row=5, column=1, sticky="w", padx=10, pady=10)
+        
+        # Limite de tamanho de anexo do provedor: compressão automática, divisão em partes
+        # e envio em fluxo (ZIPs estimados acima do limite são gerados em disco e divididos)
+        limit_label = ctk.CTkLabel(smtp_frame, text="Limite do anexo (MB):")
+        limit_label.grid(row=6, column=0, sticky="e", padx=10, pady=10)
+        self.attachment_limit_entry = ctk.CTkEntry(smtp_frame, width=100)
+        self.attachment_limit_entry.grid(row=6, column=1, sticky="w", padx=10, pady=10)
+        
         # Informações sobre configuração para Gmail
         info_label = ctk.CTkLabel(
             smtp_frame,
@@ -206,7 +240,7 @@ class SettingsWindow:
                  "nas configurações de segurança da conta Google.",
             justify="left"
         )
-        info_label.grid(row=5, column=0, columnspan=2, sticky="w", padx=10, pady=20)
+        info_label.grid(row=7, column=0, columnspan=2, sticky="w", padx=10, pady=20)
         
         # Configurar grid
         smtp_frame.grid_columnconfigure(0, weight=1)
@@ -237,21 +271,142 @@ class SettingsWindow:
         )
         browse_button.grid(row=0, column=2, padx=5, pady=10)
         
+        # Situações dos documentos a buscar
+        statuses_label = ctk.CTkLabel(dir_frame, text="Situações:")
+        statuses_label.grid(row=1, column=0, sticky="ne", padx=10, pady=10)
+        statuses_frame = ctk.CTkFrame(dir_frame, fg_color="transparent")
+        statuses_frame.grid(row=1, column=1, columnspan=2, sticky="w", padx=10, pady=10)
+        
+        self.status_vars = {}
+        for i, status in enumerate(STATUS_FOLDERS):
+            self.status_vars[status] = ctk.BooleanVar(value=False)
+            status_check = ctk.CTkCheckBox(statuses_frame, text=status, variable=self.status_vars[status])
+            status_check.grid(row=i // 2, column=i % 2, sticky="w", padx=5, pady=2)
+        
+        # Minificação dos XMLs antes da compactação
+        self.minify_var = ctk.BooleanVar(value=False)
+        minify_check = ctk.CTkCheckBox(
+            dir_frame,
+            text="Remover indentação dos XMLs no ZIP (conteúdo assinado preservado)",
+            variable=self.minify_var
+        )
+        minify_check.grid(row=2, column=1, columnspan=2, sticky="w", padx=10, pady=10)
+        
+        # Método de compressão do ZIP ('auto' mede uma amostra e escolhe)
+        compression_label = ctk.CTkLabel(dir_frame, text="Compressão:")
+        compression_label.grid(row=3, column=0, sticky="e", padx=10, pady=10)
+        self.compression_var = ctk.StringVar(value=DEFAULT_COMPRESSION)
+        compression_menu = ctk.CTkOptionMenu(
+            dir_frame,
+            values=[AUTO_COMPRESSION, *COMPRESSION_METHODS],
+            variable=self.compression_var,
+            width=150
+        )
+        compression_menu.grid(row=3, column=1, sticky="w", padx=10, pady=10)
+        
+        # Formato do arquivo: ZIP ou arquivo sólido (tar.xz/tar.gz), bem menor para XMLs parecidos
+        format_label = ctk.CTkLabel(dir_frame, text="Formato:")
+        format_label.grid(row=4, column=0, sticky="e", padx=10, pady=10)
+        self.archive_format_var = ctk.StringVar(value=DEFAULT_ARCHIVE_FORMAT)
+        format_menu = ctk.CTkOptionMenu(
+            dir_frame,
+            values=list(ARCHIVE_FORMATS),
+            variable=self.archive_format_var,
+            width=150
+        )
+        format_menu.grid(row=4, column=1, sticky="w", padx=10, pady=10)
+        
         # Informações
         info_label = ctk.CTkLabel(
             dir_frame,
             text="O diretório base é o caminho onde os arquivos XML estão armazenados.\n"
                  "O sistema irá procurar os documentos no seguinte formato:\n\n"
                  "{Diretório Base}\\{CPF/CNPJ}\\Enviado\\NFCe\\{AAAAMM}\\Autorizados\n"
-                 "{Diretório Base}\\{CPF/CNPJ}\\Enviado\\NF-e\\{AAAAMM}\\Autorizados",
+                 "{Diretório Base}\\{CPF/CNPJ}\\Enviado\\NF-e\\{AAAAMM}\\Autorizados\n"
+                 "{Diretório Base}\\{CPF/CNPJ}\\Enviado\\CTe\\{AAAAMM}\\Autorizados\n"
+                 "{Diretório Base}\\{CPF/CNPJ}\\Enviado\\MDFe\\{AAAAMM}\\Autorizados",
             justify="left"
         )
-        info_label.grid(row=1, column=0, columnspan=3, sticky="w", padx=10, pady=20)
+        info_label.grid(row=5, column=0, columnspan=3, sticky="w", padx=10, pady=20)
         
         # Configurar grid
         dir_frame.grid_columnconfigure(0, weight=1)
         dir_frame.grid_columnconfigure(1, weight=3)
     
+    def _build_processing_tab(self, parent):
+        """
+        Constrói a aba de configurações de processamento.
+        
+        Args:
+            parent (CTkFrame): Frame pai
+        """
+        # Frame de configurações de processamento
+        processing_frame = ctk.CTkFrame(parent)
+        processing_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        # Monitoramento do diretório base para manter o índice atualizado
+        self.watch_enabled_var = ctk.BooleanVar(value=False)
+        watch_check = ctk.CTkCheckBox(
+            processing_frame,
+            text="Monitorar o diretório base em segundo plano",
+            variable=self.watch_enabled_var
+        )
+        watch_check.grid(row=0, column=1, sticky="w", padx=10, pady=10)
+        
+        watch_interval_label = ctk.CTkLabel(processing_frame, text="Intervalo de verificação (s):")
+        watch_interval_label.grid(row=1, column=0, sticky="e", padx=10, pady=10)
+        self.watch_interval_entry = ctk.CTkEntry(processing_frame, width=100)
+        self.watch_interval_entry.grid(row=1, column=1, sticky="w", padx=10, pady=10)
+        
+        # Verificação dos XMLs (vazios, truncados, malformados) antes da compactação
+        self.validate_xml_var = ctk.BooleanVar(value=True)
+        validate_check = ctk.CTkCheckBox(
+            processing_frame,
+            text="Verificar os XMLs antes de compactar (vazios, truncados ou malformados)",
+            variable=self.validate_xml_var
+        )
+        validate_check.grid(row=2, column=1, sticky="w", padx=10, pady=10)
+        
+        # Threads de compressão (0 usa uma por núcleo)
+        workers_label = ctk.CTkLabel(processing_frame, text="Threads de compressão:")
+        workers_label.grid(row=3, column=0, sticky="e", padx=10, pady=10)
+        self.zip_workers_entry = ctk.CTkEntry(processing_frame, width=100)
+        self.zip_workers_entry.grid(row=3, column=1, sticky="w", padx=10, pady=10)
+        
+        # Tempo máximo de compressão no modo 'auto' (0 usa o limite do anexo como meta)
+        time_limit_label = ctk.CTkLabel(processing_frame, text="Tempo de compressão (s):")
+        time_limit_label.grid(row=4, column=0, sticky="e", padx=10, pady=10)
+        self.compression_time_limit_entry = ctk.CTkEntry(processing_frame, width=100)
+        self.compression_time_limit_entry.grid(row=4, column=1, sticky="w", padx=10, pady=10)
+        
+        # Resumo por documento anexado junto com o ZIP
+        summary_label = ctk.CTkLabel(processing_frame, text="Resumo por documento:")
+        summary_label.grid(row=5, column=0, sticky="e", padx=10, pady=10)
+        self.summary_format_var = ctk.StringVar(value=NO_SUMMARY)
+        summary_menu = ctk.CTkOptionMenu(
+            processing_frame,
+            values=[NO_SUMMARY, *SUMMARY_FORMATS],
+            variable=self.summary_format_var,
+            width=150
+        )
+        summary_menu.grid(row=5, column=1, sticky="w", padx=10, pady=10)
+        
+        # Informações
+        info_label = ctk.CTkLabel(
+            processing_frame,
+            text="Threads de compressão: 0 usa uma por núcleo do processador.\n"
+                 "Tempo de compressão: usado na compressão 'auto'; 0 escolhe o método\n"
+                 "mais rápido que cabe no limite do anexo.\n"
+                 "O intervalo de verificação só é usado quando o sistema não recebe\n"
+                 "notificações de alteração do diretório.",
+            justify="left"
+        )
+        info_label.grid(row=6, column=0, columnspan=2, sticky="w", padx=10, pady=20)
+        
+        # Configurar grid
+        processing_frame.grid_columnconfigure(0, weight=1)
+        processing_frame.grid_columnconfigure(1, weight=3)
+    
     def _browse_directory(self):
         """Abre diálogo para selecionar diretório"""
         from tkinter import filedialog
@@ -273,9 +428,26 @@ class SettingsWindow:
         self.smtp_username_entry.insert(0, smtp_config.get('username', ''))
         self.smtp_password_entry.insert(0, smtp_config.get('password', ''))
         self.smtp_ssl_var.set(smtp_config.get('use_ssl', False))
+        self.stream_email_var.set(self.config.get('stream_email', False))
+        self.attachment_limit_entry.insert(0, str(self.config.get('attachment_limit_mb', 25)))
         
         # Configurações de diretórios
         self.base_path_entry.insert(0, self.config.get('base_path', 'C:\\DigiSat\\SuiteG6\\Servidor\\DFe'))
+        for status in self.config.get('statuses') or DEFAULT_STATUSES:
+            if status in self.status_vars:
+                self.status_vars[status].set(True)
+        self.minify_var.set(self.config.get('minify_xml', False))
+        self.compression_var.set(self.config.get('compression', DEFAULT_COMPRESSION))
+        self.archive_format_var.set(self.config.get('archive_format', DEFAULT_ARCHIVE_FORMAT))
+        
+        # Configurações de processamento
+        self.watch_enabled_var.set(self.config.get('watch_enabled', False))
+        self.watch_interval_entry.insert(0, str(self.config.get('watch_interval', 60)))
+        self.validate_xml_var.set(self.config.get('validate_xml', True))
+        self.zip_workers_entry.insert(0, str(self.config.get('zip_workers', 0)))
+        self.compression_time_limit_entry.insert(0, str(self.config.get('compression_time_limit', 0)))
+        summary_format = self.config.get('summary_format', '')
+        self.summary_format_var.set(summary_format if summary_format in SUMMARY_FORMATS else NO_SUMMARY)
     
     def _save_settings(self):
         """Salva as configurações"""
@@ -288,13 +460,31 @@ class SettingsWindow:
                 'password': self.smtp_password_entry.get().strip(),
                 'use_ssl': self.smtp_ssl_var.get()
             }
+            self.config['stream_email'] = self.stream_email_var.get()
+            self.config['attachment_limit_mb'] = float(self.attachment_limit_entry.get().strip() or 25)
             
             # Configurações de diretórios
             self.config['base_path'] = self.base_path_entry.get().strip()
+            self.config['statuses'] = [s for s, var in self.status_vars.items() if var.get()] or list(DEFAULT_STATUSES)
+            self.config['minify_xml'] = self.minify_var.get()
+            self.config['compression'] = self.compression_var.get()
+            self.config['archive_format'] = self.archive_format_var.get()
+            
+            # Configurações de processamento
+            self.config['watch_enabled'] = self.watch_enabled_var.get()
+            self.config['watch_interval'] = max(1, int(self.watch_interval_entry.get().strip() or 60))
+            self.config['validate_xml'] = self.validate_xml_var.get()
+            self.config['zip_workers'] = max(0, int(self.zip_workers_entry.get().strip() or 0))
+            self.config['compression_time_limit'] = max(0.0, float(self.compression_time_limit_entry.get().strip() or 0))
+            summary_format = self.summary_format_var.get()
+            self.config['summary_format'] = summary_format if summary_format in SUMMARY_FORMATS else ''
             
             # Salvar configurações
             self.config_manager.save_config(self.config)
             
+            if self.on_save:
+                self.on_save()
+            
             messagebox.showinfo("Sucesso", "Configurações salvas com sucesso!")
         
         except Exception as e:
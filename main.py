@@ -5,6 +5,7 @@ import os
 import sys
 import logging
 import tempfile
+import multiprocessing
 import zipfile
 from datetime import datetime
 
@@ -121,6 +122,7 @@ class XMLSenderApp:
             'logs',
             'config',
             'temp',
+            'cache',
             'assets'
         ]
         
@@ -139,7 +141,7 @@ class XMLSenderApp:
             'smtplib',
             'email',
             'zipfile',
-            'xml.etree.ElementTree'
+            'xml.parsers.expat'
         ]
         
         missing_modules = []
@@ -193,6 +195,8 @@ class XMLSenderApp:
         try:
             # Salvar configurações atuais
             if hasattr(self, 'main_window'):
+                self.main_window.stop_watcher()
+                
                 # Salvar dados do formulário
                 self.config['document_id'] = self.main_window.document_id_var.get()
                 self.config['company_name'] = self.main_window.company_var.get()
@@ -256,4 +260,6 @@ def main():
         logging.error(f"Erro fatal: {e}")
 
 if __name__ == "__main__":
+    # Necessário para o pool de processos da extração de metadados no executável do Windows
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import sys
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from operator import add, eq, mul
+
+# Chave de acesso: cUF(2) AAMM(4) CNPJ(14) mod(2) série(3) nNF(9) tpEmis(1) cNF(8) cDV(1)
+ACCESS_KEY_PATTERN = re.compile(r'(?<!\d)(\d{44})(?!\d)')
+
+# Id de evento: tpEvento(6) chave(44) nSeqEvento(2)
+EVENT_ID_PATTERN = re.compile(r'(?<!\d)(\d{6})(\d{44})(\d{2})(?!\d)')
+EVENT_TYPE_PATTERN = re.compile(r'(?<!\d)(\d{6})(?!\d)')
+
+# Faixa do número do documento (nNF tem 9 dígitos)
+NUMBER_SPAN = 10 ** 9
+
+# Pesos do módulo 11 para os 43 primeiros dígitos (2 a 9, da direita para a esquerda)
+_WEIGHTS = tuple(2 + (i % 8) for i in range(43))[::-1]
+# Os dígitos são somados pelo código ASCII; este deslocamento desconta o '0' (48) de cada um
+_ASCII_OFFSET = 48 * sum(_WEIGHTS)
+
+# Decodificação em lote (AccessKeyBatch): uma busca por linha na listagem unida por '\n'.
+# O grupo opcional faz cada linha render exatamente um resultado: a primeira sequência de
+# 44 dígitos (chave), de 52 dígitos (Id de evento, mesmo critério de parse_event_filename)
+# ou '' se a linha não tiver nenhuma.
+_KEY_LINE = re.compile(r'^(?:[^\n]*?(?<![0-9])([0-9]{44}|[0-9]{52})(?![0-9]))?[^\n]*$', re.M)
+# Campos da chave: (início, fim, typecode do array)
+_KEY_FIELDS = (
+    ('uf', 0, 2, 'B'), ('aamm', 2, 6, 'H'), ('cnpj', 6, 20, 'q'), ('model', 20, 22, 'B'),
+    ('series', 22, 25, 'H'), ('number', 25, 34, 'L'), ('emission_type', 34, 35, 'B'),
+    ('code', 35, 43, 'L'), ('check_digit', 43, 44, 'B'),
+)
+# Chave usada no lugar dos arquivos sem chave, para manter as colunas alinhadas
+_EMPTY_KEY = '0' * 44
+# '0'..'9' (ASCII) -> 0..9
+_DIGIT_VALUES = bytes(range(48)) + bytes(range(10)) + bytes(range(58, 256))
+# Dígito verificador esperado para cada soma ponderada possível (no máximo 9 * soma dos pesos)
+_CHECK_DIGITS = bytes(0 if s % 11 < 2 else 11 - s % 11 for s in range(9 * sum(_WEIGHTS) + 1))
+
+def parse_event_filename(filename):
+    """
+    Identifica um XML de evento (cancelamento, carta de correção, ...) pelo nome.
+    
+    Aceita o nome com o Id do evento ('110111' + chave + sequência, 52 dígitos)
+    ou nomes com 'evento' contendo a chave e o tipo do evento separados.
+    
+    Args:
+        filename (str): Nome do arquivo
+    
+    Returns:
+        tuple: (tipo do evento ou None, chave de acesso ou None), ou None se
+            o arquivo não for um evento
+    """
+    match = EVENT_ID_PATTERN.search(filename)
+    if match:
+        return match.group(1), match.group(2)
+    
+    if 'evento' not in filename.lower():
+        return None
+    
+    key = ACCESS_KEY_PATTERN.search(filename)
+    event_type = EVENT_TYPE_PATTERN.search(filename)
+    return (event_type.group(1) if event_type else None), (key.group(1) if key else None)
+
+def document_key(filename):
+    """
+    Chave de acesso do documento contida no nome do arquivo.
+    
+    Args:
+        filename (str): Nome do arquivo
+    
+    Returns:
+        str: Chave de 44 dígitos ou None se o nome não tiver chave ou for de um evento
+    """
+    if parse_event_filename(filename) is not None:
+        return None
+    match = ACCESS_KEY_PATTERN.search(filename)
+    return match.group(1) if match else None
+
+def parse_access_keys(text):
+    """
+    Extrai as chaves de acesso de um texto colado ou lido de arquivo.
+    
+    Aceita qualquer separador (linhas, vírgulas, ponto e vírgula) e chaves
+    com o prefixo 'NFe'/'CTe' do atributo Id.
+    
+    Args:
+        text (str): Texto com as chaves
+    
+    Returns:
+        list: Chaves distintas, na ordem em que aparecem
+    """
+    return list(dict.fromkeys(ACCESS_KEY_PATTERN.findall(text)))
+
+class AccessKeyBatch:
+    """
+    Campos das chaves de acesso de uma listagem de arquivos, um array por campo.
+    
+    Cada campo fica em um array compacto alinhado com a lista de nomes
+    recebida: a posição i de cada array corresponde ao arquivo i. Arquivos
+    cujo nome não contém uma chave de 44 dígitos ficam com present[i] = 0;
+    XMLs de evento também, com event[i] = 1, para não serem confundidos com
+    o documento a que se referem.
+    """
+    
+    def __init__(self, filenames):
+        """
+        Decodifica em lote as chaves de acesso contidas nos nomes dos arquivos.
+        
+        A listagem é unida em um único texto: uma busca por expressão regular
+        devolve a chave (ou o Id de evento) de cada linha e os nomes com
+        'evento' são localizados por str.find no texto em minúsculas. Os
+        campos e o dígito verificador são calculados para todas as chaves
+        de uma vez sobre os bytes concatenados (ver _columns e _check_digits).
+        
+        Args:
+            filenames (list): Nomes dos arquivos (ex: '3525...1234-procNFe.xml')
+        """
+        self.filenames = list(filenames)
+        count = len(self.filenames)
+        text = '\n'.join(self.filenames)
+        found = _KEY_LINE.findall(text) if count else []
+        lowered = text.lower()
+        
+        # Nomes com quebra de linha (não ocorrem em nomes de arquivo) desalinhariam as linhas,
+        # e minúsculas de outro comprimento desalinhariam as posições
+        if len(found) != count or len(lowered) != len(text):
+            events = [parse_event_filename(name) is not None for name in self.filenames]
+            found = [document_key(name) or '' for name in self.filenames]
+        else:
+            events = bytearray(map((52).__eq__, map(len, found)))
+            line_ends = list(map(add, accumulate(map(len, self.filenames)), range(1, count + 1)))
+            position = lowered.find('evento')
+            while position >= 0:
+                line = bisect_right(line_ends, position)
+                events[line] = 1
+                position = lowered.find('evento', line_ends[line])
+        
+        self.event = array('B', events)
+        self.keys = [key if key and not event else None for key, event in zip(found, self.event)]
+        self.present = array('B', map(bool, self.keys))
+        
+        padded = ''.join(key or _EMPTY_KEY for key in self.keys).encode('ascii')
+        digits = padded.translate(_DIGIT_VALUES)
+        for name, column in zip((field[0] for field in _KEY_FIELDS), self._columns(digits, count)):
+            setattr(self, name, column)
+        
+        expected = self._check_digits(digits, count)
+        self.valid = array('B', map(mul, map(eq, expected, self.check_digit), self.present))
+    
+    @staticmethod
+    def _columns(digits, count):
+        """
+        Converte os campos de várias chaves em arrays de uma vez.
+        
+        Cada chave ocupa uma faixa de um único inteiro, da largura do item
+        do array do campo, na ordem de bytes nativa: para cada posição do
+        campo, os dígitos daquela posição em todas as chaves (um fatiamento
+        de bytes) são somados ao inteiro já multiplicados pela potência de 10
+        da posição. Os bytes do inteiro final são o próprio array.
+        
+        Args:
+            digits (bytes): Chaves concatenadas, um byte (0 a 9) por dígito
+            count (int): Quantidade de chaves
+        
+        Returns:
+            list: Um array por campo, na ordem de _KEY_FIELDS
+        """
+        columns = []
+        for _, start, end, typecode in _KEY_FIELDS:
+            width = array(typecode).itemsize
+            lanes = bytearray(width * count)
+            low = 0 if sys.byteorder == 'little' else width - 1
+            total = 0
+            for position in range(start, end):
+                lanes[low::width] = digits[position::44]
+                total += 10 ** (end - 1 - position) * int.from_bytes(lanes, sys.byteorder)
+            columns.append(array(typecode, total.to_bytes(width * count, sys.byteorder)))
+        return columns
+    
+    @staticmethod
+    def _check_digits(digits, count):
+        """
+        Calcula o dígito verificador de várias chaves de uma vez.
+        
+        Mesma técnica de _columns, com faixas de 16 bits: a maior soma
+        ponderada (9 * 344) cabe em 16 bits, então as faixas não se misturam
+        e o laço tem 43 passos, independente da quantidade de chaves.
+        
+        Args:
+            digits (bytes): Chaves concatenadas, um byte (0 a 9) por dígito
+            count (int): Quantidade de chaves
+        
+        Returns:
+            bytes: Dígito verificador esperado de cada chave
+        """
+        lanes = bytearray(2 * count)
+        low = 0 if sys.byteorder == 'little' else 1
+        total = 0
+        for position, weight in enumerate(_WEIGHTS):
+            lanes[low::2] = digits[position::44]
+            total += weight * int.from_bytes(lanes, sys.byteorder)
+        
+        sums = array('H', total.to_bytes(2 * count, sys.byteorder))
+        return bytes(map(_CHECK_DIGITS.__getitem__, sums))
+    
+    def __len__(self):
+        return len(self.filenames)
+    
+    def select(self, positions):
+        """
+        Lote só com alguns arquivos, sem decodificar os nomes de novo.
+        
+        Args:
+            positions (list): Posições dos arquivos mantidos, em ordem
+        
+        Returns:
+            AccessKeyBatch: Campos dos arquivos selecionados
+        """
+        selected = object.__new__(AccessKeyBatch)
+        selected.filenames = list(map(self.filenames.__getitem__, positions))
+        selected.keys = list(map(self.keys.__getitem__, positions))
+        for name in ('present', 'event', 'valid') + tuple(field[0] for field in _KEY_FIELDS):
+            column = getattr(self, name)
+            setattr(selected, name, array(column.typecode, map(column.__getitem__, positions)))
+        return selected
+    
+    @staticmethod
+    def compute_check_digit(key):
+        """
+        Calcula o dígito verificador (módulo 11) de uma chave de acesso.
+        
+        Args:
+            key (str): Chave com pelo menos 43 dígitos
+        
+        Returns:
+            int: Dígito verificador esperado
+        """
+        total = sum(map(mul, key[:43].encode('ascii'), _WEIGHTS)) - _ASCII_OFFSET
+        remainder = total % 11
+        return 0 if remainder < 2 else 11 - remainder
+    
+    def without_key(self):
+        """
+        Returns:
+            list: Posições dos arquivos cujo nome não contém chave de acesso (exceto eventos)
+        """
+        return [i for i, (p, e) in enumerate(zip(self.present, self.event)) if not p and not e]
+    
+    def invalid(self):
+        """
+        Returns:
+            list: Posições dos arquivos com chave de dígito verificador inválido
+        """
+        return [i for i in range(len(self)) if self.present[i] and not self.valid[i]]
+    
+    def outside_period(self, period):
+        """
+        Arquivos cuja chave indica outro período de emissão.
+        
+        Args:
+            period (str): Período no formato AAAAMM
+        
+        Returns:
+            list: Posições dos arquivos fora do período
+        """
+        aamm = int(period[2:6])
+        return [i for i in range(len(self)) if self.present[i] and self.aamm[i] != aamm]
+    
+    def other_issuer(self, document_id):
+        """
+        Arquivos cuja chave indica outro emitente.
+        
+        Args:
+            document_id (str): CPF/CNPJ do emitente (apenas números)
+        
+        Returns:
+            list: Posições dos arquivos de outro emitente
+        """
+        cnpj = int(document_id)
+        return [i for i in range(len(self)) if self.present[i] and self.cnpj[i] != cnpj]
+    
+    def sequence_gaps(self):
+        """
+        Encontra números faltantes na sequência de cada modelo e série.
+        
+        Os números de cada (modelo, série) são ordenados em um array compacto
+        e a sequência é percorrida uma única vez. Só são considerados os
+        intervalos entre o menor e o maior número encontrados; números
+        inutilizados também aparecem como faltantes, pois o XML de
+        inutilização não traz chave de acesso.
+        
+        Returns:
+            dict: {(modelo, série): [(primeiro faltante, último faltante), ...]}
+                apenas para as séries com lacunas
+        """
+        # Modelo, série e número combinados em um único inteiro: uma só ordenação
+        # deixa cada série contígua e em ordem crescente
+        combined = array('q', sorted({
+            (model * 1000 + series) * NUMBER_SPAN + number
+            for present, model, series, number in zip(self.present, self.model, self.series, self.number)
+            if present
+        }))
+        
+        gaps = {}
+        for prev, cur in zip(combined, combined[1:]):
+            if cur - prev > 1 and prev // NUMBER_SPAN == cur // NUMBER_SPAN:
+                model, series = divmod(cur // NUMBER_SPAN, 1000)
+                gaps.setdefault((f"{model:02d}", series), []).append((prev % NUMBER_SPAN + 1, cur % NUMBER_SPAN - 1))
+        return gaps
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import zipfile
+import logging
+
+# Métodos de compressão aceitos pelo ZipService: nome -> (método do zipfile, nível)
+COMPRESSION_METHODS = {
+    'stored': (zipfile.ZIP_STORED, None),
+    'deflated': (zipfile.ZIP_DEFLATED, None),
+    **{f'deflated-{level}': (zipfile.ZIP_DEFLATED, level) for level in range(1, 10)},
+    'bzip2': (zipfile.ZIP_BZIP2, None),
+    'lzma': (zipfile.ZIP_LZMA, None),
+}
+
+DEFAULT_COMPRESSION = 'deflated'
+
+# Escolhe o método medindo uma amostra dos arquivos (ver CompressionTuner)
+AUTO_COMPRESSION = 'auto'
+
+# Métodos medidos no modo automático, do mais rápido ao que mais comprime
+AUTO_CANDIDATES = ('stored', 'deflated-1', 'deflated-6', 'deflated-9', 'bzip2', 'lzma')
+
+# Bytes por membro fora dos dados: cabeçalho local (30), diretório central (46) e o nome duas vezes
+MEMBER_OVERHEAD = 76
+
+class CompressionTuner:
+    """Escolhe o método de compressão do ZIP a partir de uma amostra dos XMLs"""
+    
+    # Arquivos medidos, espalhados pela lista
+    SAMPLE_FILES = 40
+    
+    def __init__(self, workers=1):
+        """
+        Inicializa o seletor.
+        
+        Args:
+            workers (int): Threads de compressão do ZipService; o tempo estimado
+                é dividido por elas (zlib, bz2 e lzma liberam o GIL)
+        """
+        self.workers = max(1, workers)
+        self.logger = logging.getLogger("XMLSender.CompressionTuner")
+    
+    def choose(self, files, size_limit=None, time_limit=None):
+        """
+        Mede os métodos de AUTO_CANDIDATES em uma amostra e escolhe um.
+        
+        Com time_limit, escolhe o que gera o menor ZIP dentro do tempo (ou
+        o mais rápido, se nenhum couber); com size_limit, o mais rápido cujo
+        ZIP cabe no limite (ou o menor, se nenhum couber). Sem limites,
+        usa DEFAULT_COMPRESSION. Os tamanhos e tempos são extrapolados da
+        amostra para o total de bytes dos arquivos.
+        
+        Args:
+            files (list): Arquivos (dict ou XMLFileEntry com 'path' e 'filename')
+            size_limit (int, optional): Tamanho máximo do ZIP em bytes
+            time_limit (float, optional): Tempo máximo de compressão em segundos
+        
+        Returns:
+            str: Nome do método (chave de COMPRESSION_METHODS)
+        """
+        if not files or not (size_limit or time_limit):
+            return DEFAULT_COMPRESSION
+        
+        sample = self._read_sample(files)
+        estimates = self._estimate(files, sample, AUTO_CANDIDATES)
+        if not estimates:
+            return DEFAULT_COMPRESSION
+        
+        for name, size, seconds in estimates:
+            self.logger.info(f"Compressão {name}: ~{size / 1024 / 1024:.1f} MB em ~{seconds:.2f} s (estimado)")
+        
+        if time_limit:
+            fitting = [e for e in estimates if e[2] <= time_limit]
+            chosen = min(fitting, key=lambda e: e[1]) if fitting else min(estimates, key=lambda e: e[2])
+            target = f"menor ZIP em até {time_limit} s"
+        else:
+            fitting = [e for e in estimates if e[1] <= size_limit]
+            chosen = min(fitting, key=lambda e: e[2]) if fitting else min(estimates, key=lambda e: e[1])
+            target = f"mais rápido com até {size_limit / 1024 / 1024:.1f} MB"
+        
+        name, size, seconds = chosen
+        note = "" if fitting else " (nenhum método atinge a meta)"
+        self.logger.info(
+            f"Compressão escolhida: {name} (~{size / 1024 / 1024:.1f} MB, ~{seconds:.2f} s; "
+            f"meta: {target}; amostra de {len(sample)} arquivos){note}"
+        )
+        return name
+    
+    def estimate_size(self, files, compression):
+        """
+        Estima o tamanho do ZIP com um método, extrapolado de uma amostra.
+        
+        Args:
+            files (list): Arquivos (dict ou XMLFileEntry com 'path' e 'filename')
+            compression (str): Nome do método (chave de COMPRESSION_METHODS)
+        
+        Returns:
+            int: Tamanho estimado em bytes ou None se não há o que medir
+        """
+        if not files:
+            return None
+        estimates = self._estimate(files, self._read_sample(files), (compression,))
+        return estimates[0][1] if estimates else None
+    
+    def _estimate(self, files, sample, names):
+        """
+        Mede os métodos na amostra e extrapola para o total de bytes dos arquivos.
+        
+        Returns:
+            list: [(método, bytes estimados do ZIP, segundos estimados)] dos
+                métodos disponíveis; vazia se a amostra não tem bytes
+        """
+        sample_bytes = sum(len(data) for data in sample)
+        if not sample_bytes:
+            return []
+        
+        total_bytes = sum(self._file_size(f) for f in files)
+        overhead = sum(MEMBER_OVERHEAD + 2 * len(f['filename']) for f in files) + 22
+        scale = total_bytes / sample_bytes
+        
+        estimates = []
+        for name in names:
+            measured = self._measure(name, sample)
+            if measured is None:
+                continue
+            compressed, seconds = measured
+            estimates.append((name, int(compressed * scale) + overhead, seconds * scale / self.workers))
+        return estimates
+    
+    def _read_sample(self, files):
+        """
+        Lê até SAMPLE_FILES arquivos distribuídos pela lista.
+        
+        Returns:
+            list: Conteúdo (bytes) dos arquivos lidos
+        """
+        step = max(1, len(files) // self.SAMPLE_FILES)
+        sample = []
+        for file_info in files[::step][:self.SAMPLE_FILES]:
+            try:
+                with open(file_info['path'], 'rb') as f:
+                    sample.append(f.read())
+            except OSError:
+                continue
+        return sample
+    
+    @staticmethod
+    def _file_size(file_info):
+        """Tamanho da listagem ou, sem ele, do sistema de arquivos (0 se não existe)"""
+        size = file_info.get('size')
+        if size is not None:
+            return size
+        try:
+            return os.path.getsize(file_info['path'])
+        except OSError:
+            return 0
+    
+    def _measure(self, name, sample):
+        """
+        Comprime cada arquivo da amostra separadamente, como membros do ZIP.
+        
+        Returns:
+            tuple: (bytes comprimidos, segundos) ou None se o método não está
+                disponível nesta instalação (bz2/lzma)
+        """
+        compress_type, level = COMPRESSION_METHODS[name]
+        try:
+            zipfile._check_compression(compress_type)
+        except RuntimeError:
+            self.logger.debug(f"Compressão {name} indisponível")
+            return None
+        
+        compressed = 0
+        start = time.perf_counter()
+        for data in sample:
+            compressor = zipfile._get_compressor(compress_type, level)
+            if compressor:
+                compressed += len(compressor.compress(data)) + len(compressor.flush())
+            else:
+                compressed += len(data)
+        return compressed, time.perf_counter() - start
@@ -87,5 +87,20 @@ class ConfigManager:
             "company_name": "",
             "email": "",
             "last_period": "",
-            "base_path": "C:\\DigiSat\\SuiteG6\\Servidor\\DFe"
+            "base_path": "C:\\DigiSat\\SuiteG6\\Servidor\\DFe",
+            "statuses": ["Autorizados"],
+            "cache_dir": "cache",
+            "watch_enabled": False,
+            "watch_interval": 60,
+            "extract_metadata": True,
+            "export_mode": "include_events",
+            "summary_format": "",
+            "minify_xml": False,
+            "validate_xml": True,
+            "stream_email": False,
+            "zip_workers": 0,
+            "compression": "deflated",
+            "attachment_limit_mb": 25,
+            "compression_time_limit": 0,
+            "archive_format": "zip"
         }
\ No newline at end of file
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tabela de layout dos documentos fiscais na árvore do DigiSat.
+
+Os arquivos ficam em {base}\\{CPF/CNPJ}\\Enviado\\{tipo}\\{AAAAMM}\\{situação}.
+Cada tipo de documento descreve as grafias aceitas para o diretório do tipo
+(já normalizadas: minúsculas, sem '-' e '_'), a pasta usada no ZIP e o modelo
+do documento na chave de acesso. Incluir um novo tipo aqui não adiciona
+leituras de disco: o diretório 'Enviado' continua sendo listado uma única vez
+e apenas os tipos presentes nele são consultados.
+"""
+
+DOCUMENT_LAYOUTS = {
+    'nfce': {
+        'label': 'NFC-e',
+        'folders': ('nfce',),
+        'zip_folder': 'NFCe',
+        'model': '65'
+    },
+    'nfe': {
+        'label': 'NF-e',
+        'folders': ('nfe',),
+        'zip_folder': 'NFe',
+        'model': '55'
+    },
+    'cte': {
+        'label': 'CT-e',
+        'folders': ('cte',),
+        'zip_folder': 'CTe',
+        'model': '57'
+    },
+    'mdfe': {
+        'label': 'MDF-e',
+        'folders': ('mdfe',),
+        'zip_folder': 'MDFe',
+        'model': '58'
+    }
+}
+
+# Diretórios de situação dentro de {tipo}\{AAAAMM}
+STATUS_FOLDERS = ('Autorizados', 'Cancelados', 'Denegados', 'Inutilizados')
+
+# Situação buscada por padrão (comportamento original do sistema)
+DEFAULT_STATUSES = ('Autorizados',)
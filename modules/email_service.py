@@ -6,11 +6,56 @@ import smtplib
 import logging
 import socket
 import ssl
+import base64
+import shutil
+import uuid
+from collections import namedtuple
 from email import encoders
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
+from modules.invoice_store import InvoiceStore
+
+# Anexo produzido durante o envio: write_to(fluxo) grava o conteúdo no fluxo recebido
+StreamedAttachment = namedtuple('StreamedAttachment', ['filename', 'write_to'])
+
+class _Base64Stream:
+    """Fluxo de escrita que codifica em base64 (linhas de 76 caracteres) e repassa em blocos"""
+    
+    # Múltiplo de 57 bytes: cada 57 bytes de entrada formam uma linha completa de base64
+    CHUNK_SIZE = 57 * 1024
+    
+    def __init__(self, send):
+        """
+        Args:
+            send (function): Recebe os blocos já codificados (bytes, com CRLF)
+        """
+        self.send = send
+        self.buffer = bytearray()
+        self.bytes_in = 0
+    
+    def write(self, data):
+        self.buffer += data
+        self.bytes_in += len(data)
+        if len(self.buffer) >= self.CHUNK_SIZE:
+            size = len(self.buffer) - len(self.buffer) % self.CHUNK_SIZE
+            self._send(self.buffer[:size])
+            del self.buffer[:size]
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        """Codifica o restante (última linha, com preenchimento)"""
+        if self.buffer:
+            self._send(self.buffer)
+            self.buffer = bytearray()
+    
+    def _send(self, data):
+        self.send(base64.encodebytes(bytes(data)).replace(b'\n', b'\r\n'))
+
 class EmailService:
     """Serviço para envio de emails"""
     
@@ -32,7 +77,9 @@ class EmailService:
             to_email (str): Email do destinatário
             subject (str): Assunto do email
             body (str): Corpo do email (texto simples)
-            attachments (list, optional): Lista de caminhos de arquivos para anexar
+            attachments (list, optional): Lista de caminhos de arquivos para anexar ou
+                StreamedAttachment, gerados durante o envio; com StreamedAttachment,
+                os anexos vão em fluxo, sem montar a mensagem inteira na memória
             html_body (str, optional): Corpo do email em formato HTML
             company_info (dict, optional): Informações da empresa para o email formatado
             files_info (dict, optional): Informações dos arquivos para o email formatado
@@ -68,6 +115,11 @@ class EmailService:
             # Adiciona a parte alternativa à mensagem principal
             msg.attach(alt_part)
             
+            if any(isinstance(a, StreamedAttachment) for a in attachments or ()):
+                self._send_streamed(msg, to_email, attachments or [])
+                self.logger.info(f"Email enviado com sucesso para {to_email} (anexos em fluxo)")
+                return True
+            
             # Adicionar anexos
             if attachments:
                 for attachment_path in attachments:
@@ -120,6 +172,60 @@ class EmailService:
                 files_html += f"<p>NF-e: {found_nfe} arquivo(s)</p>"
             else:
                 files_html += "<p>NF-e: Nenhum arquivo localizado</p>"
+            
+            # CT-e e MDF-e só aparecem quando a empresa possui esses documentos
+            if files_info.get('cte_count', 0) > 0:
+                files_html += f"<p>CT-e: {files_info['cte_count']} arquivo(s)</p>"
+            if files_info.get('mdfe_count', 0) > 0:
+                files_html += f"<p>MDF-e: {files_info['mdfe_count']} arquivo(s)</p>"
+            
+            # Totais do período, quando os metadados dos XMLs foram extraídos
+            summary = files_info.get('summary')
+            if summary:
+                files_html += "<p><strong>Totais do período:</strong></p><table>"
+                files_html += f"<tr><th>Documentos</th><td>{summary['count']}</td></tr>"
+                files_html += f"<tr><th>Valor total (vNF)</th><td>{InvoiceStore.format_currency(summary['total'])}</td></tr>"
+                files_html += f"<tr><th>ICMS</th><td>{InvoiceStore.format_currency(summary['icms'])}</td></tr>"
+                if summary.get('cancelled'):
+                    files_html += (
+                        f"<tr><th>Cancelados (fora dos totais)</th><td>{summary['cancelled']} documento(s), "
+                        f"{InvoiceStore.format_currency(summary['cancelled_total'])}</td></tr>"
+                    )
+                files_html += "</table>"
+                
+                if summary['cfop']:
+                    files_html += "<p><strong>Documentos por CFOP:</strong> " + ", ".join(
+                        f"{cfop}: {count}" for cfop, count in summary['cfop'].items()
+                    ) + "</p>"
+                if summary['payments']:
+                    files_html += "<p><strong>Documentos por meio de pagamento:</strong> " + ", ".join(
+                        f"{InvoiceStore.payment_label(payment)}: {count}"
+                        for payment, count in summary['payments'].items()
+                    ) + "</p>"
+            
+            # Numeração faltante por modelo e série
+            gaps = files_info.get('gaps')
+            if gaps:
+                files_html += "<p><strong>Numeração faltante:</strong></p><table>"
+                files_html += "<tr><th>Documento</th><th>Série</th><th>Números</th></tr>"
+                for gap in gaps:
+                    numbers = ", ".join(
+                        str(first) if first == last else f"{first} a {last}" for first, last in gap['ranges']
+                    )
+                    files_html += (
+                        f"<tr><td>{gap['label']}</td><td>{gap['series']}</td>"
+                        f"<td>{numbers} ({gap['missing']} número(s))</td></tr>"
+                    )
+                files_html += "</table>"
+            
+            # Arquivos deixados de fora na verificação prévia (vazios, truncados, malformados)
+            rejected = files_info.get('rejected')
+            if rejected:
+                files_html += "<p><strong>Arquivos não enviados (com problema na origem):</strong></p><table>"
+                files_html += "<tr><th>Arquivo</th><th>Motivo</th></tr>"
+                for item in rejected:
+                    files_html += f"<tr><td>{item['filename']}</td><td>{item['reason']}</td></tr>"
+                files_html += "</table>"
         
         # Criar HTML
         html = f"""
@@ -371,6 +477,93 @@ class EmailService:
             self.logger.error(error_msg)
             raise Exception(error_msg)
     
+    def _send_streamed(self, msg, to_email, attachments):
+        """
+        Envia a mensagem gerando e codificando os anexos durante o comando DATA.
+        
+        A mensagem é montada pelo pacote email com um marcador no lugar do
+        conteúdo de cada anexo; o texto entre os marcadores é enviado como
+        está e cada anexo é produzido (o ZIP, por exemplo), codificado em
+        base64 em blocos de tamanho fixo e gravado no socket à medida que é
+        gerado. O uso de memória não depende do tamanho dos anexos. Se a
+        geração de um anexo falhar, a conexão é encerrada sem o '.' final,
+        de modo que o servidor descarta a mensagem incompleta.
+        
+        Args:
+            msg (MIMEMultipart): Mensagem com cabeçalhos e corpo, sem os anexos
+            to_email (str): Email do destinatário
+            attachments (list): Caminhos de arquivos ou StreamedAttachment
+        
+        Raises:
+            Exception: Se o servidor recusar a mensagem ou a geração de um anexo falhar
+        """
+        markers = []
+        for attachment in attachments:
+            if not isinstance(attachment, StreamedAttachment):
+                attachment = self._file_attachment(attachment)
+            marker = f"ANEXO-{uuid.uuid4().hex}"
+            part = MIMEBase('application', 'octet-stream')
+            part.set_payload(marker)
+            part['Content-Transfer-Encoding'] = 'base64'
+            part.add_header('Content-Disposition', 'attachment', filename=attachment.filename)
+            msg.attach(part)
+            markers.append((marker, attachment))
+        text = msg.as_string()
+        
+        server = self._connect_to_smtp()
+        try:
+            server.ehlo_or_helo_if_needed()
+            code, response = server.mail(msg['From'])
+            if code != 250:
+                raise smtplib.SMTPSenderRefused(code, response, msg['From'])
+            code, response = server.rcpt(to_email)
+            if code not in (250, 251):
+                raise smtplib.SMTPRecipientsRefused({to_email: (code, response)})
+            code, response = server.docmd('data')
+            if code != 354:
+                raise smtplib.SMTPDataError(code, response)
+            
+            for marker, attachment in markers:
+                head, _, text = text.partition(marker + "\n")
+                server.send(smtplib.quotedata(head).encode('ascii'))
+                encoder = _Base64Stream(server.send)
+                attachment.write_to(encoder)
+                encoder.close()
+                self.logger.debug(f"Anexo enviado em fluxo: {attachment.filename} ({encoder.bytes_in} bytes)")
+            server.send(smtplib.quotedata(text).encode('ascii') + b".\r\n")
+            
+            code, response = server.getreply()
+            if code != 250:
+                raise smtplib.SMTPDataError(code, response)
+        except Exception:
+            # Sem o '.' final o servidor descarta a mensagem parcial
+            server.close()
+            raise
+        server.quit()
+    
+    def _file_attachment(self, file_path):
+        """
+        Cria um anexo em fluxo que copia um arquivo em blocos.
+        
+        Args:
+            file_path (str): Caminho do arquivo
+        
+        Returns:
+            StreamedAttachment: Anexo com o nome do arquivo
+        
+        Raises:
+            FileNotFoundError: Se o arquivo não existir
+        """
+        if not os.path.exists(file_path):
+            error_msg = f"Arquivo não encontrado: {file_path}"
+            self.logger.error(error_msg)
+            raise FileNotFoundError(error_msg)
+        
+        def write_to(stream):
+            with open(file_path, 'rb') as f:
+                shutil.copyfileobj(f, stream, _Base64Stream.CHUNK_SIZE)
+        return StreamedAttachment(os.path.basename(file_path), write_to)
+    
     def _attach_file(self, msg, file_path):
         """
         Anexa um arquivo à mensagem de email.
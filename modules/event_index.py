@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+
+from modules.access_key import ACCESS_KEY_PATTERN, parse_event_filename
+from modules.document_layout import DEFAULT_STATUSES
+
+# Tipo de evento de cancelamento
+CANCELLATION_EVENT = '110111'
+
+# Modos de exportação: {modo: descrição exibida na interface}
+EXPORT_MODES = {
+    'include_events': "Todos os documentos e eventos",
+    'exclude_cancelled': "Excluir documentos cancelados",
+    'cancelled_only': "Somente documentos cancelados"
+}
+DEFAULT_EXPORT_MODE = 'include_events'
+
+class EventIndex:
+    """Índice dos XMLs de evento por chave de acesso"""
+    
+    def __init__(self):
+        """Inicializa o índice de eventos"""
+        self.logger = logging.getLogger("XMLSender.EventIndex")
+        self.events = {}
+        self.cancelled = set()
+        self.unknown = []
+    
+    def add(self, doc_type, file_info):
+        """
+        Registra um arquivo no índice, se for um XML de evento.
+        
+        Args:
+            doc_type (str): Tipo de documento da pasta onde o arquivo está
+            file_info (dict ou XMLFileEntry): Arquivo com 'filename'
+        
+        Returns:
+            bool: True se o arquivo é um evento
+        """
+        parsed = parse_event_filename(file_info['filename'])
+        if parsed is None:
+            return False
+        
+        event_type, key = parsed
+        if key is None:
+            # Evento sem chave no nome: não pode ser associado a um documento
+            self.unknown.append((doc_type, file_info))
+            return True
+        
+        self.events.setdefault(key, []).append((doc_type, event_type, file_info))
+        if event_type == CANCELLATION_EVENT:
+            self.cancelled.add(key)
+        return True
+    
+    def is_cancelled(self, key):
+        """
+        Indica se há evento de cancelamento para a chave (consulta O(1)).
+        
+        Args:
+            key (str): Chave de acesso
+        
+        Returns:
+            bool: True se o documento foi cancelado
+        """
+        return key in self.cancelled
+    
+    def is_document_cancelled(self, file_info):
+        """
+        Indica se um documento da listagem está cancelado: está na pasta
+        'Cancelados' ou há evento de cancelamento para a sua chave.
+        
+        Args:
+            file_info (dict ou XMLFileEntry): Documento com 'filename' e 'status'
+        
+        Returns:
+            bool: True se o documento foi cancelado
+        """
+        match = ACCESS_KEY_PATTERN.search(file_info['filename'])
+        return self._document_cancelled(file_info, match.group(1) if match else None)
+    
+    def _document_cancelled(self, file_info, key):
+        """Situação 'Cancelados' ou chave com evento de cancelamento"""
+        status = file_info.get('status') or DEFAULT_STATUSES[0]
+        return status == 'Cancelados' or (key is not None and self.is_cancelled(key))
+    
+    def filter(self, files, mode=DEFAULT_EXPORT_MODE):
+        """
+        Separa documentos e eventos e aplica o modo de exportação.
+        
+        O índice é montado em uma única passagem pela listagem (use um
+        EventIndex novo para cada listagem); depois, cada documento é
+        consultado no conjunto de chaves canceladas em tempo constante.
+        Documentos da pasta 'Cancelados' também contam como cancelados.
+        
+        Args:
+            files (dict): {tipo: [arquivos]} como retornado por XMLFinder.find_xml_files
+            mode (str): 'include_events' (tudo), 'exclude_cancelled' (sem cancelados
+                e seus eventos) ou 'cancelled_only' (cancelados e seus eventos)
+        
+        Returns:
+            dict: {tipo: [arquivos]} filtrado
+        """
+        if mode not in EXPORT_MODES:
+            raise ValueError(f"Modo de exportação desconhecido: {mode}")
+        
+        documents = []
+        for doc_type, type_files in files.items():
+            for file_info in type_files:
+                if not self.add(doc_type, file_info):
+                    documents.append((doc_type, file_info))
+        
+        result = {doc_type: [] for doc_type in files}
+        if mode == 'include_events':
+            for doc_type, type_files in files.items():
+                result[doc_type].extend(type_files)
+            return result
+        
+        cancelled_keys = set()
+        for doc_type, file_info in documents:
+            match = ACCESS_KEY_PATTERN.search(file_info['filename'])
+            key = match.group(1) if match else None
+            cancelled = self._document_cancelled(file_info, key)
+            if cancelled and key:
+                cancelled_keys.add(key)
+            if cancelled == (mode == 'cancelled_only'):
+                result[doc_type].append(file_info)
+        
+        # Eventos acompanham os documentos exportados
+        for key, key_events in self.events.items():
+            if (key in cancelled_keys or self.is_cancelled(key)) == (mode == 'cancelled_only'):
+                for doc_type, _, file_info in key_events:
+                    result[doc_type].append(file_info)
+        if mode == 'exclude_cancelled':
+            for doc_type, file_info in self.unknown:
+                result[doc_type].append(file_info)
+        
+        self.logger.debug(f"{len(cancelled_keys)} documento(s) cancelado(s) na listagem")
+        return result
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import math
+from array import array
+from collections import Counter
+
+# Meios de pagamento (tPag)
+PAYMENT_TYPES = {
+    1: "Dinheiro",
+    2: "Cheque",
+    3: "Cartão de Crédito",
+    4: "Cartão de Débito",
+    5: "Crédito Loja",
+    10: "Vale Alimentação",
+    11: "Vale Refeição",
+    12: "Vale Presente",
+    13: "Vale Combustível",
+    15: "Boleto Bancário",
+    16: "Depósito Bancário",
+    17: "PIX",
+    18: "Transferência",
+    19: "Programa de Fidelidade",
+    90: "Sem Pagamento",
+    99: "Outros"
+}
+
+class InvoiceStore:
+    """Metadados dos documentos de um CPF/CNPJ e período, guardados em colunas"""
+    
+    def __init__(self, document_id, period):
+        """
+        Inicializa o armazenamento em colunas.
+        
+        Valores ficam em arrays de double; CFOPs e meios de pagamento ficam em
+        arrays planos (um valor por documento e código), de modo que os totais
+        são calculados por funções em C (math.fsum, Counter) sem laços em Python.
+        
+        Args:
+            document_id (str): CPF/CNPJ (apenas números)
+            period (str): Período no formato AAAAMM
+        """
+        self.document_id = document_id
+        self.period = period
+        self.total = array('d')
+        self.icms = array('d')
+        self.model = array('B')
+        self.cfops = array('H')
+        self.payments = array('B')
+        # Documentos cancelados ficam fora dos totais, apenas com o valor (vNF)
+        self.cancelled_total = array('d')
+    
+    def add(self, metadata, cancelled=False):
+        """
+        Acrescenta um documento.
+        
+        Args:
+            metadata (dict): Metadados do XMLMetadataExtractor (None é ignorado)
+            cancelled (bool): Documento cancelado (evento 110111 ou pasta 'Cancelados');
+                é contado à parte e não entra nos totais do período
+        """
+        if not metadata:
+            return
+        if cancelled:
+            self.cancelled_total.append(metadata.get('total') or 0.0)
+            return
+        self.total.append(metadata.get('total') or 0.0)
+        self.icms.append(metadata.get('icms') or 0.0)
+        self.model.append(int(metadata.get('model') or 0))
+        self.cfops.extend(metadata.get('cfops') or ())
+        self.payments.extend(metadata.get('payments') or ())
+    
+    def extend(self, metadata_list):
+        """
+        Acrescenta vários documentos.
+        
+        Args:
+            metadata_list (iterable): Metadados do XMLMetadataExtractor
+        """
+        for metadata in metadata_list:
+            self.add(metadata)
+    
+    def __len__(self):
+        return len(self.total)
+    
+    def summary(self):
+        """
+        Calcula os totais do período.
+        
+        Returns:
+            dict: count (documentos), total (soma de vNF), icms (soma de vICMS),
+                by_model {modelo: documentos}, cfop {CFOP: documentos} e
+                payments {tPag: documentos}, ordenados do mais frequente, dos
+                documentos não cancelados; cancelled (documentos cancelados) e
+                cancelled_total (soma de vNF dos cancelados)
+        """
+        return {
+            'count': len(self.total),
+            'total': math.fsum(self.total),
+            'icms': math.fsum(self.icms),
+            'cancelled': len(self.cancelled_total),
+            'cancelled_total': math.fsum(self.cancelled_total),
+            'by_model': {f"{model:02d}": count for model, count in Counter(self.model).most_common()},
+            'cfop': dict(Counter(self.cfops).most_common()),
+            'payments': dict(Counter(self.payments).most_common())
+        }
+    
+    @staticmethod
+    def format_currency(value):
+        """
+        Args:
+            value (float): Valor em reais
+        
+        Returns:
+            str: Valor no formato brasileiro (ex: 'R$ 1.234,56')
+        """
+        return "R$ " + f"{value:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+    
+    @staticmethod
+    def payment_label(payment_type):
+        """
+        Args:
+            payment_type (int): Código tPag
+        
+        Returns:
+            str: Descrição do meio de pagamento
+        """
+        return PAYMENT_TYPES.get(payment_type, f"Código {payment_type:02d}")
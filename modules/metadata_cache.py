@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import sqlite3
+import logging
+import threading
+
+# Versão do esquema do banco. O cache só guarda resultados recalculáveis,
+# então uma versão diferente faz o banco ser recriado do zero (também quando
+# o extrator passa a devolver campos novos).
+SCHEMA_VERSION = 4
+
+# Limite de parâmetros por consulta (o SQLite aceita no mínimo 999)
+QUERY_BATCH = 500
+
+class MetadataCache:
+    """Cache persistente (SQLite) dos metadados extraídos de cada XML"""
+    
+    def __init__(self, db_path):
+        """
+        Inicializa o cache de metadados.
+        
+        Cada resultado é guardado com o tamanho e o mtime do arquivo; um
+        arquivo só volta a ser lido se um dos dois mudar.
+        
+        Args:
+            db_path (str): Caminho do arquivo SQLite do cache
+        """
+        self.db_path = db_path
+        self.logger = logging.getLogger("XMLSender.MetadataCache")
+        self._lock = threading.Lock()
+        
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._create_schema()
+    
+    def _create_schema(self):
+        """Cria a tabela do cache, recriando o banco se o esquema mudou"""
+        with self._lock:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                self.logger.info(f"Recriando cache de metadados (esquema {version} -> {SCHEMA_VERSION})")
+                self.conn.execute("DROP TABLE IF EXISTS metadata")
+            
+            self.conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS metadata (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    data TEXT
+                );
+                PRAGMA user_version = {SCHEMA_VERSION};
+            """)
+            self.conn.commit()
+    
+    def get_many(self, keys):
+        """
+        Obtém os metadados já extraídos de vários arquivos.
+        
+        Args:
+            keys (list): Tuplas (path, size, mtime)
+        
+        Returns:
+            dict: {path: metadados ou None} apenas para os arquivos cujo tamanho
+                e mtime conferem com o registrado (None = arquivo ilegível)
+        """
+        expected = {path: (size, mtime) for path, size, mtime in keys}
+        paths = list(expected)
+        found = {}
+        
+        with self._lock:
+            for i in range(0, len(paths), QUERY_BATCH):
+                batch = paths[i:i + QUERY_BATCH]
+                rows = self.conn.execute(
+                    f"SELECT path, size, mtime, data FROM metadata WHERE path IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for path, size, mtime, data in rows:
+                    if expected[path] == (size, mtime):
+                        found[path] = json.loads(data) if data else None
+        return found
+    
+    def store_many(self, results):
+        """
+        Registra os metadados extraídos de vários arquivos.
+        
+        Args:
+            results (list): Tuplas (path, size, mtime, metadados ou None)
+        """
+        with self._lock:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO metadata (path, size, mtime, data) VALUES (?, ?, ?, ?)",
+                    [
+                        (path, size, mtime, json.dumps(metadata) if metadata is not None else None)
+                        for path, size, mtime, metadata in results
+                    ]
+                )
+    
+    def close(self):
+        """Fecha a conexão com o banco do cache"""
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from modules.xml_metadata import XMLMetadataExtractor
+from modules.metadata_cache import MetadataCache
+
+def _extract_chunk(paths):
+    """
+    Extrai os metadados de um lote de arquivos (executado nos processos do pool).
+    
+    Args:
+        paths (list): Caminhos dos arquivos XML
+    
+    Returns:
+        list: Metadados (ou None) na mesma ordem dos caminhos
+    """
+    extractor = XMLMetadataExtractor()
+    return [extractor.extract(path) for path in paths]
+
+class MetadataPipeline:
+    """Etapa de extração de metadados entre o XMLFinder e o ZipService"""
+    
+    def __init__(self, cache_path=None, max_workers=None, chunk_size=256):
+        """
+        Inicializa a etapa de extração de metadados.
+        
+        Args:
+            cache_path (str, optional): Caminho do banco SQLite do cache de metadados.
+                Se não informado, todos os arquivos são lidos a cada execução.
+            max_workers (int, optional): Máximo de processos (padrão: número de CPUs)
+            chunk_size (int, optional): Quantidade de arquivos por lote enviado a um processo
+        """
+        self.logger = logging.getLogger("XMLSender.MetadataPipeline")
+        self.cache = MetadataCache(cache_path) if cache_path else None
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.stats = {'cached': 0, 'parsed': 0}
+    
+    def process(self, files):
+        """
+        Extrai os metadados dos arquivos, entregando cada resultado assim que fica pronto.
+        
+        Os arquivos são consultados no cache em lotes; apenas os que não estão
+        no cache (ou mudaram de tamanho/mtime) são lidos, em lotes distribuídos
+        entre os processos do pool. Lotes pequenos são lidos no próprio processo
+        para evitar o custo de iniciar o pool.
+        
+        Args:
+            files (iterable): Arquivos com 'path' (dict ou XMLFileEntry)
+        
+        Yields:
+            tuple: (arquivo, metadados ou None), fora da ordem de entrada
+        """
+        self.stats = {'cached': 0, 'parsed': 0}
+        executor = None
+        pending = {}
+        
+        try:
+            for chunk in self._chunks(files):
+                keys = [self._file_key(file_info) for file_info in chunk]
+                cached = self.cache.get_many(keys) if self.cache else {}
+                
+                misses = []
+                for file_info, key in zip(chunk, keys):
+                    if key[0] in cached:
+                        self.stats['cached'] += 1
+                        yield file_info, cached[key[0]]
+                    else:
+                        misses.append((file_info, key))
+                
+                if not misses:
+                    continue
+                
+                if executor is None and len(misses) < self.chunk_size:
+                    # Poucos arquivos novos: ler aqui mesmo
+                    results = _extract_chunk([key[0] for _, key in misses])
+                    yield from self._finish_chunk(misses, results)
+                    continue
+                
+                if executor is None:
+                    executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                    self.logger.info(f"Extraindo metadados com {self.max_workers} processo(s)")
+                
+                future = executor.submit(_extract_chunk, [key[0] for _, key in misses])
+                pending[future] = misses
+                
+                # Limitar os lotes em andamento para não acumular a lista inteira na memória
+                while len(pending) >= self.max_workers * 2:
+                    yield from self._collect(pending, FIRST_COMPLETED)
+            
+            while pending:
+                yield from self._collect(pending, FIRST_COMPLETED)
+        
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        
+        self.logger.info(
+            f"Metadados: {self.stats['parsed']} arquivo(s) lido(s), {self.stats['cached']} do cache"
+        )
+    
+    def _collect(self, pending, return_when):
+        """
+        Aguarda lotes do pool e entrega os resultados dos que terminaram.
+        
+        Args:
+            pending (dict): {future: [(arquivo, chave)]} lotes em andamento
+            return_when: Condição de espera de concurrent.futures.wait
+        
+        Yields:
+            tuple: (arquivo, metadados ou None)
+        """
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            misses = pending.pop(future)
+            yield from self._finish_chunk(misses, future.result())
+    
+    def _finish_chunk(self, misses, results):
+        """
+        Grava no cache um lote recém-extraído e entrega os resultados.
+        
+        Args:
+            misses (list): [(arquivo, (path, size, mtime))]
+            results (list): Metadados na mesma ordem de misses
+        
+        Yields:
+            tuple: (arquivo, metadados ou None)
+        """
+        self.stats['parsed'] += len(misses)
+        if self.cache:
+            self.cache.store_many([key + (metadata,) for (_, key), metadata in zip(misses, results)])
+        for (file_info, _), metadata in zip(misses, results):
+            yield file_info, metadata
+    
+    def _chunks(self, files):
+        """
+        Agrupa os arquivos em lotes de chunk_size.
+        
+        Yields:
+            list: Lote de arquivos
+        """
+        chunk = []
+        for file_info in files:
+            chunk.append(file_info)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    
+    @staticmethod
+    def _file_key(file_info):
+        """
+        Monta a chave do cache de um arquivo.
+        
+        Tamanho e mtime vêm sempre de um stat do próprio arquivo, nunca da
+        listagem: um arquivo regravado no lugar precisa gerar uma chave nova.
+        
+        Args:
+            file_info (dict ou XMLFileEntry): Arquivo com 'path'
+        
+        Returns:
+            tuple: (path, size, mtime); (path, -1, 0.0) se o arquivo não puder ser consultado
+        """
+        path = file_info['path']
+        try:
+            st = os.stat(path)
+        except OSError:
+            return path, -1, 0.0
+        return path, st.st_size, st.st_mtime
+    
+    def close(self):
+        """Fecha o cache de metadados"""
+        if self.cache:
+            self.cache.close()
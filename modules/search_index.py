@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sqlite3
+import logging
+import threading
+import unicodedata
+
+from modules.xml_finder import XMLFileEntry
+
+# Versão do esquema do banco. O índice de busca é recalculável a partir dos
+# XMLs, então uma versão diferente faz o banco ser recriado do zero.
+SCHEMA_VERSION = 2
+
+# Documentos gravados por transação durante a atualização
+WRITE_BATCH = 500
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+def normalize_text(text):
+    """
+    Normaliza um texto para busca: minúsculas e sem acentos.
+    
+    Args:
+        text (str): Texto original
+    
+    Returns:
+        str: Texto normalizado
+    """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+def tokenize(text):
+    """
+    Divide uma descrição em termos de busca (palavras com 2 ou mais caracteres).
+    
+    Args:
+        text (str): Descrição do produto
+    
+    Returns:
+        set: Termos normalizados
+    """
+    return {token for token in TOKEN_PATTERN.findall(normalize_text(text)) if len(token) >= 2}
+
+class SearchIndex:
+    """Índice invertido (SQLite) dos campos dos XMLs para busca entre períodos"""
+    
+    def __init__(self, db_path):
+        """
+        Inicializa o índice de busca.
+        
+        Cada campo pesquisável (destinatário, código e descrição do produto,
+        NCM, CFOP) vira termos na tabela 'terms', cuja chave primária
+        (campo, termo, arquivo) é o próprio índice invertido: uma busca é uma
+        consulta por faixa na árvore B, independente de quantos anos existem.
+        
+        Args:
+            db_path (str): Caminho do arquivo SQLite do índice de busca
+        """
+        self.db_path = db_path
+        self.logger = logging.getLogger("XMLSender.SearchIndex")
+        self._lock = threading.Lock()
+        
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._create_schema()
+    
+    def _create_schema(self):
+        """Cria as tabelas do índice, recriando o banco se o esquema mudou"""
+        with self._lock:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                self.logger.info(f"Recriando índice de busca (esquema {version} -> {SCHEMA_VERSION})")
+                self.conn.executescript("""
+                    DROP TABLE IF EXISTS terms;
+                    DROP TABLE IF EXISTS documents;
+                """)
+            
+            self.conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS documents (
+                    path TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    document_id TEXT NOT NULL,
+                    document_type TEXT NOT NULL,
+                    period TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    access_key TEXT,
+                    issued_at TEXT,
+                    total REAL,
+                    recipient_id TEXT,
+                    recipient_name TEXT
+                );
+                CREATE TABLE IF NOT EXISTS terms (
+                    field TEXT NOT NULL,
+                    term TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    PRIMARY KEY (field, term, path)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_terms_path ON terms (path);
+                CREATE INDEX IF NOT EXISTS idx_documents_period ON documents (document_id, period);
+                CREATE INDEX IF NOT EXISTS idx_documents_total ON documents (total);
+                PRAGMA user_version = {SCHEMA_VERSION};
+            """)
+            self.conn.commit()
+    
+    def update(self, xml_finder, pipeline, document_id=None, callback=None):
+        """
+        Atualiza o índice de busca a partir do índice de arquivos do XMLFinder.
+        
+        Apenas arquivos novos ou alterados (tamanho/mtime) são extraídos, pelo
+        MetadataPipeline (que também usa o seu próprio cache); arquivos que
+        sumiram do disco são removidos.
+        
+        Args:
+            xml_finder (XMLFinder): Localizador com índice de arquivos
+            pipeline (MetadataPipeline): Etapa de extração de metadados
+            document_id (str, optional): Restringe a um CPF/CNPJ
+            callback (function, optional): Chamada como callback(indexados, total)
+                a cada lote gravado
+        
+        Returns:
+            tuple: (documentos indexados, documentos removidos)
+        """
+        if not xml_finder.index:
+            raise Exception("A busca requer o índice de arquivos XML")
+        
+        xml_finder.refresh_index(document_id)
+        files = xml_finder.index.get_all_files(document_id)
+        
+        with self._lock:
+            if document_id:
+                rows = self.conn.execute(
+                    "SELECT path, size, mtime FROM documents WHERE document_id = ?", (document_id,)
+                ).fetchall()
+            else:
+                rows = self.conn.execute("SELECT path, size, mtime FROM documents").fetchall()
+        indexed = {row['path']: (row['size'], row['mtime']) for row in rows}
+        
+        current = {f[0] for f in files}
+        removed = [path for path in indexed if path not in current]
+        stale = [
+            {'path': f[0], 'filename': f[1], 'size': f[6], 'mtime': f[7], 'row': f}
+            for f in files if indexed.get(f[0]) != (f[6], f[7])
+        ]
+        
+        if removed:
+            with self._lock:
+                with self.conn:
+                    self._delete_paths(removed)
+        
+        added = 0
+        batch = []
+        for file_info, metadata in pipeline.process(stale):
+            batch.append((file_info['row'], metadata))
+            if len(batch) >= WRITE_BATCH:
+                added += self._store_batch(batch)
+                batch = []
+                if callback:
+                    callback(added, len(stale))
+        if batch:
+            added += self._store_batch(batch)
+            if callback:
+                callback(added, len(stale))
+        
+        self.logger.info(f"Índice de busca atualizado: {added} documento(s) indexado(s), {len(removed)} removido(s)")
+        return added, len(removed)
+    
+    def _delete_paths(self, paths):
+        """Remove documentos e seus termos (chamar com o lock e a transação abertos)"""
+        self.conn.executemany("DELETE FROM terms WHERE path = ?", [(p,) for p in paths])
+        self.conn.executemany("DELETE FROM documents WHERE path = ?", [(p,) for p in paths])
+    
+    def _store_batch(self, batch):
+        """
+        Grava um lote de documentos e seus termos.
+        
+        Args:
+            batch (list): Tuplas (linha do índice de arquivos, metadados ou None)
+        
+        Returns:
+            int: Quantidade de documentos gravados
+        """
+        documents = []
+        terms = []
+        for (path, filename, document_id, document_type, period, status, size, mtime), metadata in batch:
+            metadata = metadata or {}
+            documents.append((
+                path, filename, document_id, document_type, period, status, size, mtime,
+                metadata.get('access_key'), metadata.get('issued_at'), metadata.get('total'),
+                metadata.get('recipient_id'), metadata.get('recipient_name')
+            ))
+            terms.extend((field, term, path) for field, term in self._document_terms(metadata))
+        
+        with self._lock:
+            with self.conn:
+                self._delete_paths([d[0] for d in documents])
+                self.conn.executemany(
+                    "INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", documents
+                )
+                self.conn.executemany("INSERT OR IGNORE INTO terms VALUES (?, ?, ?)", terms)
+        return len(documents)
+    
+    @staticmethod
+    def _document_terms(metadata):
+        """
+        Gera os termos pesquisáveis de um documento.
+        
+        Yields:
+            tuple: (campo, termo) com campo 'dest', 'cprod', 'xprod', 'ncm' ou 'cfop'
+        """
+        if metadata.get('recipient_id'):
+            yield 'dest', metadata['recipient_id']
+        for cfop in metadata.get('cfops') or ():
+            yield 'cfop', str(cfop)
+        
+        words = set()
+        for code, description, ncm in metadata.get('products') or ():
+            if code:
+                yield 'cprod', normalize_text(code)
+            if ncm:
+                yield 'ncm', ncm
+            words |= tokenize(description)
+        for word in words:
+            yield 'xprod', word
+    
+    def search(self, recipient=None, product=None, ncm=None, cfop=None, min_total=None, max_total=None,
+               period_from=None, period_to=None, document_id=None, limit=None):
+        """
+        Busca documentos pelos campos indexados. Os filtros informados são combinados (E).
+        
+        Args:
+            recipient (str, optional): CPF/CNPJ do destinatário (apenas números)
+            product (str, optional): Código do produto ou palavras da descrição
+            ncm (str, optional): Código NCM
+            cfop (str, optional): CFOP de algum item
+            min_total (float, optional): Valor total mínimo (vNF)
+            max_total (float, optional): Valor total máximo (vNF)
+            period_from (str, optional): Período inicial AAAAMM
+            period_to (str, optional): Período final AAAAMM
+            document_id (str, optional): CPF/CNPJ do emitente
+            limit (int, optional): Máximo de resultados
+        
+        Returns:
+            list: Dicionários com os campos da tabela 'documents', por período e nome do arquivo
+        """
+        term_query = "path IN (SELECT path FROM terms WHERE field = ? AND term = ?)"
+        conditions = []
+        params = []
+        
+        if recipient:
+            conditions.append(term_query)
+            params += ['dest', ''.join(filter(str.isalnum, recipient))]
+        if ncm:
+            conditions.append(term_query)
+            params += ['ncm', ''.join(filter(str.isdigit, ncm))]
+        if cfop:
+            conditions.append(term_query)
+            params += ['cfop', ''.join(filter(str.isdigit, cfop))]
+        if product:
+            # Código exato do produto ou todas as palavras na descrição
+            words = sorted(tokenize(product))
+            product_conditions = [term_query]
+            product_params = ['cprod', normalize_text(product.strip())]
+            if words:
+                product_conditions.append("(" + " AND ".join([term_query] * len(words)) + ")")
+                for word in words:
+                    product_params += ['xprod', word]
+            conditions.append("(" + " OR ".join(product_conditions) + ")")
+            params += product_params
+        if min_total is not None:
+            conditions.append("total >= ?")
+            params.append(min_total)
+        if max_total is not None:
+            conditions.append("total <= ?")
+            params.append(max_total)
+        if period_from:
+            conditions.append("period >= ?")
+            params.append(period_from)
+        if period_to:
+            conditions.append("period <= ?")
+            params.append(period_to)
+        if document_id:
+            conditions.append("document_id = ?")
+            params.append(document_id)
+        
+        query = "SELECT * FROM documents"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY period, filename"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(query, params)]
+    
+    @staticmethod
+    def group_by_type(results):
+        """
+        Converte resultados da busca no formato aceito pelo ZipService.
+        
+        Args:
+            results (list): Resultados de search
+        
+        Returns:
+            dict: {tipo: [XMLFileEntry]}
+        """
+        files = {}
+        for row in results:
+            entry = XMLFileEntry(row['filename'], row['path'], row['size'], row['mtime'], 0, row['status'])
+            files.setdefault(row['document_type'], []).append(entry)
+        return files
+    
+    def count_documents(self):
+        """
+        Returns:
+            int: Quantidade de documentos no índice de busca
+        """
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+    
+    def close(self):
+        """Fecha a conexão com o banco do índice de busca"""
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import csv
+import sqlite3
+import logging
+
+# Formatos suportados: {formato: extensão do arquivo}
+SUMMARY_FORMATS = {
+    'csv': '.csv',
+    'sqlite': '.db'
+}
+
+# Colunas do resumo: (nome da coluna, campo dos metadados)
+SUMMARY_COLUMNS = (
+    ('chave', 'access_key'),
+    ('modelo', 'model'),
+    ('serie', 'series'),
+    ('numero', 'number'),
+    ('emissao', 'issued_at'),
+    ('valor_total', 'total'),
+    ('valor_icms', 'icms'),
+    ('cfops', 'cfops'),
+    ('pagamentos', 'payments'),
+    ('destinatario_documento', 'recipient_id'),
+    ('destinatario_nome', 'recipient_name')
+)
+
+class SummaryWriter:
+    """Grava o resumo dos documentos (uma linha por documento) à medida que são extraídos"""
+    
+    # Linhas acumuladas antes de cada gravação no SQLite
+    BATCH_SIZE = 1000
+    
+    def __init__(self, output_path, summary_format='csv'):
+        """
+        Inicializa o gravador de resumo.
+        
+        As linhas são gravadas no arquivo assim que chegam (no SQLite, em lotes
+        de BATCH_SIZE), então o uso de memória não depende da quantidade de
+        documentos.
+        
+        Args:
+            output_path (str): Caminho do arquivo de resumo
+            summary_format (str): 'csv' (separado por ';', abre direto no Excel) ou 'sqlite'
+        """
+        if summary_format not in SUMMARY_FORMATS:
+            raise ValueError(f"Formato de resumo desconhecido: {summary_format}")
+        
+        self.output_path = output_path
+        self.summary_format = summary_format
+        self.logger = logging.getLogger("XMLSender.SummaryWriter")
+        self.rows = 0
+        self._file = None
+        self._csv = None
+        self._conn = None
+        self._batch = []
+    
+    def __enter__(self):
+        self.open()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def open(self):
+        """Cria o arquivo de resumo e grava o cabeçalho"""
+        output_dir = os.path.dirname(self.output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        
+        columns = [column for column, _ in SUMMARY_COLUMNS] + ['arquivo']
+        if self.summary_format == 'csv':
+            # utf-8-sig: o Excel reconhece a acentuação sem importar o arquivo
+            self._file = open(self.output_path, 'w', newline='', encoding='utf-8-sig')
+            self._csv = csv.writer(self._file, delimiter=';')
+            self._csv.writerow(columns)
+        else:
+            if os.path.exists(self.output_path):
+                os.remove(self.output_path)
+            self._conn = sqlite3.connect(self.output_path)
+            self._conn.execute(
+                f"CREATE TABLE documentos ({', '.join(columns)})"
+            )
+    
+    def write(self, file_info, metadata):
+        """
+        Grava a linha de um documento.
+        
+        Args:
+            file_info (dict ou XMLFileEntry): Arquivo com 'filename'
+            metadata (dict): Metadados do XMLMetadataExtractor (None é ignorado)
+        """
+        if not metadata:
+            return
+        
+        row = [self._format_value(metadata.get(field)) for _, field in SUMMARY_COLUMNS]
+        row.append(file_info['filename'])
+        self.rows += 1
+        
+        if self._csv:
+            # No CSV os valores usam vírgula decimal, como o Excel em português espera
+            self._csv.writerow([
+                f"{value:.2f}".replace('.', ',') if isinstance(value, float) else value for value in row
+            ])
+        else:
+            self._batch.append(row)
+            if len(self._batch) >= self.BATCH_SIZE:
+                self._flush()
+    
+    def _flush(self):
+        """Grava no SQLite as linhas acumuladas"""
+        if self._batch:
+            placeholders = ', '.join('?' * (len(SUMMARY_COLUMNS) + 1))
+            with self._conn:
+                self._conn.executemany(f"INSERT INTO documentos VALUES ({placeholders})", self._batch)
+            self._batch = []
+    
+    def close(self):
+        """Finaliza o arquivo de resumo"""
+        if self._file:
+            self._file.close()
+            self._file = None
+            self._csv = None
+        if self._conn:
+            self._flush()
+            self._conn.close()
+            self._conn = None
+        self.logger.info(f"Resumo gravado em {self.output_path} ({self.rows} documentos)")
+    
+    @staticmethod
+    def _format_value(value):
+        """Converte listas (CFOPs, pagamentos) em texto separado por espaço"""
+        if isinstance(value, list):
+            # Vírgula seria lida como separador decimal pelo Excel em português
+            return " ".join(str(v) for v in value)
+        return value
@@ -2,30 +2,72 @@
 # -*- coding: utf-8 -*-
 
 import os
+import stat
+import time
 import logging
 from datetime import datetime
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.xml_index import XMLIndex
+from modules.xml_preflight import XMLPreflight
+from modules.access_key import AccessKeyBatch, document_key
+from modules.event_index import EventIndex, DEFAULT_EXPORT_MODE
+from modules.document_layout import DOCUMENT_LAYOUTS, STATUS_FOLDERS, DEFAULT_STATUSES
+
+# Entradas do índice modificadas até esse tempo antes da última alteração do
+# diretório podiam estar em gravação na varredura e são conferidas com stat
+RECENT_ENTRY_SECONDS = 2.0
+
+class XMLFileEntry(namedtuple('XMLFileEntry', ['filename', 'path', 'size', 'mtime', 'inode', 'status'],
+                              defaults=('Autorizados',))):
+    """
+    Arquivo XML encontrado, com os metadados obtidos na própria leitura do diretório.
+    
+    Aceita também acesso por chave (entry['path'], entry.get('size')) para manter
+    compatibilidade com o formato antigo {'filename': ..., 'path': ...}.
+    """
+    __slots__ = ()
+    
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, key)
+        return super().__getitem__(key)
+    
+    def get(self, key, default=None):
+        return getattr(self, key, default)
 
 class XMLFinder:
     """Classe responsável por localizar arquivos XML"""
     
-    def __init__(self, base_path=None):
+    def __init__(self, base_path=None, index_path=None, max_workers=8):
         """
         Inicializa o localizador de arquivos XML.
         
         Args:
             base_path (str, optional): Caminho base para procurar os arquivos
+            index_path (str, optional): Caminho do banco SQLite do índice de arquivos.
+                Se não informado, os diretórios são sempre lidos do disco.
+            max_workers (int, optional): Máximo de threads para leituras de diretório em paralelo
         """
         self.base_path = base_path or "C:\\DigiSat\\SuiteG6\\Servidor\\DFe"
         self.logger = logging.getLogger("XMLSender.XMLFinder")
+        self.max_workers = max_workers
+        self.index = XMLIndex(index_path) if index_path else None
+        # Cache dos nomes reais dos diretórios por CPF/CNPJ: {doc_id: (mtime de Enviado, layout)}
+        self._layout_cache = {}
 
-    def find_xml_files(self, document_id, period, document_type="all"):
+    def find_xml_files(self, document_id, period, document_type="all", statuses=DEFAULT_STATUSES):
         """
         Encontra arquivos XML para o CPF/CNPJ e período especificados.
         
         Args:
             document_id (str): CPF/CNPJ (apenas números)
             period (str): Período no formato AAAAMM (ex: 202501)
-            document_type (str, optional): Tipo de documento ('nfce', 'nfe', 'all')
+            document_type (str ou list, optional): Tipo de documento ('nfce', 'nfe',
+                'cte', 'mdfe'), lista de tipos ou 'all'
+            statuses (tuple, optional): Situações a buscar ('Autorizados', 'Cancelados',
+                'Denegados', 'Inutilizados')
             
         Returns:
             dict: Dicionário com os arquivos encontrados para cada tipo de documento
@@ -44,157 +86,896 @@ class XMLFinder:
         
         self.logger.info(f"Buscando arquivos XML para Doc ID={document_id_clean}, período={period}")
         
-        result = {
-            'nfce': [],
-            'nfe': []
-        }
+        try:
+            return self.find_xml_files_for_periods(document_id_clean, [period], document_type, statuses)[period]
+            
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar arquivos XML: {e}")
+            raise Exception(f"Erro ao buscar arquivos XML: {e}")
+
+    def find_xml_files_for_periods(self, document_id, periods, document_type="all", statuses=DEFAULT_STATUSES):
+        """
+        Encontra arquivos XML de vários períodos de uma só vez.
+        
+        O diretório 'Enviado' é resolvido uma única vez, a tabela de layout é
+        compilada no conjunto mínimo de diretórios a ler e esses diretórios são
+        lidos em paralelo, com um número limitado de threads. Em compartilhamentos
+        de rede com alta latência o tempo total fica próximo ao de uma única leitura.
+        
+        Args:
+            document_id (str): CPF/CNPJ (apenas números)
+            periods (list): Lista de períodos no formato AAAAMM
+            document_type (str ou list, optional): Tipo(s) de documento ou 'all'
+            statuses (tuple, optional): Situações a buscar
+            
+        Returns:
+            dict: {período: {tipo: [...]}} na ordem dos períodos informados
+        """
+        document_id_clean = ''.join(filter(str.isdigit, document_id))
+        self.logger.info(f"Buscando arquivos XML para Doc ID={document_id_clean}, períodos={periods}")
         
         try:
-            # Buscar NFCe
-            if document_type in ["all", "nfce"]:
-                nfce_path = os.path.join(self.base_path, document_id_clean, "Enviado", "NFCe", period, "Autorizados")
-                self.logger.info(f"Verificando caminho NFCe: {nfce_path}")
-                
-                if os.path.exists(nfce_path):
-                    nfce_files = self._get_xml_files_from_dir(nfce_path)
-                    result['nfce'] = [{'filename': f, 'path': os.path.join(nfce_path, f)} for f in nfce_files]
-                    self.logger.info(f"Encontrados {len(nfce_files)} arquivos NFCe")
-                else:
-                    self.logger.warning(f"Diretório não encontrado: {nfce_path}")
-                    
-            # Buscar NFe - VERSÃO MELHORADA COM MÚLTIPLAS TENTATIVAS
-            if document_type in ["all", "nfe"]:
-                nfe_found = False
-                # Lista de possíveis nomes para o diretório NFe
-                nfe_dir_variations = ["NF-e", "NFe", "nfe", "NF_e", "NFE"]
+            document_types = self._normalize_types(document_type)
+            layout = self._resolve_layout(document_id_clean)
+            reads = self._plan_reads(document_id_clean, layout, periods, document_types, statuses)
+            
+            results = {period: {t: [] for t in document_types} for period in periods}
+            if not reads:
+                return results
+            
+            workers = max(1, min(self.max_workers, len(reads)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(self._run_read, document_id_clean, read) for read in reads]
+                for read, future in zip(reads, futures):
+                    files = future.result()
+                    if files:
+                        doc_type, period = read[0], read[1]
+                        results[period][doc_type].extend(files)
+            
+            return results
+            
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar arquivos XML: {e}")
+            raise Exception(f"Erro ao buscar arquivos XML: {e}")
+
+    def list_companies(self):
+        """
+        Lista os CPF/CNPJ que possuem diretório dentro do caminho base.
+        
+        Returns:
+            list: Lista ordenada de CPF/CNPJ (apenas números)
+        """
+        try:
+            with os.scandir(self.base_path) as it:
+                return sorted(
+                    e.name for e in it
+                    if e.name.isdigit() and len(e.name) in (11, 14) and e.is_dir()
+                )
+        except OSError as e:
+            self.logger.error(f"Erro ao listar caminho base {self.base_path}: {e}")
+            return []
+
+    def scan_all_companies(self, period, document_type="all", statuses=DEFAULT_STATUSES):
+        """
+        Busca os arquivos de um período para todas as empresas do caminho base.
+        
+        Cada empresa é processada por uma thread do pool (limitado a max_workers).
+        Uma falha em uma empresa não interrompe as demais.
+        
+        Args:
+            period (str): Período no formato AAAAMM
+            document_type (str ou list, optional): Tipo(s) de documento ou 'all'
+            statuses (tuple, optional): Situações a buscar
+            
+        Returns:
+            dict: {CPF/CNPJ: {'files': {...} ou None, 'elapsed': segundos, 'error': str ou None}}
+        """
+        companies = self.list_companies()
+        document_types = self._normalize_types(document_type)
+        self.logger.info(f"Buscando período {period} para {len(companies)} empresa(s) em {self.base_path}")
+        
+        def scan_company(document_id_clean):
+            start = time.perf_counter()
+            try:
+                layout = self._resolve_layout(document_id_clean)
+                files = {t: [] for t in document_types}
+                for read in self._plan_reads(document_id_clean, layout, [period], document_types, statuses):
+                    files[read[0]].extend(self._run_read(document_id_clean, read) or [])
+                error = None
+            except Exception as e:
+                self.logger.error(f"Erro ao buscar arquivos da empresa {document_id_clean}: {e}")
+                files, error = None, str(e)
+            return {'files': files, 'elapsed': time.perf_counter() - start, 'error': error}
+        
+        results = {}
+        if not companies:
+            return results
+        
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(companies))) as executor:
+            for document_id_clean, result in zip(companies, executor.map(scan_company, companies)):
+                results[document_id_clean] = result
+        
+        return results
+
+    @staticmethod
+    def _normalize_types(document_type):
+        """
+        Converte o filtro de tipo de documento em uma lista de tipos da tabela de layout.
+        
+        Args:
+            document_type (str ou list): 'all', um tipo ou uma lista de tipos
+        
+        Returns:
+            list: Tipos de documento na ordem da tabela de layout
+        
+        Raises:
+            ValueError: Se algum tipo não existir na tabela de layout
+        """
+        if document_type == "all":
+            return list(DOCUMENT_LAYOUTS)
+        
+        requested = [document_type] if isinstance(document_type, str) else list(document_type)
+        unknown = [t for t in requested if t not in DOCUMENT_LAYOUTS]
+        if unknown:
+            raise ValueError(f"Tipo de documento desconhecido: {', '.join(unknown)}")
+        return [t for t in DOCUMENT_LAYOUTS if t in requested]
+    
+    def _plan_reads(self, document_id_clean, layout, periods, document_types, statuses):
+        """
+        Compila a tabela de layout no conjunto mínimo de diretórios a ler.
+        
+        Tipos sem diretório em 'Enviado' não geram nenhuma leitura.
+        
+        Args:
+            document_id_clean (str): CPF/CNPJ (apenas números)
+            layout (dict): Nomes reais dos diretórios (ver _resolve_layout)
+            periods (list): Períodos no formato AAAAMM
+            document_types (list): Tipos de documento
+            statuses (tuple): Situações a buscar
+            
+        Returns:
+            list: Tuplas (tipo, período, situação, [diretórios candidatos])
+        """
+        sent_path = os.path.join(self.base_path, document_id_clean, "Enviado")
+        reads = []
+        for period in periods:
+            for doc_type in document_types:
+                dir_names = layout.get(doc_type, [])
+                if not dir_names:
+                    continue
+                for status in statuses:
+                    candidates = [os.path.join(sent_path, name, period, status) for name in dir_names]
+                    reads.append((doc_type, period, status, candidates))
+        return reads
+        
+    def _run_read(self, document_id_clean, read):
+        """
+        Executa uma leitura planejada, usando o primeiro diretório candidato existente.
                 
-                base_nfe_path = os.path.join(self.base_path, document_id_clean, "Enviado")
+        Args:
+            document_id_clean (str): CPF/CNPJ (apenas números)
+            read (tuple): (tipo, período, situação, [diretórios candidatos])
                 
-                for nfe_dir_name in nfe_dir_variations:
-                    nfe_path = os.path.join(base_nfe_path, nfe_dir_name, period, "Autorizados")
-                    self.logger.info(f"Tentando caminho NFe: {nfe_path}")
-                    
-                    if os.path.exists(nfe_path):
-                        nfe_files = self._get_xml_files_from_dir(nfe_path)
-                        result['nfe'] = [{'filename': f, 'path': os.path.join(nfe_path, f)} for f in nfe_files]
-                        self.logger.info(f"Encontrados {len(nfe_files)} arquivos NFe em {nfe_path}")
-                        nfe_found = True
-                        break
-                    else:
-                        self.logger.debug(f"Caminho não existe: {nfe_path}")
+        Returns:
+            list: Lista de XMLFileEntry ou None se nenhum candidato existir
+        """
+        doc_type, period, status, candidates = read
+        label = DOCUMENT_LAYOUTS[doc_type]['label']
                 
-                if not nfe_found:
-                    # Tentar busca mais flexível - verificar se existe o diretório base e listar subdiretórios
-                    self.logger.info(f"Tentando busca flexível em: {base_nfe_path}")
-                    if os.path.exists(base_nfe_path):
-                        subdirs = [d for d in os.listdir(base_nfe_path) 
-                                 if os.path.isdir(os.path.join(base_nfe_path, d)) 
-                                 and 'nf' in d.lower()]
-                        self.logger.info(f"Subdiretórios encontrados contendo 'nf': {subdirs}")
-                        
-                        for subdir in subdirs:
-                            if 'nf' in subdir.lower() and subdir not in ["NFCe"]:  # Evitar pegar NFCe
-                                nfe_path = os.path.join(base_nfe_path, subdir, period, "Autorizados")
-                                self.logger.info(f"Testando subdiretório encontrado: {nfe_path}")
-                                
-                                if os.path.exists(nfe_path):
-                                    nfe_files = self._get_xml_files_from_dir(nfe_path)
-                                    result['nfe'] = [{'filename': f, 'path': os.path.join(nfe_path, f)} for f in nfe_files]
-                                    self.logger.info(f"Encontrados {len(nfe_files)} arquivos NFe em {nfe_path}")
-                                    nfe_found = True
-                                    break
-                    
-                    if not nfe_found:
-                        self.logger.warning(f"Nenhum diretório NFe encontrado para o período {period}")
-                        # Executar debug para mostrar estrutura
-                        self._debug_nfe_structure(document_id_clean, period)
-                    
-            return result
+        for directory in candidates:
+            self.logger.info(f"Verificando caminho {label}: {directory}")
+            files = self._list_xml_files(directory, document_id_clean, doc_type, period, status)
+            if files is not None:
+                self.logger.info(f"Encontrados {len(files)} arquivos {label} em {directory}")
+                return files
+            self.logger.debug(f"Caminho não existe: {directory}")
+        
+        if status == DEFAULT_STATUSES[0]:
+            self.logger.warning(f"Nenhum diretório {label} encontrado para o período {period}")
+        return None
+
+    def _resolve_layout(self, document_id_clean):
+        """
+        Resolve os nomes reais dos diretórios de cada tipo dentro de 'Enviado'.
+        
+        O diretório 'Enviado' é listado uma única vez (comparação sem diferenciar
+        maiúsculas, '-' e '_', conforme DOCUMENT_LAYOUTS) e o resultado fica em
+        cache por CPF/CNPJ, na memória e no índice. O cache só é refeito quando o
+        mtime de 'Enviado' muda, então os períodos seguintes e as próximas
+        execuções vão direto ao caminho certo.
+        
+        Args:
+            document_id_clean (str): CPF/CNPJ (apenas números)
+            
+        Returns:
+            dict: {tipo: [nomes]} em ordem de preferência, para todos os tipos da tabela
+        """
+        empty_layout = {doc_type: [] for doc_type in DOCUMENT_LAYOUTS}
+        sent_path = os.path.join(self.base_path, document_id_clean, "Enviado")
+        try:
+            sent_mtime = os.stat(sent_path).st_mtime
+        except OSError:
+            self.logger.warning(f"Base path não existe: {sent_path}")
+            return empty_layout
+        
+        cached = self._layout_cache.get(document_id_clean)
+        if cached is None and self.index:
+            cached = self.index.get_layout(document_id_clean)
+        if cached and cached[0] == sent_mtime:
+            return cached[1]
+        
+        try:
+            with os.scandir(sent_path) as it:
+                subdirs = sorted(e.name for e in it if e.is_dir())
+        except OSError as e:
+            self.logger.error(f"Erro ao listar {sent_path}: {e}")
+            return empty_layout
+        
+        layout = empty_layout
+        fallback = []
+        for name in subdirs:
+            document_type = self._classify_type_dir(name)
+            if document_type is None:
+                continue
+            if self._normalize_dir_name(name) in DOCUMENT_LAYOUTS[document_type]['folders']:
+                layout[document_type].append(name)
+            else:
+                # Busca flexível: outros diretórios contendo 'nf' que não sejam NFCe
+                fallback.append((document_type, name))
+        for document_type, name in fallback:
+            layout[document_type].append(name)
+        
+        found = ", ".join(f"{DOCUMENT_LAYOUTS[t]['label']}={names}" for t, names in layout.items() if names)
+        self.logger.info(f"Estrutura de {sent_path} resolvida: {found or 'nenhum tipo de documento'}")
+        if not found:
+            self._debug_structure(document_id_clean, subdirs)
+        
+        self._layout_cache[document_id_clean] = (sent_mtime, layout)
+        if self.index:
+            self.index.store_layout(document_id_clean, sent_mtime, layout)
+        return layout
+
+    def decode_access_keys(self, files):
+        """
+        Decodifica as chaves de acesso dos nomes dos arquivos, sem abrir os XMLs.
+        
+        O DigiSat nomeia os arquivos pela chave de acesso de 44 dígitos, que
+        traz UF, AAMM, CNPJ do emitente, modelo, série, número e dígito
+        verificador. A listagem inteira é decodificada de uma vez em arrays
+        compactos (AccessKeyBatch), um por campo, o que permite classificar e
+        conferir os arquivos só pelo nome. Decodifique uma vez por listagem e
+        repasse o lote (ver deduplicate_batch).
+        
+        Args:
+            files (iterable): Nomes de arquivos ou XMLFileEntry
+            
+        Returns:
+            AccessKeyBatch: Campos das chaves alinhados com a ordem dos arquivos
+        """
+        return AccessKeyBatch(f if isinstance(f, str) else f['filename'] for f in files)
+
+    def deduplicate(self, files):
+        """
+        Remove arquivos repetidos (mesma chave de acesso) antes da compactação.
+        
+        Args:
+            files (dict): {tipo: [arquivos]} como retornado por find_xml_files
+            
+        Returns:
+            tuple: ({tipo: [arquivos]} sem repetições, [(tipo, arquivo descartado, arquivo mantido)])
+        """
+        batch = self.decode_access_keys(f for type_files in files.values() for f in type_files)
+        result, dropped, _ = self.deduplicate_batch(files, batch)
+        return result, dropped
+
+    def deduplicate_batch(self, files, batch):
+        """
+        Remove arquivos repetidos usando chaves de acesso já decodificadas.
+        
+        O DigiSat às vezes deixa o mesmo documento em mais de um arquivo
+        (versão com protocolo '-procNFe' e versão simples, cópias reprocessadas).
+        Os arquivos são agrupados pela chave de acesso do nome e situação; em cada
+        grupo fica a versão com protocolo de autorização ('proc' no nome), depois
+        a maior e, por fim, a mais recente. Arquivos sem chave no nome (eventos,
+        por exemplo) são sempre mantidos.
+        
+        Args:
+            files (dict): {tipo: [arquivos]} como retornado por find_xml_files
+            batch (AccessKeyBatch): Chaves dos arquivos, na ordem de files
+                (tipo a tipo), como retornado por decode_access_keys
+            
+        Returns:
+            tuple: ({tipo: [arquivos]} sem repetições, [(tipo, arquivo descartado,
+                arquivo mantido)], AccessKeyBatch só dos arquivos mantidos)
+        """
+        entries = [(doc_type, f) for doc_type, type_files in files.items() for f in type_files]
+        
+        best = {}
+        for i, (_, file_info) in enumerate(entries):
+            key = batch.keys[i]
+            if key is None:
+                continue
+            group = (file_info.get('status') or DEFAULT_STATUSES[0], key)
+            j = best.get(group)
+            if j is None or self._duplicate_rank(file_info) > self._duplicate_rank(entries[j][1]):
+                best[group] = i
+        
+        kept = set(best.values())
+        result = {doc_type: [] for doc_type in files}
+        dropped = []
+        positions = []
+        for i, (doc_type, file_info) in enumerate(entries):
+            key = batch.keys[i]
+            if key is None or i in kept:
+                result[doc_type].append(file_info)
+                positions.append(i)
+            else:
+                winner = entries[best[(file_info.get('status') or DEFAULT_STATUSES[0], key)]][1]
+                dropped.append((doc_type, file_info, winner))
+        
+        if not dropped:
+            return result, dropped, batch
+        
+        self.logger.info(f"{len(dropped)} arquivo(s) repetido(s) descartado(s) pela chave de acesso")
+        return result, dropped, batch.select(positions)
+
+    def validate_files(self, files, full_parse=True):
+        """
+        Separa arquivos vazios, truncados, malformados ou ainda em gravação.
+        
+        Os arquivos são verificados em paralelo (XMLPreflight), com o mesmo
+        limite de threads das leituras de diretório; em compartilhamentos de
+        rede o tempo fica dominado pela latência, que as threads sobrepõem.
+        
+        Args:
+            files (dict): {tipo: [arquivos]} como retornado por find_xml_files
+            full_parse (bool): Se deve confirmar a boa formação lendo o arquivo inteiro
+            
+        Returns:
+            tuple: ({tipo: [arquivos]} íntegros, [(tipo, arquivo, motivo)] rejeitados)
+        """
+        preflight = XMLPreflight(full_parse)
+        entries = [(doc_type, f) for doc_type, type_files in files.items() for f in type_files]
+        result = {doc_type: [] for doc_type in files}
+        if not entries:
+            return result, []
+        
+        workers = max(1, min(self.max_workers, len(entries)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            reasons = list(executor.map(preflight.check, (f for _, f in entries)))
+        
+        rejected = []
+        for (doc_type, file_info), reason in zip(entries, reasons):
+            if reason is None:
+                result[doc_type].append(file_info)
+            else:
+                rejected.append((doc_type, file_info, reason))
+                self.logger.warning(f"Arquivo rejeitado na verificação: {file_info['path']} ({reason})")
+        
+        self.logger.info(f"Verificação de {len(entries)} arquivo(s): {len(rejected)} rejeitado(s)")
+        return result, rejected
+
+    def apply_export_mode(self, files, mode=DEFAULT_EXPORT_MODE):
+        """
+        Indexa os XMLs de evento da listagem e aplica o modo de exportação.
+        
+        Args:
+            files (dict): {tipo: [arquivos]} como retornado por find_xml_files
+            mode (str): 'include_events', 'exclude_cancelled' ou 'cancelled_only'
+            
+        Returns:
+            tuple: ({tipo: [arquivos]} filtrado, EventIndex da listagem)
+        """
+        event_index = EventIndex()
+        result = event_index.filter(files, mode)
+        self.logger.info(
+            f"Eventos: {sum(len(e) for e in event_index.events.values())} indexado(s), "
+            f"{len(event_index.cancelled)} cancelamento(s); modo de exportação {mode}"
+        )
+        return result, event_index
+
+    def find_by_access_keys(self, keys, statuses=STATUS_FOLDERS):
+        """
+        Localiza os XMLs de uma lista de chaves de acesso.
+        
+        As chaves são procuradas primeiro pela coluna access_key do índice
+        (que cobre também arquivos guardados em outro período), com um stat
+        só para cada arquivo encontrado. Para as chaves que o índice não
+        tem, cada chave traz o CNPJ do emitente, o AAMM e o modelo, então só
+        os diretórios correspondentes ({CNPJ}\\Enviado\\{tipo}\\{AAAAMM}) são
+        lidos, com a mesma leitura validada por mtime das buscas por período.
+        Com o índice em dia, o custo depende da quantidade de chaves, não do
+        tamanho dos diretórios.
+        
+        Args:
+            keys (iterable): Chaves de acesso de 44 dígitos
+            statuses (tuple, optional): Situações a consultar
+            
+        Returns:
+            tuple: ({tipo: [arquivos]} encontrados, [chaves não encontradas],
+                [chaves com dígito verificador inválido])
+        """
+        keys = list(dict.fromkeys(keys))
+        model_types = {layout['model']: doc_type for doc_type, layout in DOCUMENT_LAYOUTS.items()}
+        
+        invalid = []
+        wanted = set()
+        for key in keys:
+            if AccessKeyBatch.compute_check_digit(key) != int(key[43]):
+                invalid.append(key)
+            else:
+                wanted.add(key)
+        
+        files = {doc_type: [] for doc_type in DOCUMENT_LAYOUTS}
+        found = set()
+        
+        def collect(doc_type, entry, key):
+            if key in wanted:
+                files[doc_type].append(entry)
+                found.add(key)
+        
+        # {CPF/CNPJ: {período: set(tipos)}}
+        groups = {}
+        indexed = set()
+        try:
+            if self.index and wanted:
+                for row in self.index.find_by_access_keys([key for key in keys if key in wanted]):
+                    key, doc_type, entry = row[0], row[1], XMLFileEntry(*row[2:])
+                    if entry.status not in statuses:
+                        continue
+                    # Só os arquivos encontrados são conferidos; os que sumiram ficam para a leitura dos diretórios
+                    try:
+                        st = os.stat(entry.path)
+                    except OSError:
+                        continue
+                    collect(doc_type, entry._replace(size=st.st_size, mtime=st.st_mtime, inode=st.st_ino), key)
+            
+            for key in keys:
+                if key not in wanted or key in found:
+                    continue
+                doc_type = model_types.get(key[20:22])
+                if doc_type is None:
+                    continue
+                document_id = key[6:20]
+                # Emitente pessoa física: o CPF aparece na chave com zeros à esquerda
+                if document_id.startswith('000') and not os.path.isdir(os.path.join(self.base_path, document_id)):
+                    document_id = document_id[3:]
+                groups.setdefault(document_id, {}).setdefault(f"20{key[2:6]}", set()).add(doc_type)
+            
+            # Chaves já atendidas pelo índice não são coletadas de novo na leitura dos diretórios
+            indexed = set(found)
             
+            # Apenas os pares (tipo, período) das chaves que faltam, lidos em paralelo entre emitentes
+            reads = []
+            for document_id, periods in groups.items():
+                layout = self._resolve_layout(document_id)
+                for period, document_types in periods.items():
+                    document_types = [t for t in DOCUMENT_LAYOUTS if t in document_types]
+                    reads.extend(
+                        (document_id, read)
+                        for read in self._plan_reads(document_id, layout, [period], document_types, statuses)
+                    )
+            
+            if reads:
+                workers = max(1, min(self.max_workers, len(reads)))
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = [executor.submit(self._run_read, document_id, read) for document_id, read in reads]
+                    for (_, read), future in zip(reads, futures):
+                        for entry in future.result() or ():
+                            key = document_key(entry.filename)
+                            if key not in indexed:
+                                collect(read[0], entry, key)
         except Exception as e:
-            self.logger.error(f"Erro ao buscar arquivos XML: {e}")
-            raise Exception(f"Erro ao buscar arquivos XML: {e}")
+            self.logger.error(f"Erro ao buscar por chave de acesso: {e}")
+            raise Exception(f"Erro ao buscar por chave de acesso: {e}")
+        
+        missing = [key for key in keys if key in wanted and key not in found]
+        self.logger.info(
+            f"Busca por chave: {len(found)} encontrada(s), {len(missing)} não encontrada(s), "
+            f"{len(invalid)} inválida(s); {len(indexed)} pelo índice, diretórios lidos de {len(groups)} emitente(s)"
+        )
+        return files, missing, invalid
+
+    @staticmethod
+    def _duplicate_rank(file_info):
+        """Ordem de preferência entre arquivos da mesma chave (maior = preferido)"""
+        return (
+            'proc' in file_info['filename'].lower(),
+            file_info.get('size') or 0,
+            file_info.get('mtime') or 0
+        )
+
+    @staticmethod
+    def _normalize_dir_name(name):
+        """Normaliza o nome de um diretório para comparação (minúsculas, sem '-' e '_')"""
+        return name.lower().replace('-', '').replace('_', '')
 
-    def _get_xml_files_from_dir(self, directory):
+    @staticmethod
+    def _classify_type_dir(name):
         """
-        Obtém todos os arquivos XML de um diretório.
+        Identifica o tipo de documento de um diretório dentro de 'Enviado'.
+        
+        Args:
+            name (str): Nome do diretório
+            
+        Returns:
+            str: Tipo da tabela de layout ou None se o diretório não for de documentos
+        """
+        normalized = XMLFinder._normalize_dir_name(name)
+        for document_type, layout in DOCUMENT_LAYOUTS.items():
+            if normalized in layout['folders']:
+                return document_type
+        # Busca flexível herdada: outros diretórios contendo 'nf' que não sejam NFC-e
+        if 'nf' in normalized and 'nfc' not in normalized:
+            return 'nfe'
+        return None
+
+    @staticmethod
+    def _classify_status_dir(name):
+        """
+        Identifica o diretório de situação (Autorizados, Cancelados, ...).
+        
+        Args:
+            name (str): Nome do diretório
+        
+        Returns:
+            str: Nome da situação como em STATUS_FOLDERS ou None
+        """
+        for status in STATUS_FOLDERS:
+            if name.lower() == status.lower():
+                return status
+        return None
+    
+    def _classify_directory(self, directory):
+        """
+        Identifica CPF/CNPJ, tipo, período e situação de um diretório de XML.
+        
+        Args:
+            directory (str): Caminho no formato {base}\\{CNPJ}\\Enviado\\{tipo}\\{AAAAMM}\\{situação}
+            
+        Returns:
+            tuple: (CPF/CNPJ, tipo, período, situação) ou None se o caminho não seguir a estrutura
+        """
+        try:
+            parts = os.path.relpath(directory, self.base_path).split(os.sep)
+        except ValueError:
+            return None
+        
+        if len(parts) != 5 or not parts[0].isdigit() or not parts[3].isdigit():
+            return None
+        if parts[1].lower() != 'enviado':
+            return None
+        
+        document_type = self._classify_type_dir(parts[2])
+        status = self._classify_status_dir(parts[4])
+        if document_type is None or status is None:
+            return None
+        return parts[0], document_type, parts[3], status
+
+    def apply_file_event(self, path, event):
+        """
+        Aplica no índice a criação ou remoção de um arquivo XML.
+        
+        Usado pelo XMLWatcher para manter o índice atualizado à medida que o
+        DigiSat grava os arquivos, sem precisar reler o diretório inteiro.
+        
+        Args:
+            path (str): Caminho do arquivo XML
+            event (str): 'created' ou 'deleted' (renomear = 'deleted' + 'created')
+            
+        Returns:
+            tuple: (CPF/CNPJ, tipo, período, arquivos no diretório) ou None se
+                o arquivo não pertence a um diretório de situação
+        """
+        if not self.index or not path.lower().endswith('.xml'):
+            return None
+        
+        directory = os.path.dirname(path)
+        info = self._classify_directory(directory)
+        if info is None:
+            return None
+        document_id, document_type, period, status = info
+        
+        try:
+            dir_mtime = os.stat(directory).st_mtime
+        except OSError:
+            self.index.remove_directory(directory)
+            return document_id, document_type, period, 0
+        
+        if self.index.get_directory_mtime(directory) is None:
+            # Diretório ainda não indexado: lê o diretório inteiro uma vez
+            files = self.scan_xml_dir(directory, status)
+            self.index.store_directory(directory, *info, dir_mtime, files)
+            return document_id, document_type, period, len(files)
+        
+        entry = None
+        if event != 'deleted':
+            try:
+                st = os.stat(path)
+                entry = XMLFileEntry(os.path.basename(path), path, st.st_size, st.st_mtime, st.st_ino, status)
+            except OSError:
+                pass
+        
+        if entry:
+            self.index.add_file(directory, *info, entry)
+        else:
+            self.index.remove_file(path)
+        self.index.set_directory_mtime(directory, dir_mtime)
+        
+        return document_id, document_type, period, self.index.count_files(directory)
+
+    def _list_xml_files(self, directory, document_id, document_type, period, status=DEFAULT_STATUSES[0]):
+        """
+        Lista os arquivos XML de um diretório, usando o índice quando disponível.
         
         Args:
             directory (str): Caminho do diretório
+            document_id (str): CPF/CNPJ (apenas números)
+            document_type (str): Tipo de documento
+            period (str): Período no formato AAAAMM
+            status (str, optional): Situação do diretório
             
         Returns:
-            list: Lista de nomes de arquivos XML
+            list: Lista de XMLFileEntry ordenada pelo nome ou None se o diretório não existir
+        """
+        entries = self._open_xml_dir(directory, document_id, document_type, period, status)
+        if entries is None:
+            return None
+        
+        files = sorted(entries, key=lambda f: f.filename)
+        self.logger.info(f"{len(files)} arquivos XML encontrados em {directory}")
+        return files
+
+    def _open_xml_dir(self, directory, document_id, document_type, period, status=DEFAULT_STATUSES[0]):
+        """
+        Abre a leitura de um diretório de XML, usando o índice quando disponível.
+        
+        O diretório só é relido do disco se o seu mtime mudou desde a última
+        varredura registrada no índice. Na releitura, o índice é atualizado
+        quando o diretório termina de ser percorrido.
+        
+        O mtime do diretório não muda quando um arquivo é regravado no lugar,
+        então tamanho, mtime e inode das entradas vindas do índice podem
+        estar desatualizados (ver _iter_indexed). Quem depende deles confere
+        o arquivo ao abri-lo: a verificação (XMLPreflight) e a chave do cache
+        de metadados usam um stat novo, e a compactação grava o tamanho lido.
+        
+        Args:
+            directory (str): Caminho do diretório
+            document_id (str): CPF/CNPJ (apenas números)
+            document_type (str): Tipo de documento
+            period (str): Período no formato AAAAMM
+            status (str, optional): Situação do diretório
+            
+        Returns:
+            iterator: Iterador de XMLFileEntry ou None se o diretório não existir
         """
         try:
-            files = [f for f in os.listdir(directory) if f.lower().endswith('.xml')]
-            self.logger.info(f"Arquivos XML encontrados em {directory}: {files}")
-            return files
-        except Exception as e:
+            dir_mtime = os.stat(directory).st_mtime
+        except OSError:
+            if self.index and self.index.get_directory_mtime(directory) is not None:
+                self.index.remove_directory(directory)
+            return None
+        
+        if self.index and self.index.get_directory_mtime(directory) == dir_mtime:
+            self.logger.debug(f"Usando índice para {directory}")
+            return self._iter_indexed(directory, document_id, document_type, period, status, dir_mtime)
+        
+        if not self.index:
+            return self.iter_xml_dir(directory, status)
+        return self._iter_and_index(directory, document_id, document_type, period, status, dir_mtime)
+
+    def _iter_indexed(self, directory, document_id, document_type, period, status, dir_mtime):
+        """
+        Percorre as entradas indexadas de um diretório sem consultar o disco.
+        
+        O mtime do diretório confere com o da varredura, então a lista de
+        arquivos está completa. Só as entradas modificadas perto da última
+        alteração do diretório (RECENT_ENTRY_SECONDS), que podiam estar em
+        gravação na varredura, são conferidas com stat; as demais saem como
+        estão no índice, sem uma consulta por arquivo (no compartilhamento de
+        rede, cada stat é uma ida e volta ao servidor).
+        
+        Yields:
+            XMLFileEntry: Arquivos XML do diretório
+        """
+        for row in self.index.get_files(directory):
+            entry = XMLFileEntry(*row)
+            if entry.mtime < dir_mtime - RECENT_ENTRY_SECONDS:
+                yield entry
+                continue
+            
+            try:
+                st = os.stat(entry.path)
+            except FileNotFoundError:
+                self.index.remove_file(entry.path)
+                continue
+            except OSError as e:
+                self.logger.warning(f"Erro ao consultar {entry.path}: {e}")
+                continue
+            
+            if (st.st_size, st.st_mtime) != (entry.size, entry.mtime) or (entry.inode and st.st_ino != entry.inode):
+                entry = entry._replace(size=st.st_size, mtime=st.st_mtime, inode=st.st_ino)
+                self.index.add_file(directory, document_id, document_type, period, status, entry)
+            yield entry
+
+    def _iter_and_index(self, directory, document_id, document_type, period, status, dir_mtime):
+        """
+        Percorre um diretório e grava o resultado no índice ao final da leitura.
+        
+        Yields:
+            XMLFileEntry: Arquivos XML do diretório
+        """
+        scanned = []
+        for entry in self.iter_xml_dir(directory, status):
+            scanned.append(entry)
+            yield entry
+        self.index.store_directory(directory, document_id, document_type, period, status, dir_mtime, scanned)
+
+    def iter_xml_dir(self, directory, status=DEFAULT_STATUSES[0]):
+        """
+        Lê os arquivos XML de um diretório em uma única passagem com os.scandir.
+        
+        Tamanho, data de modificação e inode vêm da própria leitura do diretório,
+        de modo que as etapas seguintes (compactação) não precisam consultar o
+        sistema de arquivos de novo para cada arquivo.
+        
+        Args:
+            directory (str): Caminho do diretório
+            status (str, optional): Situação registrada nas entradas
+            
+        Yields:
+            XMLFileEntry: Arquivos XML na ordem em que o sistema os devolve
+        """
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if not entry.name.lower().endswith('.xml'):
+                        continue
+                    # No Windows o stat já vem da listagem do diretório (st_ino = 0);
+                    # nos demais sistemas é uma única chamada por arquivo
+                    st = entry.stat()
+                    if not stat.S_ISREG(st.st_mode):
+                        continue
+                    yield XMLFileEntry(entry.name, entry.path, st.st_size, st.st_mtime, st.st_ino, status)
+        except OSError as e:
             self.logger.error(f"Erro ao listar arquivos do diretório {directory}: {e}")
-            return []
 
-    def _debug_nfe_structure(self, document_id_clean, period):
+    def scan_xml_dir(self, directory, status=DEFAULT_STATUSES[0]):
         """
-        Debug específico para estrutura NFe
+        Lê os arquivos XML de um diretório (ver iter_xml_dir).
+        
+        Args:
+            directory (str): Caminho do diretório
+            status (str, optional): Situação registrada nas entradas
+            
+        Returns:
+            list: Lista de XMLFileEntry ordenada pelo nome do arquivo
         """
-        base_path = os.path.join(self.base_path, document_id_clean, "Enviado")
-        self.logger.info(f"=== DEBUG NFe - Estrutura de diretórios ===")
-        self.logger.info(f"Base path: {base_path}")
+        return sorted(self.iter_xml_dir(directory, status), key=lambda f: f.filename)
+
+    def refresh_index(self, document_id=None, callback=None):
+        """
+        Atualiza o índice de forma incremental, relendo apenas os diretórios
+        de situação (Autorizados, Cancelados, ...) cujo mtime mudou desde a
+        última varredura.
+        
+        Args:
+            document_id (str, optional): CPF/CNPJ a atualizar. Se não informado,
+                atualiza todos os documentos encontrados no caminho base.
+            callback (function, optional): Chamada como callback(CPF/CNPJ, tipo,
+                período, arquivos no diretório) para cada diretório relido
+                
+        Returns:
+            int: Quantidade de diretórios relidos do disco
+        """
+        if not self.index:
+            return 0
         
-        if os.path.exists(base_path):
-            subdirs = os.listdir(base_path)
-            self.logger.info(f"Subdiretórios em 'Enviado': {subdirs}")
+        if document_id:
+            document_ids = [''.join(filter(str.isdigit, document_id))]
+        else:
+            try:
+                document_ids = [d for d in os.listdir(self.base_path) if d.isdigit()]
+            except OSError as e:
+                self.logger.error(f"Erro ao listar caminho base {self.base_path}: {e}")
+                return 0
+        
+        rescanned = 0
+        seen = set()
+        for doc_id in document_ids:
+            sent_path = os.path.join(self.base_path, doc_id, "Enviado")
+            layout = self._resolve_layout(doc_id)
             
-            for subdir in subdirs:
-                subdir_path = os.path.join(base_path, subdir)
-                if os.path.isdir(subdir_path):
-                    self.logger.info(f"  Verificando: {subdir}")
+            for document_type, type_dirs in layout.items():
+                for type_dir in type_dirs:
+                    type_path = os.path.join(sent_path, type_dir)
                     try:
-                        contents = os.listdir(subdir_path)
-                        self.logger.info(f"    Conteúdo: {contents}")
+                        periods = [p for p in os.listdir(type_path) if p.isdigit()]
+                    except OSError:
+                        continue
+                    
+                    for period in periods:
+                        period_path = os.path.join(type_path, period)
+                        status_dirs = []
+                        try:
+                            with os.scandir(period_path) as it:
+                                for e in it:
+                                    status = self._classify_status_dir(e.name)
+                                    if status and e.is_dir():
+                                        status_dirs.append((e.path, status))
+                        except OSError:
+                            continue
                         
-                        # Verificar se existe o período
-                        if period in contents:
-                            period_path = os.path.join(subdir_path, period)
-                            period_contents = os.listdir(period_path)
-                            self.logger.info(f"    Período {period} encontrado: {period_contents}")
-                            
-                            # Verificar subdiretórios do período
-                            for item in period_contents:
-                                item_path = os.path.join(period_path, item)
-                                if os.path.isdir(item_path):
-                                    item_contents = os.listdir(item_path)
-                                    xml_count = len([f for f in item_contents if f.lower().endswith('.xml')])
-                                    self.logger.info(f"      {item}/: {xml_count} arquivos XML")
-                    except Exception as e:
-                        self.logger.error(f"    Erro ao listar {subdir}: {e}")
-        else:
-            self.logger.warning(f"Base path não existe: {base_path}")
+                        for directory, status in status_dirs:
+                            try:
+                                dir_mtime = os.stat(directory).st_mtime
+                            except OSError:
+                                continue
+                            seen.add(directory)
+                            if self.index.get_directory_mtime(directory) != dir_mtime:
+                                files = self.scan_xml_dir(directory, status)
+                                self.index.store_directory(
+                                    directory, doc_id, document_type, period, status, dir_mtime, files
+                                )
+                                rescanned += 1
+                                if callback:
+                                    callback(doc_id, document_type, period, len(files))
+        
+        # Remover do índice os diretórios que não existem mais
+        for directory in self.index.get_indexed_directories(document_id and document_ids[0]):
+            if directory not in seen:
+                self.index.remove_directory(directory)
+        
+        self.logger.info(f"Índice atualizado: {rescanned} diretório(s) relido(s)")
+        return rescanned
+
+    def _debug_structure(self, document_id_clean, subdirs):
+        """
+        Debug da estrutura de 'Enviado' quando nenhum tipo de documento é reconhecido
+        
+        Args:
+            document_id_clean (str): CPF/CNPJ (apenas números)
+            subdirs (list): Subdiretórios já listados em 'Enviado'
+        """
+        base_path = os.path.join(self.base_path, document_id_clean, "Enviado")
+        self.logger.info(f"=== DEBUG - Estrutura de diretórios ===")
+        self.logger.info(f"Base path: {base_path}")
+        self.logger.info(f"Subdiretórios em 'Enviado': {subdirs}")
+        
+        for subdir in subdirs:
+            subdir_path = os.path.join(base_path, subdir)
+            self.logger.info(f"  Verificando: {subdir}")
+            try:
+                contents = os.listdir(subdir_path)
+                self.logger.info(f"    Períodos: {sorted(contents)}")
+            except Exception as e:
+                self.logger.error(f"    Erro ao listar {subdir}: {e}")
 
-    def debug_path_search(self, document_id, period):
+    def debug_path_search(self, document_id, period, statuses=STATUS_FOLDERS):
         """
         Método de debug para verificar caminhos possíveis
+        
+        Usa a mesma tabela de layout da busca: 'Enviado' é listado uma vez e
+        são exibidos apenas os caminhos que a busca realmente consultaria.
         """
         document_id_clean = ''.join(filter(str.isdigit, document_id))
-        
-        # Adicionar mais variações para NFe
-        nfe_variations = ["NF-e", "NFe", "nfe", "NF_e", "NFE"]
+        sent_path = os.path.join(self.base_path, document_id_clean, "Enviado")
         
         possible_paths = [
             os.path.join(self.base_path, document_id_clean),
-            os.path.join(self.base_path, document_id_clean, "Enviado"),
-            os.path.join(self.base_path, document_id_clean, "Enviado", "NFCe"),
-            os.path.join(self.base_path, document_id_clean, "Enviado", "NFCe", period),
-            os.path.join(self.base_path, document_id_clean, "Enviado", "NFCe", period, "Autorizados"),
+            sent_path,
         ]
         
-        # Adicionar todas as variações de NFe
-        for nfe_var in nfe_variations:
-            possible_paths.extend([
-                os.path.join(self.base_path, document_id_clean, "Enviado", nfe_var),
-                os.path.join(self.base_path, document_id_clean, "Enviado", nfe_var, period),
-                os.path.join(self.base_path, document_id_clean, "Enviado", nfe_var, period, "Autorizados"),
-            ])
+        layout = self._resolve_layout(document_id_clean)
+        for doc_type, dir_names in layout.items():
+            for dir_name in dir_names:
+                possible_paths.extend([
+                    os.path.join(sent_path, dir_name),
+                    os.path.join(sent_path, dir_name, period),
+                ])
+        for read in self._plan_reads(document_id_clean, layout, [period], list(DOCUMENT_LAYOUTS), statuses):
+            possible_paths.extend(read[3])
         
         print("=== DEBUG - Verificação de Caminhos ===")
         for path in possible_paths:
@@ -211,4 +992,4 @@ class XMLFinder:
                         print(f"    📁 Conteúdo: {contents[:5]}{'...' if len(contents) > 5 else ''}")
                 except Exception as e:
                     print(f"    ❌ Erro ao listar: {e}")
-        print("=====================================")
\ No newline at end of file
+        print("=====================================")
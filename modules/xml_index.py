@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import sqlite3
+import logging
+import threading
+
+from modules.access_key import document_key
+
+# Versão do esquema do banco. O índice é apenas um cache da árvore DFe,
+# então uma versão diferente faz o banco ser recriado do zero.
+SCHEMA_VERSION = 5
+
+# Chaves de acesso por consulta em find_by_access_keys (limite de parâmetros do SQLite)
+QUERY_BATCH = 500
+
+class XMLIndex:
+    """Índice persistente (SQLite) dos arquivos XML da árvore DFe"""
+    
+    def __init__(self, db_path):
+        """
+        Inicializa o índice de arquivos XML.
+        
+        Args:
+            db_path (str): Caminho do arquivo SQLite do índice
+        """
+        self.db_path = db_path
+        self.logger = logging.getLogger("XMLSender.XMLIndex")
+        self._lock = threading.Lock()
+        
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        
+        # A conexão é compartilhada entre a thread da interface e as threads de busca
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._create_schema()
+    
+    def _create_schema(self):
+        """Cria as tabelas do índice, recriando o banco se o esquema mudou"""
+        with self._lock:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                self.logger.info(f"Recriando índice de XML (esquema {version} -> {SCHEMA_VERSION})")
+                self.conn.executescript("""
+                    DROP TABLE IF EXISTS files;
+                    DROP TABLE IF EXISTS directories;
+                    DROP TABLE IF EXISTS layouts;
+                """)
+            
+            self.conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS directories (
+                    path TEXT PRIMARY KEY,
+                    document_id TEXT NOT NULL,
+                    document_type TEXT NOT NULL,
+                    period TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    mtime REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    directory TEXT NOT NULL,
+                    document_id TEXT NOT NULL,
+                    document_type TEXT NOT NULL,
+                    period TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    inode INTEGER NOT NULL DEFAULT 0,
+                    access_key TEXT
+                );
+                CREATE TABLE IF NOT EXISTS layouts (
+                    document_id TEXT PRIMARY KEY,
+                    mtime REAL NOT NULL,
+                    layout TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_files_directory ON files (directory);
+                CREATE INDEX IF NOT EXISTS idx_files_lookup ON files (document_id, document_type, period);
+                CREATE INDEX IF NOT EXISTS idx_files_access_key ON files (access_key);
+                PRAGMA user_version = {SCHEMA_VERSION};
+            """)
+            self.conn.commit()
+    
+    def get_directory_mtime(self, directory):
+        """
+        Obtém o mtime registrado para um diretório na última varredura.
+        
+        Args:
+            directory (str): Caminho do diretório
+        
+        Returns:
+            float: mtime registrado ou None se o diretório nunca foi indexado
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT mtime FROM directories WHERE path = ?", (directory,)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def get_files(self, directory):
+        """
+        Obtém os arquivos indexados de um diretório.
+        
+        Args:
+            directory (str): Caminho do diretório
+        
+        Returns:
+            list: Lista de tuplas (filename, path, size, mtime, inode, status)
+        """
+        with self._lock:
+            return self.conn.execute(
+                "SELECT filename, path, size, mtime, inode, status FROM files WHERE directory = ? ORDER BY filename",
+                (directory,)
+            ).fetchall()
+    
+    def store_directory(self, directory, document_id, document_type, period, status, mtime, files):
+        """
+        Substitui o conteúdo indexado de um diretório pelo resultado de uma nova varredura.
+        
+        Args:
+            directory (str): Caminho do diretório
+            document_id (str): CPF/CNPJ (apenas números)
+            document_type (str): Tipo de documento ('nfce', 'nfe', 'cte', 'mdfe')
+            period (str): Período no formato AAAAMM
+            status (str): Situação (Autorizados, Cancelados, ...)
+            mtime (float): mtime do diretório no momento da varredura
+            files (list): Lista de XMLFileEntry lidos do diretório
+        """
+        with self._lock:
+            with self.conn:
+                self.conn.execute("DELETE FROM files WHERE directory = ?", (directory,))
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO files "
+                    "(path, directory, document_id, document_type, period, status, filename, size, mtime, inode, access_key) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (f.path, directory, document_id, document_type, period, status,
+                         f.filename, f.size, f.mtime, f.inode, document_key(f.filename))
+                        for f in files
+                    ]
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO directories (path, document_id, document_type, period, status, mtime) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (directory, document_id, document_type, period, status, mtime)
+                )
+        self.logger.debug(f"Diretório indexado: {directory} ({len(files)} arquivos)")
+    
+    def add_file(self, directory, document_id, document_type, period, status, entry):
+        """
+        Inclui ou atualiza um único arquivo no índice.
+        
+        Args:
+            directory (str): Caminho do diretório
+            document_id (str): CPF/CNPJ (apenas números)
+            document_type (str): Tipo de documento ('nfce', 'nfe', 'cte', 'mdfe')
+            period (str): Período no formato AAAAMM
+            status (str): Situação (Autorizados, Cancelados, ...)
+            entry (XMLFileEntry): Arquivo a incluir
+        """
+        with self._lock:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO files "
+                    "(path, directory, document_id, document_type, period, status, filename, size, mtime, inode, access_key) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (entry.path, directory, document_id, document_type, period, status,
+                     entry.filename, entry.size, entry.mtime, entry.inode, document_key(entry.filename))
+                )
+    
+    def remove_file(self, path):
+        """
+        Remove um único arquivo do índice.
+        
+        Args:
+            path (str): Caminho do arquivo
+        """
+        with self._lock:
+            with self.conn:
+                self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+    
+    def set_directory_mtime(self, directory, mtime):
+        """
+        Atualiza o mtime registrado de um diretório já indexado.
+        
+        Args:
+            directory (str): Caminho do diretório
+            mtime (float): Novo mtime do diretório
+        """
+        with self._lock:
+            with self.conn:
+                self.conn.execute("UPDATE directories SET mtime = ? WHERE path = ?", (mtime, directory))
+    
+    def count_files(self, directory):
+        """
+        Conta os arquivos indexados de um diretório.
+        
+        Args:
+            directory (str): Caminho do diretório
+        
+        Returns:
+            int: Quantidade de arquivos
+        """
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM files WHERE directory = ?", (directory,)
+            ).fetchone()[0]
+    
+    def remove_directory(self, directory):
+        """
+        Remove do índice um diretório que deixou de existir.
+        
+        Args:
+            directory (str): Caminho do diretório
+        """
+        with self._lock:
+            with self.conn:
+                self.conn.execute("DELETE FROM files WHERE directory = ?", (directory,))
+                self.conn.execute("DELETE FROM directories WHERE path = ?", (directory,))
+    
+    def get_all_files(self, document_id=None):
+        """
+        Lista todos os arquivos indexados, de todos os períodos.
+        
+        Args:
+            document_id (str, optional): Restringe a um CPF/CNPJ
+        
+        Returns:
+            list: Tuplas (path, filename, document_id, document_type, period, status, size, mtime)
+        """
+        query = (
+            "SELECT path, filename, document_id, document_type, period, status, size, mtime FROM files"
+        )
+        with self._lock:
+            if document_id:
+                return self.conn.execute(query + " WHERE document_id = ?", (document_id,)).fetchall()
+            return self.conn.execute(query).fetchall()
+    
+    def find_by_access_keys(self, keys):
+        """
+        Localiza arquivos pela chave de acesso contida no nome (eventos não entram).
+        
+        Cada consulta usa o índice da coluna access_key, então o custo depende
+        da quantidade de chaves, não do tamanho da árvore.
+        
+        Args:
+            keys (list): Chaves de acesso de 44 dígitos
+        
+        Returns:
+            list: Tuplas (access_key, document_type, filename, path, size, mtime, inode, status)
+        """
+        keys = list(keys)
+        rows = []
+        with self._lock:
+            for start in range(0, len(keys), QUERY_BATCH):
+                batch = keys[start:start + QUERY_BATCH]
+                rows.extend(self.conn.execute(
+                    "SELECT access_key, document_type, filename, path, size, mtime, inode, status FROM files "
+                    f"WHERE access_key IN ({', '.join('?' * len(batch))})",
+                    batch
+                ).fetchall())
+        return rows
+    
+    def get_layout(self, document_id):
+        """
+        Obtém os nomes de diretórios resolvidos para um CPF/CNPJ.
+        
+        Args:
+            document_id (str): CPF/CNPJ (apenas números)
+        
+        Returns:
+            tuple: (mtime de 'Enviado', layout) ou None se não houver registro
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT mtime, layout FROM layouts WHERE document_id = ?", (document_id,)
+            ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+    
+    def store_layout(self, document_id, mtime, layout):
+        """
+        Registra os nomes de diretórios resolvidos para um CPF/CNPJ.
+        
+        Args:
+            document_id (str): CPF/CNPJ (apenas números)
+            mtime (float): mtime do diretório 'Enviado' no momento da resolução
+            layout (dict): Nomes reais dos diretórios por tipo de documento
+        """
+        with self._lock:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO layouts (document_id, mtime, layout) VALUES (?, ?, ?)",
+                    (document_id, mtime, json.dumps(layout))
+                )
+    
+    def get_indexed_directories(self, document_id=None):
+        """
+        Lista os diretórios presentes no índice.
+        
+        Args:
+            document_id (str, optional): Restringe a um CPF/CNPJ
+        
+        Returns:
+            list: Lista de caminhos de diretórios indexados
+        """
+        with self._lock:
+            if document_id:
+                rows = self.conn.execute(
+                    "SELECT path FROM directories WHERE document_id = ?", (document_id,)
+                ).fetchall()
+            else:
+                rows = self.conn.execute("SELECT path FROM directories").fetchall()
+        return [r[0] for r in rows]
+    
+    def close(self):
+        """Fecha a conexão com o banco do índice"""
+        with self._lock:
+            self.conn.close()
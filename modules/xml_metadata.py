@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+from xml.parsers import expat
+
+# Campos do produto guardados por item: {tag: posição em [cProd, xProd, NCM]}
+PRODUCT_FIELDS = {'cProd': 0, 'xProd': 1, 'NCM': 2}
+
+class _StopParsing(Exception):
+    """Interrompe a leitura quando todos os campos já foram encontrados"""
+
+class XMLMetadataExtractor:
+    """Extrai os dados principais de um XML de NF-e/NFC-e sem montar a árvore do documento"""
+    
+    # Tamanho dos blocos lidos do arquivo; um XML de NFC-e costuma caber em um ou dois blocos
+    CHUNK_SIZE = 16 * 1024
+    
+    def __init__(self):
+        """Inicializa o extrator de metadados"""
+        self.logger = logging.getLogger("XMLSender.XMLMetadataExtractor")
+    
+    def extract(self, path):
+        """
+        Extrai chave de acesso, emissão, valores, CFOPs, formas de pagamento e
+        destinatário de um XML.
+        
+        O arquivo é lido em blocos por um parser expat incremental. A leitura
+        termina ao fim do grupo de pagamento (pag), que é o último campo
+        necessário no layout da NF-e; o restante do arquivo (informações
+        adicionais, assinatura, protocolo) não é lido.
+        
+        Args:
+            path (str): Caminho do arquivo XML
+        
+        Returns:
+            dict: Metadados do documento (ver _new_metadata) ou None se o
+                arquivo não puder ser lido ou não for uma NF-e/NFC-e (XMLs
+                de evento trazem chNFe, mas não infNFe/ide/mod)
+        """
+        metadata = self._new_metadata()
+        stack = []
+        text = []
+        product = ['', '', '']
+        
+        def start_element(name, attrs):
+            name = name.rpartition(':')[2]
+            if name == 'infNFe':
+                key = attrs.get('Id', '')
+                metadata['access_key'] = key[3:] if key.startswith('NFe') else key
+            stack.append(name)
+            text.clear()
+        
+        def end_element(name):
+            name = stack.pop() if stack else name.rpartition(':')[2]
+            parent = stack[-1] if stack else None
+            value = ''.join(text).strip()
+            text.clear()
+            
+            if parent == 'ide':
+                if name == 'mod':
+                    metadata['model'] = value
+                elif name == 'serie':
+                    metadata['series'] = int(value) if value.isdigit() else None
+                elif name == 'nNF':
+                    metadata['number'] = int(value) if value.isdigit() else None
+                elif name in ('dhEmi', 'dEmi'):
+                    metadata['issued_at'] = value
+                    digits = value[:7].replace('-', '')
+                    metadata['period'] = digits if len(digits) == 6 else None
+            elif parent == 'dest':
+                if name in ('CNPJ', 'CPF', 'idEstrangeiro'):
+                    metadata['recipient_id'] = value
+                elif name == 'xNome':
+                    metadata['recipient_name'] = value
+            elif parent == 'prod':
+                if name == 'CFOP':
+                    if value.isdigit() and int(value) not in metadata['cfops']:
+                        metadata['cfops'].append(int(value))
+                elif name in PRODUCT_FIELDS:
+                    product[PRODUCT_FIELDS[name]] = value
+            elif name == 'prod':
+                if product != ['', '', ''] and product not in metadata['products']:
+                    metadata['products'].append(list(product))
+                product[:] = ['', '', '']
+            elif parent == 'ICMSTot' and name in ('vNF', 'vICMS'):
+                amount = float(value) if value else None
+                metadata['total' if name == 'vNF' else 'icms'] = amount
+            elif name == 'tPag':
+                if value.isdigit() and int(value) not in metadata['payments']:
+                    metadata['payments'].append(int(value))
+            elif name in ('pag', 'infNFe'):
+                raise _StopParsing()
+            elif name == 'chNFe' and not metadata['access_key']:
+                # XML sem o atributo Id: usar a chave do protocolo
+                metadata['access_key'] = value
+        
+        def character_data(data):
+            text.append(data)
+        
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.CharacterDataHandler = character_data
+        
+        try:
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(self.CHUNK_SIZE)
+                    parser.Parse(chunk, not chunk)
+                    if not chunk:
+                        break
+        except _StopParsing:
+            pass
+        except (OSError, expat.ExpatError, ValueError) as e:
+            self.logger.warning(f"Não foi possível ler os metadados de {path}: {e}")
+            return None
+        
+        if not metadata['access_key'] or not metadata['model']:
+            self.logger.debug(f"Arquivo sem infNFe/mod (não é NF-e/NFC-e): {path}")
+            return None
+        
+        return metadata
+    
+    def extract_many(self, files):
+        """
+        Extrai os metadados de vários arquivos, um de cada vez.
+        
+        Args:
+            files (iterable): Caminhos ou arquivos com 'path' (XMLFileEntry)
+        
+        Yields:
+            tuple: (caminho, metadados ou None)
+        """
+        for file_info in files:
+            path = file_info if isinstance(file_info, str) else file_info['path']
+            yield path, self.extract(path)
+    
+    @staticmethod
+    def _new_metadata():
+        """
+        Cria o dicionário de metadados vazio.
+        
+        Returns:
+            dict: access_key (44 dígitos), model ('55'/'65'), series, number,
+                issued_at (dhEmi), period (AAAAMM), total (vNF), icms (vICMS),
+                cfops (CFOPs distintos dos itens), products ([cProd, xProd, NCM]
+                distintos dos itens), payments (tPag distintos),
+                recipient_id (CNPJ/CPF do destinatário) e recipient_name
+        """
+        return {
+            'access_key': None,
+            'model': None,
+            'series': None,
+            'number': None,
+            'issued_at': None,
+            'period': None,
+            'total': None,
+            'icms': None,
+            'cfops': [],
+            'products': [],
+            'payments': [],
+            'recipient_id': None,
+            'recipient_name': None
+        }
+
+# Exemplo de uso
+if __name__ == "__main__":
+    import sys
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
+    extractor = XMLMetadataExtractor()
+    for path, metadata in extractor.extract_many(sys.argv[1:]):
+        print(f"{path}: {metadata}")
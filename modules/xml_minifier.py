@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import shutil
+import logging
+import threading
+from xml.parsers import expat
+
+# Caracteres de espaço em branco do XML
+XML_WHITESPACE = ' \t\r\n'
+
+class _MinifyRun:
+    """Estado da minificação de um único documento"""
+    
+    def __init__(self, write):
+        """
+        Args:
+            write (function): Recebe os blocos de bytes da saída
+        """
+        self.write = write
+        self.parser = expat.ParserCreate()
+        self.parser.StartElementHandler = self.start_element
+        self.parser.EndElementHandler = self.end_element
+        self.parser.CharacterDataHandler = self.char_data
+        self.parser.StartCdataSectionHandler = self.start_cdata
+        self.parser.EndCdataSectionHandler = self.end_cdata
+        self.parser.CommentHandler = lambda data: self.markup()
+        self.parser.ProcessingInstructionHandler = lambda target, data: self.markup()
+        self.parser.XmlDeclHandler = lambda version, encoding, standalone: self.markup()
+        self.parser.StartDoctypeDeclHandler = lambda *args: self.markup()
+        
+        # Bytes recebidos e ainda não gravados; buffer[0] é o byte 'base' do documento
+        self.buffer = bytearray()
+        self.base = 0
+        # Trechos de espaço em branco a descartar: (início, fim) absolutos, em ordem
+        self.drops = []
+        # Trecho de texto em aberto: início, se só tem espaços e se está em conteúdo preservado
+        self.run_start = None
+        self.run_blank = True
+        self.run_kept = False
+        # Evento anterior ao trecho de texto ('start', 'end' ou 'other')
+        self.previous = 'other'
+        # Posição do último evento de marcação já interpretado pelo expat
+        self.last_markup = 0
+        # Profundidade dentro de um elemento preservado (com Id ou Signature)
+        self.kept_depth = 0
+        self.in_cdata = False
+        self.bytes_out = 0
+    
+    def close_run(self, following):
+        """
+        Fecha o trecho de texto em aberto na posição do evento atual.
+        
+        Espaço em branco entre marcações é descartado, exceto dentro de
+        conteúdo preservado e quando é todo o conteúdo de um elemento
+        (<a> </a>), que é um valor e não indentação.
+        """
+        index = self.parser.CurrentByteIndex
+        if self.run_start is not None:
+            if self.run_blank and not self.run_kept and not (self.previous == 'start' and following == 'end'):
+                self.drops.append((self.run_start, index))
+            self.run_start = None
+        self.previous = following
+        self.last_markup = index
+    
+    def start_element(self, name, attrs):
+        self.close_run('start')
+        if self.kept_depth:
+            self.kept_depth += 1
+        elif 'Id' in attrs or name.rpartition(':')[2] == 'Signature':
+            # Elemento referenciado pela assinatura (URI="#Id") ou a própria assinatura
+            self.kept_depth = 1
+    
+    def end_element(self, name):
+        self.close_run('end')
+        if self.kept_depth:
+            self.kept_depth -= 1
+    
+    def char_data(self, data):
+        if self.run_start is None:
+            self.run_start = self.parser.CurrentByteIndex
+            self.run_blank = True
+            self.run_kept = bool(self.kept_depth) or self.in_cdata
+        if self.run_blank and data.strip(XML_WHITESPACE):
+            self.run_blank = False
+    
+    def start_cdata(self):
+        self.close_run('other')
+        self.in_cdata = True
+    
+    def end_cdata(self):
+        self.close_run('other')
+        self.in_cdata = False
+    
+    def markup(self):
+        self.close_run('other')
+    
+    def feed(self, chunk, final=False):
+        """
+        Interpreta um bloco da entrada e grava a parte já resolvida.
+        
+        Args:
+            chunk (bytes): Bloco lido do arquivo
+            final (bool): Se é o último bloco
+        """
+        self.buffer += chunk
+        self.parser.Parse(chunk, final)
+        
+        if final:
+            end = self.base + len(self.buffer)
+            if self.run_start is not None and self.run_blank and not self.run_kept:
+                self.drops.append((self.run_start, end))
+            self.flush(end)
+        else:
+            # Só é seguro gravar até o último evento interpretado ou o início do texto em aberto
+            self.flush(self.run_start if self.run_start is not None else self.last_markup)
+    
+    def flush(self, bound):
+        """
+        Grava os bytes até a posição absoluta 'bound', sem os trechos descartados.
+        
+        Args:
+            bound (int): Posição absoluta no documento
+        """
+        if bound <= self.base:
+            return
+        position = self.base
+        for start, end in self.drops:
+            if start > position:
+                self.emit(self.buffer[position - self.base:start - self.base])
+            position = max(position, end)
+        if bound > position:
+            self.emit(self.buffer[position - self.base:bound - self.base])
+        self.drops = []
+        del self.buffer[:bound - self.base]
+        self.base = bound
+    
+    def emit(self, data):
+        if data:
+            self.write(bytes(data))
+            self.bytes_out += len(data)
+    
+    def abort(self):
+        """Grava sem alteração o restante já recebido (documento malformado)"""
+        self.drops = [(start, end) for start, end in self.drops if end <= self.last_markup]
+        self.flush(self.last_markup)
+        self.emit(self.buffer)
+        self.base += len(self.buffer)
+        self.buffer = bytearray()
+
+class XMLMinifier:
+    """Remove espaços em branco insignificantes de XMLs assinados, em fluxo"""
+    
+    # Tamanho do bloco lido do arquivo
+    CHUNK_SIZE = 64 * 1024
+    
+    def __init__(self):
+        """
+        Inicializa o minificador.
+        
+        A assinatura XMLDSig da NF-e é calculada sobre o elemento referenciado
+        (infNFe, infEvento, infProt... identificados pelo atributo Id), e a
+        canonicalização considera os espaços dentro dele. Por isso esses
+        elementos e o bloco Signature são copiados byte a byte; só a
+        indentação fora deles (nfeProc, NFe, protNFe) é descartada. O texto
+        é lido com expat em blocos e os bytes originais são repassados
+        conforme as posições dos eventos, sem montar árvore.
+        """
+        self.logger = logging.getLogger("XMLSender.XMLMinifier")
+        # minify() pode ser chamado por várias threads (compactação paralela)
+        self._lock = threading.Lock()
+        self.bytes_in = 0
+        self.bytes_out = 0
+    
+    def minify(self, source, write):
+        """
+        Minifica um documento.
+        
+        Se o XML estiver malformado, o restante do arquivo é copiado sem
+        alteração a partir do ponto do erro, de modo que nenhum byte de
+        conteúdo é perdido.
+        
+        Args:
+            source (file): Arquivo aberto em modo binário
+            write (function): Recebe os blocos de bytes da saída (ex: dst.write)
+        
+        Returns:
+            tuple: (bytes lidos, bytes gravados)
+        """
+        run = _MinifyRun(write)
+        bytes_in = 0
+        try:
+            while True:
+                chunk = source.read(self.CHUNK_SIZE)
+                bytes_in += len(chunk)
+                run.feed(chunk, final=not chunk)
+                if not chunk:
+                    break
+        except expat.ExpatError as e:
+            self.logger.warning(f"XML malformado, copiado sem minificar a partir do erro: {e}")
+            run.abort()
+            before = source.tell()
+            shutil.copyfileobj(source, _Writer(write))
+            bytes_in += source.tell() - before
+            run.bytes_out += source.tell() - before
+        
+        with self._lock:
+            self.bytes_in += bytes_in
+            self.bytes_out += run.bytes_out
+        return bytes_in, run.bytes_out
+    
+    def minify_file(self, path, output_path):
+        """
+        Minifica um arquivo XML em outro arquivo.
+        
+        Args:
+            path (str): Arquivo de origem
+            output_path (str): Arquivo de destino
+        
+        Returns:
+            tuple: (bytes lidos, bytes gravados)
+        """
+        with open(path, 'rb') as src, open(output_path, 'wb') as dst:
+            return self.minify(src, dst.write)
+    
+    @property
+    def saved_ratio(self):
+        """
+        Returns:
+            float: Fração do tamanho original removida até agora (0 a 1)
+        """
+        return 1 - self.bytes_out / self.bytes_in if self.bytes_in else 0.0
+
+class _Writer:
+    """Adapta uma função de escrita para shutil.copyfileobj"""
+    
+    def __init__(self, write):
+        self.write = write
+
+# Exemplo de uso
+if __name__ == "__main__":
+    import sys
+    
+    logging.basicConfig(level=logging.INFO)
+    minifier = XMLMinifier()
+    for xml_path in sys.argv[1:]:
+        bytes_in, bytes_out = minifier.minify_file(xml_path, xml_path + ".min")
+        print(f"{xml_path}: {bytes_in} -> {bytes_out} bytes")
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import time
+import logging
+from xml.parsers import expat
+
+# Bytes lidos do início (elemento raiz) e do fim (fechamento da raiz) do arquivo
+HEAD_SIZE = 1024
+TAIL_SIZE = 512
+
+# Arquivos modificados há menos que isso são conferidos de novo antes de serem aceitos
+SETTLE_SECONDS = 2.0
+
+# Primeiro elemento do documento ('<?xml' e '<!--' não casam: exigem letra após '<')
+ROOT_PATTERN = re.compile(rb'<([A-Za-z_][\w:.-]*)')
+
+# Restante da tag de abertura (atributos entre aspas podem conter '>'); grupo 1 é '/' se a tag se fecha
+START_TAG_END = re.compile(rb'(?:[^>"\']|"[^"]*"|\'[^\']*\')*?(/?)>')
+
+class XMLPreflight:
+    """Verificação rápida de XMLs vazios, truncados ou malformados antes da compactação"""
+    
+    # Tamanho do bloco lido na verificação completa com expat
+    CHUNK_SIZE = 64 * 1024
+    
+    def __init__(self, full_parse=True):
+        """
+        Inicializa o verificador.
+        
+        As verificações vão da mais barata para a mais cara e param no primeiro
+        problema: tamanho (stat), novo stat após uma pausa curta para arquivos
+        modificados há menos de SETTLE_SECONDS (arquivo ainda em gravação),
+        fechamento do elemento raiz lido do fim do arquivo com seek e, por
+        fim, leitura completa com expat sem tratadores (só verifica a boa
+        formação, sem montar estruturas).
+        
+        Args:
+            full_parse (bool): Se deve fazer a leitura completa com expat
+        """
+        self.full_parse = full_parse
+        self.logger = logging.getLogger("XMLSender.XMLPreflight")
+    
+    def check(self, file_info):
+        """
+        Verifica um arquivo.
+        
+        Args:
+            file_info (dict ou XMLFileEntry): Arquivo com 'path'; tamanho e mtime
+                vêm sempre de um stat novo, não da listagem
+        
+        Returns:
+            str: Motivo da rejeição ou None se o arquivo está íntegro
+        """
+        path = file_info['path']
+        try:
+            st = os.stat(path)
+            if st.st_size == 0:
+                return "arquivo vazio"
+            if time.time() - st.st_mtime < SETTLE_SECONDS and self._still_growing(path, st):
+                return "arquivo em gravação (tamanho ainda mudando)"
+            
+            with open(path, 'rb') as f:
+                reason = self._check_root(f, st.st_size)
+                if reason or not self.full_parse:
+                    return reason
+                f.seek(0)
+                return self._check_well_formed(f)
+        except FileNotFoundError:
+            return "arquivo não encontrado"
+        except OSError as e:
+            return f"erro de leitura: {e}"
+    
+    @staticmethod
+    def _still_growing(path, st):
+        """Confere de novo o tamanho de um arquivo recém-modificado"""
+        time.sleep(0.2)
+        current = os.stat(path)
+        return current.st_size != st.st_size or current.st_mtime != st.st_mtime
+    
+    @staticmethod
+    def _check_root(f, size):
+        """
+        Confere se o arquivo termina com o fechamento do elemento raiz.
+        
+        Um XML gravado pela metade perde o final; arquivos pré-alocados
+        terminam em bytes nulos. Basta ler o início e os últimos bytes.
+        Uma raiz vazia (<raiz .../>) termina no '/>' da própria tag de abertura.
+        
+        Returns:
+            str: Motivo da rejeição ou None
+        """
+        head = f.read(HEAD_SIZE)
+        match = ROOT_PATTERN.search(head)
+        if not match:
+            return "elemento raiz não encontrado no início do arquivo"
+        root = match.group(1)
+        start_tag = START_TAG_END.match(head, match.end())
+        
+        f.seek(max(0, size - TAIL_SIZE))
+        tail = f.read(TAIL_SIZE).rstrip(b' \t\r\n')
+        if tail.endswith(b'\x00'):
+            return "arquivo truncado (termina em bytes nulos)"
+        if start_tag and start_tag.group(1):
+            if not tail.endswith(b'/>'):
+                return f"arquivo truncado (sem o fechamento de <{root.decode('ascii', 'replace')}/>)"
+            return None
+        if not re.search(rb'</' + re.escape(root) + rb'\s*>$', tail):
+            return f"arquivo truncado (sem o fechamento de <{root.decode('ascii', 'replace')}>)"
+        return None
+    
+    def _check_well_formed(self, f):
+        """
+        Lê o arquivo inteiro com expat para confirmar a boa formação.
+        
+        Returns:
+            str: Motivo da rejeição ou None
+        """
+        parser = expat.ParserCreate()
+        try:
+            while True:
+                chunk = f.read(self.CHUNK_SIZE)
+                parser.Parse(chunk, not chunk)
+                if not chunk:
+                    return None
+        except expat.ExpatError as e:
+            return f"XML malformado ({expat.ErrorString(e.code)}, linha {e.lineno})"
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import errno
+import select
+import struct
+import logging
+import threading
+import ctypes
+import ctypes.util
+
+# Constantes do inotify (linux/inotify.h)
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_CLOSE_WRITE = 0x00000008
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct('iIII')
+
+class XMLWatcher:
+    """Monitora o diretório base e mantém o índice do XMLFinder atualizado"""
+    
+    def __init__(self, xml_finder, on_change=None, poll_interval=60):
+        """
+        Inicializa o monitor de arquivos XML.
+        
+        Usa inotify quando disponível (Linux). Nos demais casos, como o Windows
+        e compartilhamentos de rede, verifica periodicamente o mtime dos
+        diretórios com XMLFinder.refresh_index.
+        
+        Args:
+            xml_finder (XMLFinder): Localizador cujo índice será mantido atualizado
+            on_change (function, optional): Chamada como on_change(CPF/CNPJ, tipo,
+                período, arquivos no diretório) a cada alteração aplicada
+            poll_interval (int, optional): Intervalo em segundos da verificação periódica
+        """
+        self.xml_finder = xml_finder
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.logger = logging.getLogger("XMLSender.XMLWatcher")
+        
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._inotify_fd = None
+        self._watches = {}
+        self.mode = None
+    
+    def start(self):
+        """Inicia o monitoramento em uma thread em segundo plano"""
+        if self._thread and self._thread.is_alive():
+            return
+        
+        if not self.xml_finder.index:
+            self.logger.warning("Monitoramento requer o índice de XML; monitor não iniciado")
+            return
+        
+        self._stop_event.clear()
+        self.mode = "inotify" if self._setup_inotify() else "polling"
+        
+        self._thread = threading.Thread(
+            target=self._run_inotify if self.mode == "inotify" else self._run_polling,
+            name="XMLWatcher"
+        )
+        self._thread.daemon = True
+        self._thread.start()
+        self.logger.info(f"Monitoramento de {self.xml_finder.base_path} iniciado ({self.mode})")
+    
+    def stop(self):
+        """Interrompe o monitoramento"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+            self._watches = {}
+        self.logger.info("Monitoramento encerrado")
+    
+    def _notify(self, change):
+        """
+        Repassa uma alteração aplicada ao callback.
+        
+        Args:
+            change (tuple): (CPF/CNPJ, tipo, período, arquivos no diretório) ou None
+        """
+        if change and self.on_change:
+            try:
+                self.on_change(*change)
+            except Exception as e:
+                self.logger.error(f"Erro no callback do monitor: {e}")
+    
+    def _run_polling(self):
+        """Laço da verificação periódica por mtime dos diretórios"""
+        while not self._stop_event.is_set():
+            try:
+                self.xml_finder.refresh_index(callback=lambda *change: self._notify(change))
+            except Exception as e:
+                self.logger.error(f"Erro na verificação periódica: {e}")
+            self._stop_event.wait(self.poll_interval)
+    
+    def _setup_inotify(self):
+        """
+        Inicializa o inotify e registra os diretórios da estrutura DFe.
+        
+        Returns:
+            bool: True se o inotify está em uso, False para usar verificação periódica
+        """
+        if not sys.platform.startswith('linux'):
+            return False
+        
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            self._inotify_add_watch = libc.inotify_add_watch
+            self._inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            self.logger.info(f"inotify indisponível ({e}); usando verificação periódica")
+            return False
+        
+        if fd < 0:
+            self.logger.info("inotify_init1 falhou; usando verificação periódica")
+            return False
+        
+        self._inotify_fd = fd
+        try:
+            self._watch_tree(self.xml_finder.base_path)
+        except OSError as e:
+            # Normalmente ENOSPC: limite de fs.inotify.max_user_watches atingido
+            self.logger.warning(f"Não foi possível monitorar via inotify ({e}); usando verificação periódica")
+            os.close(fd)
+            self._inotify_fd = None
+            self._watches = {}
+            return False
+        
+        return True
+    
+    def _watch_depth(self, path):
+        """
+        Indica se um diretório faz parte da estrutura monitorada.
+        
+        Só são monitorados {base}, {CNPJ}, Enviado, {tipo}, {AAAAMM} e os diretórios
+        de situação (Autorizados, Cancelados, Denegados, Inutilizados).
+        
+        Args:
+            path (str): Caminho do diretório
+        
+        Returns:
+            bool: True se o diretório deve ser monitorado
+        """
+        rel = os.path.relpath(path, self.xml_finder.base_path)
+        if rel == os.curdir:
+            return True
+        parts = rel.split(os.sep)
+        depth = len(parts)
+        name = parts[-1]
+        
+        if depth == 1:
+            return name.isdigit()
+        if depth == 2:
+            return name.lower() == 'enviado'
+        if depth == 3:
+            return self.xml_finder._classify_type_dir(name) is not None
+        if depth == 4:
+            return name.isdigit()
+        if depth == 5:
+            return self.xml_finder._classify_status_dir(name) is not None
+        return False
+    
+    def _watch_tree(self, path, index_files=False):
+        """
+        Registra um diretório e seus subdiretórios da estrutura DFe no inotify.
+        
+        Args:
+            path (str): Diretório a registrar
+            index_files (bool): Se True, aplica no índice os XML já existentes
+                (diretórios criados depois do início do monitoramento)
+        """
+        if not self._watch_depth(path):
+            return
+        
+        wd = self._inotify_add_watch(self._inotify_fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        self._watches[wd] = path
+        
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError:
+            return
+        
+        for entry in entries:
+            if entry.is_dir():
+                self._watch_tree(entry.path, index_files)
+            elif index_files:
+                self._notify(self.xml_finder.apply_file_event(entry.path, 'created'))
+    
+    def _run_inotify(self):
+        """Laço de leitura dos eventos do inotify"""
+        while not self._stop_event.is_set():
+            try:
+                ready, _, _ = select.select([self._inotify_fd], [], [], 1.0)
+                if not ready:
+                    continue
+                data = os.read(self._inotify_fd, 64 * 1024)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EINTR):
+                    continue
+                if self._stop_event.is_set():
+                    break
+                self.logger.error(f"Erro ao ler eventos do inotify: {e}")
+                break
+            
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                
+                try:
+                    self._handle_event(wd, mask, name)
+                except Exception as e:
+                    self.logger.error(f"Erro ao processar evento do inotify: {e}")
+    
+    def _handle_event(self, wd, mask, name):
+        """
+        Trata um evento do inotify.
+        
+        Args:
+            wd (int): Descritor do diretório monitorado
+            mask (int): Máscara do evento
+            name (str): Nome do arquivo ou diretório afetado
+        """
+        if mask & IN_Q_OVERFLOW:
+            # Eventos perdidos: reconcilia o índice pelos mtimes dos diretórios
+            self.logger.warning("Fila do inotify excedida; atualizando índice completo")
+            self.xml_finder.refresh_index(callback=lambda *change: self._notify(change))
+            return
+        
+        if mask & (IN_IGNORED | IN_DELETE_SELF):
+            self._watches.pop(wd, None)
+            return
+        
+        directory = self._watches.get(wd)
+        if directory is None or not name:
+            return
+        path = os.path.join(directory, name)
+        
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._watch_tree(path, index_files=True)
+            return
+        
+        if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            self._notify(self.xml_finder.apply_file_event(path, 'created'))
+        elif mask & (IN_DELETE | IN_MOVED_FROM):
+            self._notify(self.xml_finder.apply_file_event(path, 'deleted'))
@@ -1,29 +1,111 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import io
 import os
+import gzip
+import lzma
+import time
+import zlib
+import shutil
+import tarfile
 import zipfile
 import logging
 import tempfile
 from datetime import datetime
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.xml_minifier import XMLMinifier
+from modules.compression_tuner import (
+    CompressionTuner, COMPRESSION_METHODS, DEFAULT_COMPRESSION, AUTO_COMPRESSION, MEMBER_OVERHEAD
+)
+from modules.document_layout import DOCUMENT_LAYOUTS, DEFAULT_STATUSES
+
+# Formatos de saída: 'zip' comprime cada membro separadamente; os formatos tar
+# comprimem o fluxo inteiro como uma unidade (arquivo sólido)
+ARCHIVE_FORMATS = ('zip', 'tar.xz', 'tar.gz')
+DEFAULT_ARCHIVE_FORMAT = 'zip'
+
+# Preset do xz nos arquivos sólidos (dicionário de 8 MB)
+SOLID_XZ_PRESET = 6
+
+# Registro de fim do diretório central do ZIP
+END_RECORD_SIZE = 22
+
+def encoded_size(size):
+    """
+    Tamanho de um anexo MIME em base64: cada 57 bytes viram uma linha de 76 caracteres + CRLF.
+    
+    Args:
+        size (int): Tamanho do arquivo em bytes
+    
+    Returns:
+        int: Tamanho codificado em bytes
+    """
+    return -(-size // 57) * 78
 
 class ZipService:
     """Serviço para compactação de arquivos"""
     
-    def __init__(self):
-        """Inicializa o serviço de compactação"""
+    # Arquivos comprimidos à frente da gravação, por thread (limita a memória usada)
+    PARALLEL_WINDOW = 8
+    
+    def __init__(self, minify=False, workers=1, compression=DEFAULT_COMPRESSION, size_limit=None, time_limit=None,
+                 archive_format=DEFAULT_ARCHIVE_FORMAT):
+        """
+        Inicializa o serviço de compactação.
+        
+        Args:
+            minify (bool): Remove a indentação dos XMLs antes de compactar,
+                preservando o conteúdo assinado (ver XMLMinifier)
+            workers (int): Threads de compressão; 1 compacta na própria thread
+                e 0 usa uma por núcleo
+            compression (str): Método de compressão padrão (chave de
+                COMPRESSION_METHODS ou 'auto')
+            size_limit (int, optional): No modo 'auto', tamanho máximo do ZIP em bytes:
+                escolhe o método mais rápido que cabe nele
+            time_limit (float, optional): No modo 'auto', tempo máximo em segundos:
+                escolhe o método que gera o menor ZIP nesse tempo (tem prioridade)
+            archive_format (str): Formato de saída (ver ARCHIVE_FORMATS); nos
+                formatos tar, 'compression' e 'workers' não se aplicam
+        
+        Raises:
+            ValueError: Se o formato não existe
+        """
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Formato de arquivo desconhecido: {archive_format}")
         self.logger = logging.getLogger("XMLSender.ZipService")
+        self.minifier = XMLMinifier() if minify else None
+        self.workers = workers or os.cpu_count() or 1
+        self.compression = compression
+        self.size_limit = size_limit
+        self.time_limit = time_limit
+        self.archive_format = archive_format
+    
+    @property
+    def extension(self):
+        """
+        Returns:
+            str: Extensão do arquivo gerado ('.zip', '.tar.xz' ou '.tar.gz')
+        """
+        return f".{self.archive_format}"
 
-    def compress_files(self, files, output_path=None, organize_by_type=True):
+    def compress_files(self, files, output_path=None, organize_by_type=True, compression=None):
         """
         Compacta arquivos em um arquivo ZIP.
         
         Args:
-            files (dict ou list): 
-                - Se dict: {'nfce': [...], 'nfe': [...]} com lista de arquivos por tipo
+            files (dict, list ou iterador): 
+                - Se dict: {'nfce': [...], 'nfe': [...], 'cte': [...], 'mdfe': [...]} com lista de arquivos por tipo
                 - Se list: Lista de dicionários com 'filename' e 'path'
+                - Se iterador: pares (tipo, arquivo) produzidos sob demanda;
+                  cada arquivo é compactado assim que é recebido
             output_path (str, optional): Caminho para salvar o arquivo ZIP
             organize_by_type (bool): Se True, organiza em pastas por tipo
+            compression (str, optional): 'stored', 'deflated', 'deflated-1' a
+                'deflated-9', 'bzip2', 'lzma' ou 'auto' (padrão: o do serviço)
             
         Returns:
             str: Caminho do arquivo ZIP criado
@@ -33,30 +115,395 @@ class ZipService:
             if not output_path:
                 temp_dir = tempfile.gettempdir()
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                output_path = os.path.join(temp_dir, f"xml_files_{timestamp}.zip")
+                output_path = os.path.join(temp_dir, f"xml_files_{timestamp}{self.extension}")
                 
             # Garante que o diretório existe
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
             
-            # Determinar se é estrutura organizada ou lista simples
-            if isinstance(files, dict) and organize_by_type:
-                return self._compress_organized_files(files, output_path)
-            elif isinstance(files, list):
-                return self._compress_simple_files(files, output_path)
-            else:
-                raise ValueError("Formato de arquivos não suportado")
+            return self._compress(files, output_path, organize_by_type, compression)
+                
+        except Exception as e:
+            self.logger.error(f"Erro ao compactar arquivos: {e}")
+            raise Exception(f"Erro ao compactar arquivos: {e}")
+
+    def stream_files(self, files, sink, organize_by_type=True, compression=None):
+        """
+        Compacta arquivos diretamente em um fluxo de saída, sem arquivo temporário.
+        
+        O fluxo só precisa de write() (e flush()): sem tell()/seek(), o
+        zipfile grava os tamanhos de cada membro em descritores após os dados,
+        então o ZIP pode ir direto para um socket, como o do envio SMTP.
+        
+        Args:
+            files (dict, list ou iterador): Arquivos, nos formatos aceitos por compress_files
+            sink (objeto com write): Fluxo de saída
+            organize_by_type (bool): Se True, organiza em pastas por tipo
+            compression (str, optional): Método de compressão (ver compress_files)
+        """
+        try:
+            self._compress(files, sink, organize_by_type, compression)
+        except Exception as e:
+            self.logger.error(f"Erro ao compactar arquivos: {e}")
+            raise Exception(f"Erro ao compactar arquivos: {e}")
+
+    def estimate_size(self, files, compression=None):
+        """
+        Estima o tamanho do ZIP antes de gerá-lo, a partir de uma amostra dos arquivos.
+        
+        Útil quando o ZIP vai em fluxo e o tamanho final só seria conhecido
+        no fim do envio. A estimativa é a do CompressionTuner para o método
+        (no modo 'auto', o método que ele escolhe); a minificação e os
+        formatos sólidos só diminuem o resultado.
+        
+        Args:
+            files (dict ou list): Arquivos, nos formatos aceitos por compress_files
+            compression (str, optional): Método de compressão (ver compress_files)
+        
+        Returns:
+            tuple: (nome do método, bytes estimados ou None se não há o que medir)
+        """
+        if isinstance(files, dict):
+            files = [f for type_files in files.values() for f in type_files]
+        
+        tuner = CompressionTuner(self.workers)
+        compression = compression or self.compression
+        if compression == AUTO_COMPRESSION:
+            compression = tuner.choose(files, self.size_limit, self.time_limit)
+        if compression not in COMPRESSION_METHODS:
+            raise ValueError(f"Método de compressão desconhecido: {compression}")
+        return compression, tuner.estimate_size(files, compression)
+
+    def compress_parts(self, files, output_path, max_encoded_size, organize_by_type=True, compression=None):
+        """
+        Compacta em um ou mais ZIPs cujo anexo em base64 não passa de max_encoded_size.
+        
+        Cada membro é comprimido antes de ser gravado, então o tamanho da
+        parte é conhecido antes de incluí-lo: se ele não couber, a parte é
+        fechada e o membro vai para a próxima. Tudo em uma passada, sem
+        recomprimir nada, e um membro nunca é dividido (um arquivo maior
+        que o limite sozinho fica em uma parte própria). Cada parte é um ZIP
+        completo, que abre sozinho.
+        
+        Se tudo couber em um ZIP, o resultado é só output_path; senão as
+        partes são {nome}_part1.zip, {nome}_part2.zip, ...
+        
+        Nos formatos sólidos o tamanho comprimido só é conhecido no fim do
+        fluxo, então é gerado um único arquivo; se ele passar do limite, é
+        descartado e os arquivos são divididos em partes ZIP
+        ({nome}.zip ou {nome}_part1.zip, ...), já que um tar comprimido não
+        pode ser dividido em partes que abram sozinhas.
+        
+        Args:
+            files (dict, list ou iterador): Arquivos, nos formatos aceitos por compress_files
+            output_path (str): Caminho do ZIP (base do nome das partes)
+            max_encoded_size (int): Tamanho máximo de cada parte depois da codificação base64
+            organize_by_type (bool): Se True, organiza em pastas por tipo
+            compression (str, optional): Método de compressão (ver compress_files)
+        
+        Returns:
+            list: Caminhos dos arquivos gerados, na ordem
+        """
+        if self.archive_format != DEFAULT_ARCHIVE_FORMAT:
+            retry = files
+            if isinstance(files, Iterator):
+                # Um iterador só pode ser percorrido uma vez; guardado para a divisão em partes
+                pairs = list(files)
+                files, retry = iter(pairs), iter(pairs)
+            solid = self.compress_files(files, output_path, organize_by_type, compression)
+            size = os.path.getsize(solid)
+            if encoded_size(size) <= max_encoded_size:
+                return [solid]
+            
+            self.logger.warning(
+                f"{os.path.basename(solid)} ({size} bytes) excede o limite de tamanho e o "
+                f"{self.archive_format} não pode ser dividido; gerando partes ZIP"
+            )
+            os.remove(solid)
+            files = retry
+            if output_path.endswith(self.extension):
+                output_path = output_path[:-len(self.extension)]
+            output_path += f".{DEFAULT_ARCHIVE_FORMAT}"
+        
+        try:
+            os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+            compression = self._resolve_compression(files, compression or self.compression)
+            parts = self._compress_zip_parts(
+                self._iter_members(files, organize_by_type), output_path, max_encoded_size, compression
+            )
+            
+            if self.minifier:
+                self.logger.info(
+                    f"XMLs minificados: {self.minifier.bytes_in} -> {self.minifier.bytes_out} bytes "
+                    f"({self.minifier.saved_ratio:.1%} a menos antes da compressão)"
+                )
+            return parts
                 
         except Exception as e:
             self.logger.error(f"Erro ao compactar arquivos: {e}")
             raise Exception(f"Erro ao compactar arquivos: {e}")
 
-    def _compress_organized_files(self, files_dict, output_path):
+    def _compress_zip_parts(self, members, output_path, max_encoded_size, compression):
+        """
+        Grava os membros em ZIPs sucessivos, abrindo uma nova parte quando o próximo não cabe.
+        
+        Args:
+            members (iterator): Trios (tipo, arquivo, caminho dentro do ZIP)
+            output_path (str): Caminho do ZIP (base do nome das partes)
+            max_encoded_size (int): Tamanho máximo de cada parte em base64
+            compression (tuple): Método e nível do zipfile
+        
+        Returns:
+            list: Caminhos dos ZIPs gerados
+        """
+        base, ext = os.path.splitext(output_path)
+        parts = []
+        counts = []
+        zipf = None
+        part_size = 0
+        try:
+            for doc_type, file_info, result in self._iter_deflated(members, *compression):
+                if result is None:
+                    self.logger.warning(f"Arquivo não encontrado: {file_info['path']}")
+                    continue
+                
+                zinfo, data = result
+                # Dados, cabeçalho local e entrada no diretório central
+                member_size = len(data) + MEMBER_OVERHEAD + 2 * len(zinfo.filename.encode('utf-8'))
+                if zipf is not None and encoded_size(part_size + member_size) > max_encoded_size:
+                    zipf.close()
+                    zipf = None
+                
+                if zipf is None:
+                    path = f"{base}_part{len(parts) + 1}{ext}" if parts else output_path
+                    zipf = self._open_zip(path, compression)
+                    parts.append(path)
+                    counts.append(0)
+                    part_size = END_RECORD_SIZE
+                    if encoded_size(part_size + member_size) > max_encoded_size:
+                        self.logger.warning(f"{zinfo.filename} sozinho excede o limite de tamanho da parte")
+                
+                self._write_raw_member(zipf, zinfo, data)
+                part_size += member_size
+                counts[-1] += 1
+        except Exception:
+            # Não deixa partes incompletas para trás
+            if zipf is not None:
+                zipf.close()
+                zipf = None
+            for path in parts:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        finally:
+            if zipf is not None:
+                zipf.close()
+        
+        if not parts:
+            # Nenhum arquivo: ZIP vazio, como em compress_files
+            self._open_zip(output_path, compression).close()
+            parts, counts = [output_path], [0]
+        elif len(parts) > 1:
+            parts[0] = f"{base}_part1{ext}"
+            os.replace(output_path, parts[0])
+        
+        for path, count in zip(parts, counts):
+            self.logger.info(f"Arquivo ZIP criado em {path} com {count} arquivos ({os.path.getsize(path)} bytes)")
+        return parts
+
+    def _compress(self, files, output, organize_by_type, compression=None):
+        """
+        Escolhe a forma de compactação conforme o formato de 'files'.
+        
+        Args:
+            files (dict, list ou iterador): Arquivos a compactar
+            output (str ou objeto com write): Caminho ou fluxo do ZIP
+            organize_by_type (bool): Se True, organiza em pastas por tipo
+            compression (str, optional): Método de compressão (padrão: o do serviço)
+            
+        Returns:
+            str ou objeto com write: O próprio 'output'
+        """
+        if self.archive_format != DEFAULT_ARCHIVE_FORMAT:
+            output = self._compress_solid(self._iter_members(files, organize_by_type), output)
+        else:
+            output = self._compress_zip(files, output, organize_by_type, compression)
+        
+        if self.minifier:
+            self.logger.info(
+                f"XMLs minificados: {self.minifier.bytes_in} -> {self.minifier.bytes_out} bytes "
+                f"({self.minifier.saved_ratio:.1%} a menos antes da compressão)"
+            )
+        return output
+
+    def _compress_zip(self, files, output, organize_by_type, compression=None):
+        """
+        Gera o ZIP, escolhendo a forma de compactação conforme o formato de 'files'.
+        
+        Args:
+            files (dict, list ou iterador): Arquivos a compactar
+            output (str ou objeto com write): Caminho ou fluxo do ZIP
+            organize_by_type (bool): Se True, organiza em pastas por tipo
+            compression (str, optional): Método de compressão (padrão: o do serviço)
+            
+        Returns:
+            str ou objeto com write: O próprio 'output'
+        """
+        compression = self._resolve_compression(files, compression or self.compression)
+        if isinstance(files, dict) and organize_by_type:
+            output = self._compress_organized_files(files, output, compression)
+        elif isinstance(files, list):
+            output = self._compress_simple_files(files, output, compression)
+        elif isinstance(files, Iterator):
+            output = self._compress_streamed_files(files, output, organize_by_type, compression)
+        else:
+            raise ValueError("Formato de arquivos não suportado")
+        return output
+
+    def _iter_members(self, files, organize_by_type):
+        """
+        Gera os membros do arquivo na ordem de compactação.
+        
+        Args:
+            files (dict, list ou iterador): Arquivos a compactar
+            organize_by_type (bool): Se True, organiza em pastas por tipo
+        
+        Returns:
+            iterator: Trios (tipo, arquivo, caminho dentro do arquivo)
+        
+        Raises:
+            ValueError: Se o formato de 'files' não é suportado
+        """
+        if isinstance(files, dict) and organize_by_type:
+            return self._organized_members(files)
+        if isinstance(files, list):
+            return ((None, file_info, file_info['filename']) for file_info in files)
+        if isinstance(files, Iterator):
+            return (
+                (doc_type, file_info, self._member_path(doc_type, file_info, organize_by_type))
+                for doc_type, file_info in files
+            )
+        raise ValueError("Formato de arquivos não suportado")
+
+    def _compress_solid(self, members, output):
+        """
+        Gera um arquivo sólido: um fluxo tar comprimido inteiro com xz ou gzip.
+        
+        XMLs de um mesmo CNPJ repetem emitente, produtos e assinatura; no ZIP
+        cada membro é comprimido sozinho e essa repetição não é aproveitada,
+        enquanto no fluxo contínuo o compressor encontra as repetições entre
+        arquivos. O tar é gravado em modo de fluxo ('w|'), em uma única
+        passada e sem seek, então a saída também pode ser um socket. A
+        estrutura de pastas (NFCe/, NFe/, ...) é a mesma do ZIP.
+        
+        Args:
+            members (iterator): Trios (tipo, arquivo, caminho dentro do arquivo)
+            output (str ou objeto com write): Caminho ou fluxo de saída
+        
+        Returns:
+            str ou objeto com write: O próprio 'output'
+        """
+        counts = {}
+        raw = open(output, 'wb') if isinstance(output, str) else output
+        try:
+            if self.archive_format == 'tar.xz':
+                stream = lzma.LZMAFile(raw, 'wb', preset=SOLID_XZ_PRESET)
+            else:
+                stream = gzip.GzipFile(fileobj=raw, mode='wb', mtime=0)
+            
+            with stream, tarfile.open(fileobj=stream, mode='w|') as tar:
+                for doc_type, file_info, arcname in members:
+                    folder = self._type_folder(doc_type) if doc_type else ''
+                    if self._add_tar_member(tar, file_info, arcname):
+                        counts[folder] = counts.get(folder, 0) + 1
+                        self.logger.debug(f"Adicionado {folder}: {file_info['filename']}")
+                    else:
+                        self.logger.warning(f"Arquivo {folder} não encontrado: {file_info['path']}")
+        finally:
+            if raw is not output:
+                raw.close()
+        
+        summary = ", ".join(
+            f"{folder}: {count}" if folder else f"{count} arquivos" for folder, count in counts.items()
+        ) or "nenhum arquivo"
+        self.logger.info(f"Arquivo {self.archive_format} criado em {output} ({summary})")
+        return output
+
+    def _add_tar_member(self, tar, file_info, arcname):
+        """
+        Adiciona um arquivo ao tar.
+        
+        O cabeçalho tar precede os dados e precisa do tamanho exato; com
+        minificação o XML é minificado em memória antes de ser gravado.
+        
+        Args:
+            tar (TarFile): Arquivo tar aberto em modo de fluxo
+            file_info (dict ou XMLFileEntry): Arquivo com 'path'
+            arcname (str): Caminho do arquivo dentro do tar
+        
+        Returns:
+            bool: True se o arquivo foi adicionado, False se não foi encontrado
+        """
+        try:
+            with open(file_info['path'], 'rb') as src:
+                st = os.fstat(src.fileno())
+                tarinfo = tarfile.TarInfo(arcname)
+                tarinfo.mtime = int(st.st_mtime)
+                tarinfo.mode = 0o644
+                if self.minifier:
+                    buffer = io.BytesIO()
+                    self.minifier.minify(src, buffer.write)
+                    tarinfo.size = buffer.tell()
+                    buffer.seek(0)
+                    tar.addfile(tarinfo, buffer)
+                else:
+                    tarinfo.size = st.st_size
+                    tar.addfile(tarinfo, src)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _resolve_compression(self, files, compression):
+        """
+        Converte o nome do método de compressão no método e nível do zipfile.
+        
+        No modo 'auto' o método é escolhido pelo CompressionTuner com uma
+        amostra dos arquivos; um iterador não pode ser amostrado sem ser
+        consumido, então usa o método padrão.
+        
+        Args:
+            files (dict, list ou iterador): Arquivos a compactar
+            compression (str): Nome do método ou 'auto'
+        
+        Returns:
+            tuple: (método do zipfile, nível ou None)
+        
+        Raises:
+            ValueError: Se o método não existe
+        """
+        if compression == AUTO_COMPRESSION:
+            if isinstance(files, dict):
+                compression = CompressionTuner(self.workers).choose(
+                    [f for type_files in files.values() for f in type_files], self.size_limit, self.time_limit
+                )
+            elif isinstance(files, list):
+                compression = CompressionTuner(self.workers).choose(files, self.size_limit, self.time_limit)
+            else:
+                self.logger.info(f"Compressão automática não se aplica a arquivos em fluxo; usando {DEFAULT_COMPRESSION}")
+                compression = DEFAULT_COMPRESSION
+        
+        if compression not in COMPRESSION_METHODS:
+            raise ValueError(f"Método de compressão desconhecido: {compression}")
+        self.logger.info(f"Método de compressão: {compression}")
+        return COMPRESSION_METHODS[compression]
+
+    def _compress_organized_files(self, files_dict, output_path, compression=COMPRESSION_METHODS[DEFAULT_COMPRESSION]):
         """
         Compacta arquivos organizados por tipo em pastas separadas.
         
         Args:
-            files_dict (dict): Dicionário com 'nfce' e 'nfe' contendo listas de arquivos
-            output_path (str): Caminho do arquivo ZIP
+            files_dict (dict): Dicionário {tipo: [arquivos]} com os tipos de DOCUMENT_LAYOUTS
+            output_path (str ou objeto com write): Caminho ou fluxo do arquivo ZIP
+            compression (tuple): Método e nível do zipfile
             
         Returns:
             str: Caminho do arquivo ZIP criado
@@ -64,57 +511,82 @@ class ZipService:
         total_files = 0
         
         # Cria o arquivo ZIP
-        with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            
-            # Adicionar arquivos NFCe
-            if 'nfce' in files_dict and files_dict['nfce']:
-                nfce_files = files_dict['nfce']
-                self.logger.info(f"Adicionando {len(nfce_files)} arquivos NFCe na pasta NFCe/")
-                
-                for file_info in nfce_files:
-                    filepath = file_info['path']
-                    filename = file_info['filename']
-                    
-                    if os.path.exists(filepath):
-                        # Caminho dentro do ZIP: NFCe/nome_do_arquivo.xml
-                        zip_path = f"NFCe/{filename}"
-                        zipf.write(filepath, zip_path)
-                        total_files += 1
-                        self.logger.debug(f"Adicionado NFCe: {filename}")
-                    else:
-                        self.logger.warning(f"Arquivo NFCe não encontrado: {filepath}")
-            
-            # Adicionar arquivos NFe
-            if 'nfe' in files_dict and files_dict['nfe']:
-                nfe_files = files_dict['nfe']
-                self.logger.info(f"Adicionando {len(nfe_files)} arquivos NFe na pasta NFe/")
-                
-                for file_info in nfe_files:
-                    filepath = file_info['path']
-                    filename = file_info['filename']
-                    
-                    if os.path.exists(filepath):
-                        # Caminho dentro do ZIP: NFe/nome_do_arquivo.xml
-                        zip_path = f"NFe/{filename}"
-                        zipf.write(filepath, zip_path)
-                        total_files += 1
-                        self.logger.debug(f"Adicionado NFe: {filename}")
-                    else:
-                        self.logger.warning(f"Arquivo NFe não encontrado: {filepath}")
+        with self._open_zip(output_path, compression) as zipf:
+            for doc_type, file_info, added in self._write_members(zipf, self._organized_members(files_dict)):
+                folder = self._type_folder(doc_type)
+                if added:
+                    total_files += 1
+                    self.logger.debug(f"Adicionado {folder}: {file_info['filename']}")
+                else:
+                    self.logger.warning(f"Arquivo {folder} não encontrado: {file_info['path']}")
         
         # Log do resultado
         self.logger.info(f"Arquivo ZIP organizado criado em {output_path} com {total_files} arquivos")
-        self._log_zip_structure(output_path)
+        if isinstance(output_path, str):
+            self._log_zip_structure(output_path)
         
         return output_path
+    
+    def _organized_members(self, files_dict):
+        """
+        Gera os membros do ZIP de um dicionário {tipo: [arquivos]}, tipo a tipo.
+        
+        Args:
+            files_dict (dict): Dicionário {tipo: [arquivos]}
+        
+        Yields:
+            tuple: (tipo, arquivo, caminho dentro do ZIP)
+        """
+        for doc_type, type_files in files_dict.items():
+            if not type_files:
+                continue
+            
+            folder = self._type_folder(doc_type)
+            self.logger.info(f"Adicionando {len(type_files)} arquivos {folder} na pasta {folder}/")
+            
+            for file_info in type_files:
+                # Caminho dentro do ZIP: {pasta}/nome_do_arquivo.xml ou {pasta}/{situação}/...
+                yield doc_type, file_info, self._member_path(doc_type, file_info)
+    
+    @staticmethod
+    def _type_folder(doc_type):
+        """Pasta dentro do ZIP para um tipo de documento (ver DOCUMENT_LAYOUTS)"""
+        layout = DOCUMENT_LAYOUTS.get(doc_type)
+        return layout['zip_folder'] if layout else doc_type
+    
+    def _member_path(self, doc_type, file_info, organize_by_type=True):
+        """
+        Monta o caminho de um arquivo dentro do ZIP.
+        
+        Documentos autorizados ficam direto na pasta do tipo (NFCe/, NFe/, ...);
+        as demais situações ficam em subpastas (NFe/Cancelados/, ...).
+        
+        Args:
+            doc_type (str): Tipo de documento
+            file_info (dict ou XMLFileEntry): Arquivo com 'filename' e, opcionalmente, 'status'
+            organize_by_type (bool): Se False, o arquivo fica na raiz do ZIP
+        
+        Returns:
+            str: Caminho do arquivo dentro do ZIP
+        """
+        filename = file_info['filename']
+        if not organize_by_type:
+            return filename
+        
+        folder = self._type_folder(doc_type)
+        status = file_info.get('status') or DEFAULT_STATUSES[0]
+        if status != DEFAULT_STATUSES[0]:
+            return f"{folder}/{status}/{filename}"
+        return f"{folder}/{filename}"
 
-    def _compress_simple_files(self, files_list, output_path):
+    def _compress_simple_files(self, files_list, output_path, compression=COMPRESSION_METHODS[DEFAULT_COMPRESSION]):
         """
         Compacta lista simples de arquivos (comportamento original).
         
         Args:
             files_list (list): Lista de dicionários com 'filename' e 'path'
-            output_path (str): Caminho do arquivo ZIP
+            output_path (str ou objeto com write): Caminho ou fluxo do arquivo ZIP
+            compression (tuple): Método e nível do zipfile
             
         Returns:
             str: Caminho do arquivo ZIP criado
@@ -122,21 +594,269 @@ class ZipService:
         total_files = 0
         
         # Cria o arquivo ZIP
-        with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file_info in files_list:
-                filename = file_info['filename']
-                filepath = file_info['path']
-                
-                if os.path.exists(filepath):
-                    zipf.write(filepath, filename)
+        with self._open_zip(output_path, compression) as zipf:
+            members = ((None, file_info, file_info['filename']) for file_info in files_list)
+            for _, file_info, added in self._write_members(zipf, members):
+                if added:
                     total_files += 1
-                    self.logger.debug(f"Adicionado: {filename}")
+                    self.logger.debug(f"Adicionado: {file_info['filename']}")
                 else:
-                    self.logger.warning(f"Arquivo não encontrado: {filepath}")
+                    self.logger.warning(f"Arquivo não encontrado: {file_info['path']}")
         
         self.logger.info(f"Arquivo ZIP criado em {output_path} com {total_files} arquivos")
         return output_path
 
+    def _compress_streamed_files(self, files_iter, output_path, organize_by_type=True,
+                                 compression=COMPRESSION_METHODS[DEFAULT_COMPRESSION]):
+        """
+        Compacta arquivos à medida que são produzidos por um iterador.
+        
+        Args:
+            files_iter (iterator): Pares (tipo, arquivo) com tipo de DOCUMENT_LAYOUTS
+            output_path (str ou objeto com write): Caminho ou fluxo do arquivo ZIP
+            organize_by_type (bool): Se True, organiza em pastas por tipo
+            compression (tuple): Método e nível do zipfile
+            
+        Returns:
+            str: Caminho do arquivo ZIP criado
+        """
+        counts = {}
+        
+        with self._open_zip(output_path, compression) as zipf:
+            members = (
+                (doc_type, file_info, self._member_path(doc_type, file_info, organize_by_type))
+                for doc_type, file_info in files_iter
+            )
+            for doc_type, file_info, added in self._write_members(zipf, members):
+                folder = self._type_folder(doc_type)
+                if added:
+                    counts[folder] = counts.get(folder, 0) + 1
+                    self.logger.debug(f"Adicionado {folder}: {file_info['filename']}")
+                else:
+                    self.logger.warning(f"Arquivo {folder} não encontrado: {file_info['path']}")
+        
+        summary = ", ".join(f"{folder}: {count}" for folder, count in counts.items()) or "nenhum arquivo"
+        self.logger.info(f"Arquivo ZIP criado em {output_path} ({summary})")
+        
+        return output_path
+
+    def _write_member(self, zipf, file_info, arcname):
+        """
+        Adiciona um arquivo ao ZIP.
+        
+        Quando o arquivo já traz 'size' e 'mtime' (entradas do XMLFinder), o
+        cabeçalho do ZIP é montado com esses metadados, sem consultar o sistema
+        de arquivos de novo; um arquivo ausente é detectado na própria abertura.
+        
+        Args:
+            zipf (ZipFile): Arquivo ZIP aberto para escrita
+            file_info (dict ou XMLFileEntry): Arquivo com 'path' e, opcionalmente, 'size' e 'mtime'
+            arcname (str): Caminho do arquivo dentro do ZIP
+            
+        Returns:
+            bool: True se o arquivo foi adicionado, False se não foi encontrado
+        """
+        filepath = file_info['path']
+        
+        try:
+            if (file_info.get('size') is None or file_info.get('mtime') is None) and not self.minifier:
+                zipf.write(filepath, arcname)
+                return True
+            zinfo = self._member_info(file_info, arcname)
+            zinfo.compress_type = zipf.compression
+            zinfo._compresslevel = zipf.compresslevel
+            
+            with open(filepath, 'rb') as src, zipf.open(zinfo, 'w') as dst:
+                if self.minifier:
+                    # A saída minificada nunca é maior que o original (file_size acima)
+                    self.minifier.minify(src, dst.write)
+                else:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+            return True
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _open_zip(output, compression):
+        """
+        Abre o ZIP para escrita com o método e o nível de compressão.
+        
+        Args:
+            output (str ou objeto com write): Caminho ou fluxo do ZIP
+            compression (tuple): Método e nível do zipfile
+        
+        Returns:
+            ZipFile: Arquivo ZIP aberto para escrita
+        """
+        compress_type, level = compression
+        return zipfile.ZipFile(output, 'w', compression=compress_type, compresslevel=level)
+
+    @staticmethod
+    def _member_info(file_info, arcname):
+        """
+        Monta o cabeçalho de um membro com o 'size' e o 'mtime' da listagem,
+        ou com os dados do sistema de arquivos se a entrada não os tiver.
+        
+        Args:
+            file_info (dict ou XMLFileEntry): Arquivo com 'path' e, opcionalmente, 'size' e 'mtime'
+            arcname (str): Caminho do arquivo dentro do ZIP
+        
+        Returns:
+            ZipInfo: Cabeçalho do membro
+        
+        Raises:
+            FileNotFoundError: Se for preciso consultar um arquivo que não existe
+        """
+        size = file_info.get('size')
+        mtime = file_info.get('mtime')
+        if size is None or mtime is None:
+            return zipfile.ZipInfo.from_file(file_info['path'], arcname)
+        zinfo = zipfile.ZipInfo(arcname, time.localtime(mtime)[:6])
+        zinfo.external_attr = 0o100644 << 16
+        zinfo.file_size = size
+        return zinfo
+
+    def _write_members(self, zipf, members):
+        """
+        Adiciona arquivos ao ZIP, em paralelo se houver mais de uma thread.
+        
+        Em paralelo, cada arquivo é lido e comprimido por inteiro em uma
+        thread de trabalho (o zlib libera o GIL durante a compressão) e só a
+        gravação é sequencial, na ordem original dos membros. O cabeçalho de
+        cada membro já sai com CRC e tamanhos, então o ZIP gerado é igual
+        ao da compactação em uma thread.
+        
+        Args:
+            zipf (ZipFile): Arquivo ZIP aberto para escrita
+            members (iterable): Trios (tipo, arquivo, caminho dentro do ZIP)
+        
+        Yields:
+            tuple: (tipo, arquivo, True se adicionado ou False se não encontrado)
+        """
+        if self.workers <= 1:
+            for doc_type, file_info, arcname in members:
+                yield doc_type, file_info, self._write_member(zipf, file_info, arcname)
+            return
+        
+        for doc_type, file_info, result in self._iter_deflated(members, zipf.compression, zipf.compresslevel):
+            if result is not None:
+                self._write_raw_member(zipf, *result)
+            yield doc_type, file_info, result is not None
+
+    def _iter_deflated(self, members, compress_type, compresslevel):
+        """
+        Comprime os membros em memória, na ordem original, em paralelo se houver mais de uma thread.
+        
+        Args:
+            members (iterable): Trios (tipo, arquivo, caminho dentro do ZIP)
+            compress_type (int): Método de compressão do ZIP
+            compresslevel (int): Nível de compressão ou None
+        
+        Yields:
+            tuple: (tipo, arquivo, resultado de _deflate_member)
+        """
+        if self.workers <= 1:
+            for doc_type, file_info, arcname in members:
+                yield doc_type, file_info, self._deflate_member(file_info, arcname, compress_type, compresslevel)
+            return
+        
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        pending = deque()
+        try:
+            for doc_type, file_info, arcname in members:
+                future = executor.submit(self._deflate_member, file_info, arcname, compress_type, compresslevel)
+                pending.append((doc_type, file_info, future))
+                if len(pending) >= self.workers * self.PARALLEL_WINDOW:
+                    doc_type, file_info, future = pending.popleft()
+                    yield doc_type, file_info, future.result()
+            while pending:
+                doc_type, file_info, future = pending.popleft()
+                yield doc_type, file_info, future.result()
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def _deflate_member(self, file_info, arcname, compress_type, compresslevel):
+        """
+        Lê e comprime um arquivo inteiro em memória (executado nas threads de trabalho).
+        
+        Args:
+            file_info (dict ou XMLFileEntry): Arquivo a comprimir
+            arcname (str): Caminho do arquivo dentro do ZIP
+            compress_type (int): Método de compressão do ZIP
+            compresslevel (int): Nível de compressão ou None
+        
+        Returns:
+            tuple: (ZipInfo com CRC e tamanhos, dados comprimidos) ou None se o arquivo não existe
+        """
+        try:
+            zinfo = self._member_info(file_info, arcname)
+            zinfo.compress_type = compress_type
+            compressor = zipfile._get_compressor(compress_type, compresslevel)
+            chunks = []
+            crc = 0
+            file_size = 0
+            
+            def write(data):
+                nonlocal crc, file_size
+                crc = zlib.crc32(data, crc)
+                file_size += len(data)
+                chunks.append(compressor.compress(data) if compressor else data)
+            
+            with open(file_info['path'], 'rb') as src:
+                if self.minifier:
+                    self.minifier.minify(src, write)
+                else:
+                    for chunk in iter(lambda: src.read(1024 * 1024), b''):
+                        write(chunk)
+            if compressor:
+                chunks.append(compressor.flush())
+        except FileNotFoundError:
+            return None
+        
+        data = b''.join(chunks)
+        zinfo.CRC = crc
+        zinfo.file_size = file_size
+        zinfo.compress_size = len(data)
+        return zinfo, data
+
+    @staticmethod
+    def _write_raw_member(zipf, zinfo, data):
+        """
+        Grava um membro já comprimido, com os mesmos cabeçalhos de ZipFile.open(..., 'w').
+        
+        O zipfile não tem API pública para dados já comprimidos; os passos
+        abaixo seguem ZipFile._open_to_write, com CRC e tamanhos conhecidos
+        antes da gravação (dispensa voltar ao cabeçalho ou usar descritor,
+        então também funciona em fluxos sem seek).
+        
+        Args:
+            zipf (ZipFile): Arquivo ZIP aberto para escrita
+            zinfo (ZipInfo): Cabeçalho com CRC e tamanhos
+            data (bytes): Dados comprimidos
+        """
+        zinfo.flag_bits = 0x00
+        if zinfo.compress_type == zipfile.ZIP_LZMA:
+            # Os dados comprimidos incluem o marcador de fim de fluxo (EOS)
+            zinfo.flag_bits |= 0x02
+        if not zinfo.external_attr:
+            zinfo.external_attr = 0o600 << 16
+        
+        zip64 = zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+        if zip64 and not zipf._allowZip64:
+            raise zipfile.LargeZipFile("Filesize would require ZIP64 extensions")
+        
+        if zipf._seekable:
+            zipf.fp.seek(zipf.start_dir)
+        zinfo.header_offset = zipf.fp.tell()
+        zipf._writecheck(zinfo)
+        zipf._didModify = True
+        zipf.fp.write(zinfo.FileHeader(zip64))
+        zipf.fp.write(data)
+        zipf.start_dir = zipf.fp.tell()
+        
+        zipf.filelist.append(zinfo)
+        zipf.NameToInfo[zinfo.filename] = zinfo
+
     def _log_zip_structure(self, zip_path):
         """
         Registra a estrutura do arquivo ZIP no log.
@@ -148,26 +868,21 @@ class ZipService:
             with zipfile.ZipFile(zip_path, 'r') as zipf:
                 file_list = zipf.namelist()
                 
-                # Organizar por pasta
-                nfce_files = [f for f in file_list if f.startswith('NFCe/')]
-                nfe_files = [f for f in file_list if f.startswith('NFe/')]
+                # Organizar por pasta (primeiro nível)
+                folders = {}
+                for f in file_list:
+                    if '/' in f:
+                        folders.setdefault(f.split('/', 1)[0], []).append(f)
                 root_files = [f for f in file_list if '/' not in f]
                 
                 self.logger.info(f"📦 Estrutura do ZIP ({len(file_list)} arquivos total):")
                 
-                if nfce_files:
-                    self.logger.info(f"  📁 NFCe/ ({len(nfce_files)} arquivos)")
-                    for file in nfce_files[:3]:  # Mostrar apenas os primeiros 3
-                        self.logger.info(f"    📄 {os.path.basename(file)}")
-                    if len(nfce_files) > 3:
-                        self.logger.info(f"    ... e mais {len(nfce_files) - 3} arquivos")
-                
-                if nfe_files:
-                    self.logger.info(f"  📁 NFe/ ({len(nfe_files)} arquivos)")
-                    for file in nfe_files[:3]:  # Mostrar apenas os primeiros 3
-                        self.logger.info(f"    📄 {os.path.basename(file)}")
-                    if len(nfe_files) > 3:
-                        self.logger.info(f"    ... e mais {len(nfe_files) - 3} arquivos")
+                for folder, folder_files in folders.items():
+                    self.logger.info(f"  📁 {folder}/ ({len(folder_files)} arquivos)")
+                    for file in folder_files[:3]:  # Mostrar apenas os primeiros 3
+                        self.logger.info(f"    📄 {file.split('/', 1)[1]}")
+                    if len(folder_files) > 3:
+                        self.logger.info(f"    ... e mais {len(folder_files) - 3} arquivos")
                 
                 if root_files:
                     self.logger.info(f"  📄 Raiz ({len(root_files)} arquivos)")
@@ -195,10 +910,11 @@ class ZipService:
                 'exists': os.path.exists(zip_path),
                 'size': 0,
                 'file_count': 0,
-                'nfce_count': 0,
-                'nfe_count': 0,
                 'structure': []
             }
+            # Contagem por tipo: nfce_count, nfe_count, cte_count, mdfe_count
+            for doc_type in DOCUMENT_LAYOUTS:
+                info[f'{doc_type}_count'] = 0
             
             if info['exists']:
                 info['size'] = os.path.getsize(zip_path)
@@ -209,8 +925,9 @@ class ZipService:
                     info['structure'] = file_list
                     
                     # Contar por tipo
-                    info['nfce_count'] = len([f for f in file_list if f.startswith('NFCe/')])
-                    info['nfe_count'] = len([f for f in file_list if f.startswith('NFe/')])
+                    for doc_type, layout in DOCUMENT_LAYOUTS.items():
+                        prefix = f"{layout['zip_folder']}/"
+                        info[f'{doc_type}_count'] = len([f for f in file_list if f.startswith(prefix)])
             
             return info
             
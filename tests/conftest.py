@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.access_key import AccessKeyBatch
+
+CNPJ = "12345678000199"
+PERIOD = "202501"
+
+# Pastas dos tipos de documento como o DigiSat grava
+TYPE_DIRS = {'nfce': 'NFCe', 'nfe': 'NF-e', 'cte': 'CTe', 'mdfe': 'MDFe'}
+
+def make_key(number, model='55', series=1, cnpj=CNPJ, aamm='2501', uf='35'):
+    """
+    Monta uma chave de acesso com dígito verificador válido.
+    
+    Returns:
+        str: Chave de 44 dígitos
+    """
+    key = f"{uf}{aamm}{cnpj}{model}{series:03d}{number:09d}1{number:08d}"
+    return key + str(AccessKeyBatch.compute_check_digit(key))
+
+def make_xml(key, padding=0):
+    """
+    Monta um XML de NF-e mínimo para a chave.
+    
+    Args:
+        key (str): Chave de acesso
+        padding (int): Itens extras, para variar o tamanho do arquivo
+    
+    Returns:
+        bytes: Conteúdo do XML
+    """
+    items = "".join(f"\n        <det nItem=\"{i}\"><xProd>PRODUTO {i}</xProd></det>" for i in range(padding))
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00">\n'
+        f'    <NFe>\n'
+        f'        <infNFe Id="NFe{key}" versao="4.00">{items}\n'
+        f'        </infNFe>\n'
+        f'    </NFe>\n'
+        f'</nfeProc>\n'
+    ).encode('utf-8')
+
+@pytest.fixture
+def dfe_tree(tmp_path):
+    """
+    Cria uma árvore {base}\\{CNPJ}\\Enviado\\{tipo}\\{AAAAMM}\\{situação} vazia.
+    
+    Returns:
+        function: write(doc_type, filename, data, status='Autorizados') -> caminho
+            do arquivo criado; o diretório base fica em write.base_path
+    """
+    base_path = tmp_path / "DFe"
+    
+    def write(doc_type, filename, data, status='Autorizados'):
+        directory = base_path / CNPJ / "Enviado" / TYPE_DIRS[doc_type] / PERIOD / status
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / filename
+        path.write_bytes(data)
+        return str(path)
+    
+    write.base_path = str(base_path)
+    return write
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from modules.access_key import AccessKeyBatch, document_key
+
+from conftest import make_key
+
+def test_sequence_gaps_per_model_and_series():
+    filenames = [f"{make_key(n)}-procNFe.xml" for n in (1, 2, 5, 9)]
+    filenames += [f"{make_key(n, series=2)}-procNFe.xml" for n in (10, 11, 12)]
+    filenames += [f"{make_key(n, model='65')}-procNFCe.xml" for n in (3, 5)]
+    
+    gaps = AccessKeyBatch(filenames).sequence_gaps()
+    
+    assert gaps == {('55', 1): [(3, 4), (6, 8)], ('65', 1): [(4, 4)]}
+
+def test_sequence_gaps_ignores_duplicates_events_and_files_without_key():
+    key = make_key(2)
+    filenames = [
+        f"{make_key(1)}-procNFe.xml",
+        f"{key}-procNFe.xml",
+        f"{key}-nfe.xml",
+        f"110111{make_key(4)}01-procEventoNFe.xml",
+        "sem-chave.xml",
+        f"{make_key(3)}-procNFe.xml",
+    ]
+    
+    batch = AccessKeyBatch(filenames)
+    
+    assert batch.sequence_gaps() == {}
+    assert batch.without_key() == [4]
+    assert list(batch.event) == [0, 0, 0, 1, 0, 0]
+    assert document_key(filenames[3]) is None
+
+def test_invalid_check_digit_and_fields():
+    key = make_key(7)
+    wrong = key[:43] + str((int(key[43]) + 1) % 10)
+    
+    batch = AccessKeyBatch([f"{key}-procNFe.xml", f"{wrong}-procNFe.xml"])
+    
+    assert batch.invalid() == [1]
+    assert batch.number[0] == 7
+    assert batch.model[0] == 55
+    assert batch.aamm[0] == 2501
+    assert batch.valid[0]
+
+def test_bulk_decode_matches_single_file_parsing():
+    key = make_key(12, model='65', series=321, cnpj="98765432000110", aamm='2412', uf='43')
+    filenames = [
+        f"{key}-procNFCe.xml",
+        f"copia {make_key(13)}.XML",
+        f"EVENTO-110111-{make_key(14)}.xml",
+        f"{make_key(15)}-procEventoNFe.xml",
+        "123-sem-chave.xml",
+        f"1{make_key(16)}-nfe.xml",
+    ]
+    
+    batch = AccessKeyBatch(filenames)
+    
+    assert batch.keys == [document_key(name) for name in filenames]
+    assert list(batch.event) == [0, 0, 1, 1, 0, 0]
+    assert list(batch.valid) == [1, 1, 0, 0, 0, 0]
+    assert (batch.uf[0], batch.aamm[0], batch.cnpj[0], batch.model[0]) == (43, 2412, 98765432000110, 65)
+    assert (batch.series[0], batch.number[0], batch.emission_type[0], batch.code[0]) == (321, 12, 1, 12)
+    assert batch.check_digit[0] == int(key[43])
+    assert batch.cnpj[1] == int(make_key(13)[6:20])
+
+def test_select_keeps_fields_aligned():
+    filenames = [f"{make_key(n)}-procNFe.xml" for n in (1, 2, 3)] + ["sem-chave.xml"]
+    
+    selected = AccessKeyBatch(filenames).select([0, 2, 3])
+    
+    assert selected.filenames == [filenames[0], filenames[2], filenames[3]]
+    assert list(selected.number) == [1, 3, 0]
+    assert selected.without_key() == [2]
+    assert selected.sequence_gaps() == {('55', 1): [(2, 2)]}
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import base64
+import email
+import os
+import socketserver
+import threading
+
+import pytest
+
+from modules.email_service import EmailService, StreamedAttachment, _Base64Stream
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Servidor SMTP mínimo: EHLO, AUTH PLAIN, MAIL, RCPT, DATA e QUIT"""
+    
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b"\r\n")
+    
+    def handle(self):
+        self.reply("220 localhost ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('ascii').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self.reply("250-localhost")
+                self.reply("250 AUTH PLAIN")
+            elif verb == 'AUTH':
+                self.server.credentials = base64.b64decode(command.split()[-1]).split(b"\0")[1:]
+                self.reply("235 2.7.0 Authentication successful")
+            elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self.reply("250 OK")
+            elif verb == 'DATA':
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = self._read_data()
+                self.server.messages.append(data)
+                self.server.received.release()
+                if data is None:
+                    return
+                self.reply("250 OK")
+            elif verb == 'QUIT':
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+    
+    def _read_data(self):
+        """Lê o conteúdo do DATA até a linha com '.', desfazendo a duplicação de pontos"""
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                # Conexão encerrada sem o '.' final: mensagem descartada
+                return None
+            if line == b".\r\n":
+                return b"".join(lines)
+            lines.append(line[1:] if line.startswith(b"..") else line)
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _SMTPHandler)
+    server.daemon_threads = True
+    server.messages = []
+    server.received = threading.Semaphore(0)
+    server.credentials = None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def _service(server):
+    return EmailService({
+        'server': '127.0.0.1',
+        'port': server.server_address[1],
+        'username': 'remetente@example.com',
+        'password': 'segredo',
+        'use_ssl': False
+    })
+
+def _attachments(message):
+    return [part for part in message.walk() if part.get_content_disposition() == 'attachment']
+
+def _streamed(data, write_size):
+    """Anexo em fluxo gravado em pedaços de tamanho irregular, como o ZIP"""
+    def write_to(stream):
+        for start in range(0, len(data), write_size):
+            stream.write(data[start:start + write_size])
+    return StreamedAttachment("empresa_202501_xmls.zip", write_to)
+
+def test_streamed_attachments_arrive_intact(smtp_server, tmp_path):
+    # Maior que um bloco do codificador e sem ser múltiplo de 57 bytes
+    zip_data = os.urandom(_Base64Stream.CHUNK_SIZE * 2 + 1001)
+    summary = tmp_path / "resumo.csv"
+    # Linhas começando com '.' exercitam a duplicação de pontos do DATA
+    summary.write_bytes(b"chave;valor\r\n.linha;1\r\n" * 500)
+    
+    sent = _service(smtp_server).send_email(
+        "destino@example.com", "XMLs de 01/2025", "Segue.\n.\nLinha com ponto.",
+        attachments=[_streamed(zip_data, 10_007), str(summary)]
+    )
+    
+    assert sent
+    assert smtp_server.credentials == [b"remetente@example.com", b"segredo"]
+    [raw] = smtp_server.messages
+    message = email.message_from_bytes(raw)
+    assert message['To'] == "destino@example.com"
+    assert message['Subject'] == "XMLs de 01/2025"
+    
+    body = next(part for part in message.walk() if part.get_content_type() == 'text/plain')
+    assert body.get_payload(decode=True).replace(b"\r\n", b"\n") == b"Segue.\n.\nLinha com ponto."
+    
+    streamed, file_part = _attachments(message)
+    for part, filename, data in ((streamed, "empresa_202501_xmls.zip", zip_data),
+                                 (file_part, "resumo.csv", summary.read_bytes())):
+        assert part.get_filename() == filename
+        assert part['Content-Transfer-Encoding'] == 'base64'
+        assert part.get_payload(decode=True) == data
+        # Linhas de base64 com 76 caracteres, como as do pacote email
+        lines = part.get_payload().splitlines()
+        assert all(len(line) == 76 for line in lines[:-1])
+
+def test_streamed_matches_in_memory_attachment(smtp_server, tmp_path):
+    path = tmp_path / "empresa_202501_xmls.zip"
+    path.write_bytes(os.urandom(3000))
+    service = _service(smtp_server)
+    
+    assert service.send_email("destino@example.com", "Assunto", "Corpo", attachments=[str(path)])
+    assert service.send_email(
+        "destino@example.com", "Assunto", "Corpo", attachments=[_streamed(path.read_bytes(), 333)]
+    )
+    
+    in_memory, streamed = (_attachments(email.message_from_bytes(raw))[0] for raw in smtp_server.messages)
+    assert streamed.get_filename() == in_memory.get_filename()
+    assert streamed.get_content_type() == in_memory.get_content_type()
+    assert streamed.get_payload(decode=True) == in_memory.get_payload(decode=True) == path.read_bytes()
+
+def test_failed_attachment_aborts_the_message(smtp_server):
+    def write_to(stream):
+        stream.write(b"x" * 100)
+        raise OSError("falha ao gerar o ZIP")
+    
+    sent = _service(smtp_server).send_email(
+        "destino@example.com", "Assunto", "Corpo", attachments=[StreamedAttachment("falha.zip", write_to)]
+    )
+    
+    assert not sent
+    # O servidor não recebeu o '.' final: nenhuma mensagem aceita
+    assert smtp_server.received.acquire(timeout=5)
+    assert smtp_server.messages == [None]
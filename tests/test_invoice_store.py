@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from modules.invoice_store import InvoiceStore
+from modules.event_index import EventIndex
+
+from conftest import make_key
+
+def test_cancelled_documents_are_outside_the_totals():
+    store = InvoiceStore("12345678000199", "202501")
+    store.add({'total': 100.0, 'icms': 18.0, 'model': '55', 'cfops': [5102], 'payments': [1]})
+    store.add({'total': 50.0, 'icms': 9.0, 'model': '55', 'cfops': [5102], 'payments': [17]}, cancelled=True)
+    
+    summary = store.summary()
+    
+    assert (summary['count'], summary['total'], summary['icms']) == (1, 100.0, 18.0)
+    assert (summary['cancelled'], summary['cancelled_total']) == (1, 50.0)
+    assert summary['payments'] == {1: 1}
+
+def test_document_cancelled_by_event_or_folder():
+    cancelled, active, in_folder = make_key(1), make_key(2), make_key(3)
+    files = {'nfe': [
+        {'filename': f"{cancelled}-procNFe.xml", 'status': 'Autorizados'},
+        {'filename': f"110111{cancelled}01-procEventoNFe.xml", 'status': 'Autorizados'},
+        {'filename': f"{active}-procNFe.xml", 'status': 'Autorizados'},
+        {'filename': f"{in_folder}-procNFe.xml", 'status': 'Cancelados'},
+    ]}
+    event_index = EventIndex()
+    event_index.filter(files)
+    
+    documents = [files['nfe'][i] for i in (0, 2, 3)]
+    assert [event_index.is_document_cancelled(f) for f in documents] == [True, False, True]
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import zipfile
+
+from modules.xml_finder import XMLFinder
+from modules.metadata_pipeline import MetadataPipeline
+from modules.zip_service import ZipService
+
+from conftest import CNPJ, PERIOD, make_key, make_xml
+
+def _find(finder):
+    return finder.find_xml_files(CNPJ, PERIOD)
+
+def _keep_dir_mtime(path, change):
+    """Altera um arquivo sem mudar o mtime do diretório (como uma regravação no lugar)"""
+    directory = os.path.dirname(path)
+    st = os.stat(directory)
+    change()
+    os.utime(directory, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+def test_index_returns_listing(dfe_tree, tmp_path):
+    path = dfe_tree('nfe', f"{make_key(1)}-procNFe.xml", make_xml(make_key(1)))
+    finder = XMLFinder(dfe_tree.base_path, str(tmp_path / "index.db"))
+    
+    first = _find(finder)
+    second = _find(finder)
+    
+    assert [f['path'] for f in first['nfe']] == [path]
+    assert [f['path'] for f in second['nfe']] == [path]
+    assert second['nfe'][0]['size'] == os.path.getsize(path)
+
+def test_index_revalidates_file_rewritten_in_place(dfe_tree, tmp_path):
+    key = make_key(1)
+    path = dfe_tree('nfe', f"{key}-procNFe.xml", make_xml(key))
+    finder = XMLFinder(dfe_tree.base_path, str(tmp_path / "index.db"))
+    _find(finder)
+    
+    def rewrite():
+        with open(path, 'wb') as f:
+            f.write(make_xml(key, padding=20))
+    _keep_dir_mtime(path, rewrite)
+    
+    entry = _find(finder)['nfe'][0]
+    assert entry['size'] == os.path.getsize(path)
+    assert entry['mtime'] == os.stat(path).st_mtime
+    
+    # A correção também fica gravada no índice
+    assert _find(XMLFinder(dfe_tree.base_path, str(tmp_path / "index.db")))['nfe'][0]['size'] == entry['size']
+
+def test_index_drops_file_removed_without_directory_change(dfe_tree, tmp_path):
+    kept = dfe_tree('nfe', f"{make_key(1)}-procNFe.xml", make_xml(make_key(1)))
+    removed = dfe_tree('nfe', f"{make_key(2)}-procNFe.xml", make_xml(make_key(2)))
+    finder = XMLFinder(dfe_tree.base_path, str(tmp_path / "index.db"))
+    assert len(_find(finder)['nfe']) == 2
+    
+    _keep_dir_mtime(removed, lambda: os.remove(removed))
+    
+    assert [f['path'] for f in _find(finder)['nfe']] == [kept]
+
+def test_warm_index_does_not_stat_settled_files(dfe_tree, tmp_path, monkeypatch):
+    paths = [dfe_tree('nfe', f"{make_key(n)}-procNFe.xml", make_xml(make_key(n))) for n in range(1, 6)]
+    for path in paths:
+        os.utime(path, (1_700_000_000, 1_700_000_000))
+    finder = XMLFinder(dfe_tree.base_path, str(tmp_path / "index.db"))
+    _find(finder)
+    
+    stat_calls = []
+    real_stat = os.stat
+    monkeypatch.setattr(os, 'stat', lambda path, *a, **k: stat_calls.append(str(path)) or real_stat(path, *a, **k))
+    
+    assert [f['path'] for f in _find(finder)['nfe']] == paths
+    assert not [path for path in stat_calls if path.endswith('.xml')]
+
+def test_stale_index_fields_are_checked_when_the_file_is_used(dfe_tree, tmp_path):
+    key = make_key(1)
+    path = dfe_tree('nfe', f"{key}-procNFe.xml", make_xml(key))
+    os.utime(path, (1_700_000_000, 1_700_000_000))
+    finder = XMLFinder(dfe_tree.base_path, str(tmp_path / "index.db"))
+    listed_size = _find(finder)['nfe'][0]['size']
+    
+    def rewrite():
+        with open(path, 'wb') as f:
+            f.write(make_xml(key, padding=20))
+        os.utime(path, (1_700_000_100, 1_700_000_100))
+    _keep_dir_mtime(path, rewrite)
+    
+    entry = _find(finder)['nfe'][0]
+    # Entrada antiga: o índice é usado como está, sem stat
+    assert entry['size'] == listed_size
+    # Quem usa o arquivo confere o tamanho atual
+    assert MetadataPipeline._file_key(entry)[1] == os.path.getsize(path)
+    with zipfile.ZipFile(ZipService().compress_files({'nfe': [entry]}, str(tmp_path / "out.zip"))) as zf:
+        assert zf.read(zf.infolist()[0]) == make_xml(key, padding=20)
+
+def test_index_picks_up_new_file(dfe_tree, tmp_path):
+    dfe_tree('nfe', f"{make_key(1)}-procNFe.xml", make_xml(make_key(1)))
+    finder = XMLFinder(dfe_tree.base_path, str(tmp_path / "index.db"))
+    _find(finder)
+    
+    added = dfe_tree('nfe', f"{make_key(2)}-procNFe.xml", make_xml(make_key(2)))
+    directory = os.path.dirname(added)
+    st = os.stat(directory)
+    # Garante um mtime de diretório diferente mesmo em sistemas de arquivos com resolução grosseira
+    os.utime(directory, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    
+    assert added in [f['path'] for f in _find(finder)['nfe']]
+
+def test_deduplicate_prefers_authorized_protocol(dfe_tree, tmp_path):
+    key = make_key(1)
+    proc = dfe_tree('nfe', f"{key}-procNFe.xml", make_xml(key))
+    # Versão sem protocolo maior que a com protocolo: o protocolo tem prioridade
+    dfe_tree('nfe', f"{key}-nfe.xml", make_xml(key, padding=20))
+    finder = XMLFinder(dfe_tree.base_path, str(tmp_path / "index.db"))
+    
+    result, dropped = finder.deduplicate(_find(finder))
+    
+    assert [f['path'] for f in result['nfe']] == [proc]
+    assert len(dropped) == 1
+    assert dropped[0][2]['path'] == proc
+
+def test_deduplicate_prefers_larger_then_newer(dfe_tree, tmp_path):
+    key = make_key(1)
+    small = dfe_tree('nfe', f"{key}.xml", make_xml(key))
+    large = dfe_tree('nfe', f"copia-{key}.xml", make_xml(key, padding=5))
+    os.utime(small, (2_000_000_000, 2_000_000_000))
+    other = make_key(2)
+    old = dfe_tree('nfe', f"{other}.xml", make_xml(other))
+    new = dfe_tree('nfe', f"copia-{other}.xml", make_xml(other))
+    os.utime(old, (1_700_000_000, 1_700_000_000))
+    os.utime(new, (1_800_000_000, 1_800_000_000))
+    finder = XMLFinder(dfe_tree.base_path)
+    
+    result, dropped = finder.deduplicate(_find(finder))
+    
+    assert sorted(f['path'] for f in result['nfe']) == sorted([large, new])
+    assert sorted(f['path'] for _, f, _ in dropped) == sorted([small, old])
+
+def test_deduplicate_keeps_files_without_key_and_other_statuses(dfe_tree):
+    key = make_key(1)
+    authorized = dfe_tree('nfe', f"{key}-procNFe.xml", make_xml(key))
+    cancelled = dfe_tree('nfe', f"{key}-procNFe.xml", make_xml(key), status='Cancelados')
+    no_key = dfe_tree('nfe', "sem-chave.xml", b"<a/>")
+    finder = XMLFinder(dfe_tree.base_path)
+    files = finder.find_xml_files(CNPJ, PERIOD, statuses=('Autorizados', 'Cancelados'))
+    
+    result, dropped = finder.deduplicate(files)
+    
+    assert sorted(f['path'] for f in result['nfe']) == sorted([authorized, cancelled, no_key])
+    assert dropped == []
+
+def test_find_by_access_keys_uses_index_before_directories(dfe_tree, tmp_path, monkeypatch):
+    paths = {n: dfe_tree('nfe', f"{make_key(n)}-procNFe.xml", make_xml(make_key(n))) for n in range(1, 4)}
+    finder = XMLFinder(dfe_tree.base_path, str(tmp_path / "index.db"))
+    _find(finder)
+    
+    scanned = []
+    real_scandir = os.scandir
+    monkeypatch.setattr(os, 'scandir', lambda path: scanned.append(path) or real_scandir(path))
+    
+    files, missing, invalid = finder.find_by_access_keys([make_key(2), make_key(3)])
+    
+    assert sorted(f['path'] for f in files['nfe']) == [paths[2], paths[3]]
+    assert (missing, invalid) == ([], [])
+    assert scanned == []
+
+def test_find_by_access_keys_reads_directories_for_keys_not_indexed(dfe_tree, tmp_path):
+    path = dfe_tree('nfe', f"{make_key(1)}-procNFe.xml", make_xml(make_key(1)))
+    cancelled = dfe_tree('nfe', f"{make_key(2)}-procNFe.xml", make_xml(make_key(2)), status='Cancelados')
+    finder = XMLFinder(dfe_tree.base_path, str(tmp_path / "index.db"))
+    wrong = make_key(3)[:43] + str((int(make_key(3)[43]) + 1) % 10)
+    
+    files, missing, invalid = finder.find_by_access_keys([make_key(1), make_key(2), make_key(4), wrong])
+    
+    assert [f['path'] for f in files['nfe']] == [path, cancelled]
+    assert (missing, invalid) == ([make_key(4)], [wrong])
+    
+    # Segunda busca pelo índice, respeitando as situações pedidas
+    files, missing, _ = finder.find_by_access_keys([make_key(1), make_key(2)], statuses=('Autorizados',))
+    assert [f['path'] for f in files['nfe']] == [path]
+    assert missing == [make_key(2)]
+
+def test_deduplicate_batch_returns_keys_of_kept_files(dfe_tree, tmp_path):
+    key = make_key(1)
+    dfe_tree('nfe', f"{key}-nfe.xml", make_xml(key))
+    dfe_tree('nfe', f"{key}-procNFe.xml", make_xml(key))
+    dfe_tree('nfe', f"{make_key(3)}-procNFe.xml", make_xml(make_key(3)))
+    finder = XMLFinder(dfe_tree.base_path, str(tmp_path / "index.db"))
+    files = _find(finder)
+    
+    batch = finder.decode_access_keys(f for type_files in files.values() for f in type_files)
+    result, dropped, kept = finder.deduplicate_batch(files, batch)
+    
+    assert len(dropped) == 1
+    assert kept.filenames == [f['filename'] for f in result['nfe']]
+    assert kept.sequence_gaps() == {('55', 1): [(2, 2)]}
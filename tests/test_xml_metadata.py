@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from modules.xml_metadata import XMLMetadataExtractor
+
+from conftest import make_key
+
+def _nfe(key):
+    return (
+        f'<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe"><NFe><infNFe Id="NFe{key}">'
+        f'<ide><mod>55</mod><serie>1</serie><nNF>1</nNF><dhEmi>2025-01-10T10:00:00-03:00</dhEmi></ide>'
+        f'<total><ICMSTot><vICMS>18.00</vICMS><vNF>100.00</vNF></ICMSTot></total>'
+        f'<pag><detPag><tPag>17</tPag></detPag></pag></infNFe></NFe></nfeProc>'
+    ).encode('utf-8')
+
+def _event(key):
+    return (
+        f'<procEventoNFe xmlns="http://www.portalfiscal.inf.br/nfe"><evento><infEvento Id="ID110111{key}01">'
+        f'<chNFe>{key}</chNFe><tpEvento>110111</tpEvento><detEvento><xJust>Erro</xJust></detEvento>'
+        f'</infEvento></evento><retEvento><infEvento><chNFe>{key}</chNFe></infEvento></retEvento></procEventoNFe>'
+    ).encode('utf-8')
+
+def test_extracts_document(tmp_path):
+    key = make_key(1)
+    path = tmp_path / "nfe.xml"
+    path.write_bytes(_nfe(key))
+    
+    metadata = XMLMetadataExtractor().extract(str(path))
+    
+    assert metadata['access_key'] == key
+    assert (metadata['model'], metadata['period'], metadata['total']) == ('55', '202501', 100.0)
+    assert metadata['payments'] == [17]
+
+def test_event_is_not_a_document(tmp_path):
+    path = tmp_path / "evento.xml"
+    path.write_bytes(_event(make_key(1)))
+    
+    assert XMLMetadataExtractor().extract(str(path)) is None
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import re
+from xml.parsers import expat
+
+from modules.xml_minifier import XMLMinifier
+
+SIGNED = """<?xml version="1.0" encoding="UTF-8"?>
+<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00">
+    <NFe xmlns="http://www.portalfiscal.inf.br/nfe">
+        <infNFe Id="NFe35250112345678000199550010000000011000000015" versao="4.00">
+            <ide>
+                <cUF>35</cUF>
+                <xObs> </xObs>
+            </ide>
+            <prod><xProd>CAFÉ  TORRADO &amp; MOÍDO</xProd></prod>
+        </infNFe>
+        <Signature xmlns="http://www.w3.org/2000/09/xmldsig#">
+            <SignedInfo>
+                <Reference URI="#NFe35250112345678000199550010000000011000000015"/>
+            </SignedInfo>
+            <SignatureValue>abc
+def</SignatureValue>
+        </Signature>
+    </NFe>
+    <!-- comentário -->
+    <protNFe versao="4.00">
+        <infProt Id="ID135">
+            <nProt>135</nProt>
+        </infProt>
+        <obs><![CDATA[  texto   ]]></obs>
+    </protNFe>
+</nfeProc>
+""".encode('utf-8')
+
+def _minify(data, chunk_size=None):
+    minifier = XMLMinifier()
+    if chunk_size:
+        minifier.CHUNK_SIZE = chunk_size
+    output = io.BytesIO()
+    minifier.minify(io.BytesIO(data), output.write)
+    return output.getvalue()
+
+def _element(data, name):
+    return re.search(rb'<' + name + rb'\b.*?</' + name + rb'>', data, re.S).group(0)
+
+def test_signed_elements_are_copied_byte_for_byte():
+    output = _minify(SIGNED)
+    
+    for name in (b'infNFe', b'Signature', b'infProt'):
+        assert _element(output, name) == _element(SIGNED, name)
+    assert b'<![CDATA[  texto   ]]>' in output
+
+def test_indentation_outside_signed_elements_is_removed():
+    output = _minify(SIGNED)
+    
+    assert len(output) < len(SIGNED)
+    assert b'<NFe xmlns="http://www.portalfiscal.inf.br/nfe"><infNFe' in output
+    assert b'</Signature></NFe>' in output
+    expat.ParserCreate().Parse(output, True)
+
+def test_output_does_not_depend_on_chunk_boundaries():
+    expected = _minify(SIGNED)
+    
+    for chunk_size in (1, 7, 64):
+        assert _minify(SIGNED, chunk_size) == expected
+
+def test_malformed_input_loses_no_content():
+    data = SIGNED.replace(b'</prod>', b'</produto>')
+    
+    output = _minify(data)
+    
+    assert re.sub(rb'\s', b'', output) == re.sub(rb'\s', b'', data)
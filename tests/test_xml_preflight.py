@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+from modules.xml_preflight import XMLPreflight
+from modules.xml_finder import XMLFinder
+
+from conftest import CNPJ, PERIOD, make_key, make_xml
+
+def _check(tmp_path, data, full_parse=True, **listing):
+    path = tmp_path / "doc.xml"
+    path.write_bytes(data)
+    # Fora da janela de SETTLE_SECONDS, para não esperar a segunda leitura
+    os.utime(path, (1_700_000_000, 1_700_000_000))
+    return XMLPreflight(full_parse).check({'path': str(path), **listing})
+
+@pytest.mark.parametrize("data", [
+    make_xml(make_key(1)),
+    b'<?xml version="1.0"?>\n<nfeProc versao="4.00"/>\n',
+    b'<?xml version="1.0"?>\n<!-- ok -->\n<retEvento a="x>y" b=\'1\' />',
+    b'<a><b/></a>\r\n\r\n',
+])
+def test_accepts_well_formed(tmp_path, data):
+    assert _check(tmp_path, data) is None
+
+@pytest.mark.parametrize("data, reason", [
+    (b"", "arquivo vazio"),
+    (make_xml(make_key(1))[:-30], "arquivo truncado"),
+    (make_xml(make_key(1)) + b"\x00" * 64, "arquivo truncado (termina em bytes nulos)"),
+    (b'<?xml version="1.0"?>\n<nfeProc versao="4.00"/', "arquivo truncado"),
+    (b"texto sem marcacao", "elemento raiz não encontrado"),
+    (b"<a><b></a>", "XML malformado"),
+])
+def test_rejects_broken(tmp_path, data, reason):
+    assert _check(tmp_path, data).startswith(reason)
+
+def test_root_check_only_without_full_parse(tmp_path):
+    assert _check(tmp_path, b"<a><b></a>", full_parse=False) is None
+
+def test_stale_listing_size_is_not_a_rejection(tmp_path):
+    data = make_xml(make_key(1))
+    assert _check(tmp_path, data, size=len(data) + 100, mtime=0) is None
+
+def test_missing_file(tmp_path):
+    assert XMLPreflight().check({'path': str(tmp_path / "nao-existe.xml")}) == "arquivo não encontrado"
+
+def test_validate_files_separates_rejected(dfe_tree):
+    good = dfe_tree('nfe', f"{make_key(1)}-procNFe.xml", make_xml(make_key(1)))
+    bad = dfe_tree('nfe', f"{make_key(2)}-procNFe.xml", make_xml(make_key(2))[:-20])
+    for path in (good, bad):
+        os.utime(path, (1_700_000_000, 1_700_000_000))
+    finder = XMLFinder(dfe_tree.base_path)
+    
+    result, rejected = finder.validate_files(finder.find_xml_files(CNPJ, PERIOD))
+    
+    assert [f['path'] for f in result['nfe']] == [good]
+    assert [(doc_type, f['path']) for doc_type, f, _ in rejected] == [('nfe', bad)]
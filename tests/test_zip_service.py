@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import zipfile
+
+import pytest
+
+from modules.zip_service import ZipService, encoded_size
+
+from conftest import make_key, make_xml
+
+@pytest.fixture
+def xml_files(tmp_path):
+    """{tipo: [arquivos]} com XMLs de tamanhos variados"""
+    directory = tmp_path / "xml"
+    directory.mkdir()
+    files = {'nfce': [], 'nfe': []}
+    for n in range(1, 41):
+        doc_type, model = ('nfe', '55') if n % 3 else ('nfce', '65')
+        key = make_key(n, model=model)
+        path = directory / f"{key}-procNFe.xml"
+        path.write_bytes(make_xml(key, padding=n * 7))
+        files[doc_type].append({'filename': path.name, 'path': str(path)})
+    return files
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _members(source):
+    with zipfile.ZipFile(source) as zf:
+        assert zf.testzip() is None
+        return [(info.filename, zf.read(info)) for info in zf.infolist()]
+
+@pytest.mark.parametrize("options", [{}, {'compression': 'deflated-9'}, {'minify': True}])
+def test_parallel_output_is_byte_identical(xml_files, tmp_path, options):
+    sequential = ZipService(workers=1, **options).compress_files(xml_files, str(tmp_path / "seq.zip"))
+    parallel = ZipService(workers=4, **options).compress_files(xml_files, str(tmp_path / "par.zip"))
+    
+    assert _read(sequential) == _read(parallel)
+
+def test_members_organized_by_type(xml_files, tmp_path):
+    output = ZipService().compress_files(xml_files, str(tmp_path / "out.zip"))
+    
+    members = _members(output)
+    
+    expected = [
+        (f"{folder}/{f['filename']}", _read(f['path']))
+        for folder, doc_type in (('NFCe', 'nfce'), ('NFe', 'nfe'))
+        for f in xml_files[doc_type]
+    ]
+    assert members == expected
+
+class _Unseekable:
+    """Fluxo só com write(), como o socket do envio SMTP"""
+    
+    def __init__(self):
+        self.buffer = io.BytesIO()
+    
+    def write(self, data):
+        return self.buffer.write(data)
+    
+    def flush(self):
+        pass
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_stream_files_to_unseekable_sink(xml_files, tmp_path, workers):
+    sink = _Unseekable()
+    ZipService(workers=workers).stream_files(xml_files, sink)
+    on_disk = ZipService().compress_files(xml_files, str(tmp_path / "out.zip"))
+    
+    assert _members(io.BytesIO(sink.buffer.getvalue())) == _members(on_disk)
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_compress_parts_fit_limit_and_keep_order(xml_files, tmp_path, workers):
+    whole = _members(ZipService().compress_files(xml_files, str(tmp_path / "whole.zip")))
+    max_encoded_size = 6 * 1024
+    
+    parts = ZipService(workers=workers).compress_parts(xml_files, str(tmp_path / "out.zip"), max_encoded_size)
+    
+    assert len(parts) > 1
+    assert parts == [str(tmp_path / f"out_part{i}.zip") for i in range(1, len(parts) + 1)]
+    for part in parts:
+        assert encoded_size(os.path.getsize(part)) <= max_encoded_size
+    assert [member for part in parts for member in _members(part)] == whole
+
+def test_compress_parts_single_part_keeps_name(xml_files, tmp_path):
+    output = str(tmp_path / "out.zip")
+    
+    assert ZipService().compress_parts(xml_files, output, 50 * 1024 * 1024) == [output]
+
+def test_estimate_size_close_to_actual(xml_files, tmp_path):
+    compression, estimate = ZipService().estimate_size(xml_files)
+    actual = os.path.getsize(ZipService().compress_files(xml_files, str(tmp_path / "out.zip")))
+    
+    assert compression == 'deflated'
+    assert 0.8 * actual <= estimate <= 1.2 * actual
+
+def test_iterator_input_matches_dict_input(xml_files, tmp_path):
+    pairs = ((doc_type, f) for doc_type, type_files in xml_files.items() for f in type_files)
+    
+    streamed = ZipService().compress_files(pairs, str(tmp_path / "iter.zip"))
+    
+    assert _members(streamed) == _members(ZipService().compress_files(xml_files, str(tmp_path / "dict.zip")))
+
+def test_solid_archive_within_limit_is_kept(xml_files, tmp_path):
+    output = str(tmp_path / "out.tar.xz")
+    
+    assert ZipService(archive_format='tar.xz').compress_parts(xml_files, output, 50 * 1024 * 1024) == [output]
+
+def test_solid_archive_over_limit_falls_back_to_zip_parts(xml_files, tmp_path):
+    whole = _members(ZipService().compress_files(xml_files, str(tmp_path / "whole.zip")))
+    solid = ZipService(archive_format='tar.xz').compress_files(xml_files, str(tmp_path / "solid.tar.xz"))
+    max_encoded_size = encoded_size(os.path.getsize(solid)) - 1
+    
+    parts = ZipService(archive_format='tar.xz').compress_parts(xml_files, str(tmp_path / "out.tar.xz"), max_encoded_size)
+    
+    assert not os.path.exists(tmp_path / "out.tar.xz")
+    assert parts == [str(tmp_path / f"out_part{i}.zip") for i in range(1, len(parts) + 1)]
+    for part in parts:
+        assert encoded_size(os.path.getsize(part)) <= max_encoded_size
+    assert [member for part in parts for member in _members(part)] == whole